@@ -4,9 +4,16 @@ import io
 from fastapi import APIRouter, Depends, File, UploadFile
 from sqlalchemy.orm import Session
 
-from app.auth import require_parent
+from app.api.auth import ip_limiter, user_limiter
+from app.auth import Principal, principal_cache, require_parent
+from app.cache import versions
+from app import view_cache, writebehind
+from app.catalog import catalog
 from app.database import get_db
-from app.models import User, Word
+from app.hashing import hasher
+from app.plans import scheduler
+from app.writer import run_write, writer
+from app.models import Word
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
@@ -14,52 +21,72 @@ router = APIRouter(prefix="/api/admin", tags=["admin"])
 @router.post("/import-words")
 async def import_words(
     file: UploadFile = File(...),
-    parent: User = Depends(require_parent),
+    parent: Principal = Depends(require_parent),
     db: Session = Depends(get_db),
 ):
     content = await file.read()
     text = content.decode("utf-8-sig")
     reader = csv.DictReader(io.StringIO(text))
 
-    imported = 0
-    skipped = 0
-    errors = []
+    def import_rows(s: Session) -> tuple[int, int, list[str]]:
+        imported = 0
+        skipped = 0
+        errors = []
 
-    for i, row in enumerate(reader, start=1):
-        try:
-            english = row["english"].strip()
-            japanese = row["japanese"].strip()
-            english_katakana = row["english_katakana"].strip()
-            section = int(row["section"].strip())
-        except (ValueError, KeyError, AttributeError) as e:
-            errors.append(f"{i}行目: {e}")
-            continue
+        for i, row in enumerate(reader, start=1):
+            try:
+                english = row["english"].strip()
+                japanese = row["japanese"].strip()
+                english_katakana = row["english_katakana"].strip()
+                section = int(row["section"].strip())
+            except (ValueError, KeyError, AttributeError) as e:
+                errors.append(f"{i}行目: {e}")
+                continue
 
-        existing = (
-            db.query(Word)
-            .filter(
-                Word.english == english,
-                Word.japanese == japanese
+            existing = (
+                s.query(Word)
+                .filter(
+                    Word.english == english,
+                    Word.japanese == japanese
+                )
+                .first()
             )
-            .first()
-        )
-        if existing:
-            skipped += 1
-            continue
+            if existing:
+                skipped += 1
+                continue
 
-        word = Word(
-            english=english,
-            japanese=japanese,
-            english_katakana=english_katakana,
-            section=section,
-        )
-        db.add(word)
-        imported += 1
+            word = Word(
+                english=english,
+                japanese=japanese,
+                english_katakana=english_katakana,
+                section=section,
+            )
+            s.add(word)
+            imported += 1
+
+        return imported, skipped, errors
 
-    db.commit()
+    imported, skipped, errors = run_write(db, import_rows)
     msg = f"{imported}件の単語を登録しました"
     msg += f" ({skipped}件は既登録のためスキップ)"
     if errors:
         msg += f" エラー{len(errors)}件: "
         msg += "; ".join(errors)
     return {"detail": msg}
+
+
+@router.get("/metrics")
+def metrics(parent: Principal = Depends(require_parent)):
+    return {
+        "cache_backend": versions.stats(),
+        "principal_cache": principal_cache.stats(),
+        "catalog": catalog.stats(),
+        "view_cache": view_cache.view_cache.stats(),
+        "view_flights": view_cache.flights.stats(),
+        "login_limit_user": user_limiter.snapshot(),
+        "login_limit_ip": ip_limiter.snapshot(),
+        "hash_slots": hasher.slots.snapshot(),
+        "write_queue": writer.stats() if writer is not None else None,
+        "write_behind": writebehind.buffer.stats() if writebehind.buffer is not None else None,
+        "daily_plans": scheduler.last_result,
+    }
@@ -0,0 +1,73 @@
+from fastapi import APIRouter, Depends, Header, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import quiz_sessions, view_cache, writebehind
+from app.auth import Principal, require_child_async, require_parent_async
+from app.database import get_async_db
+from app.schemas import AnswerResult, AnswerSubmit, DailyStat, MenuStatus, QuizWord
+from app.api.learning import _count_menu_status, _menu_status_params, _submit_answer, _today_words
+from app.api.parent import _compute_daily_stats, _get_child
+
+# Async versions of the hot endpoints, mounted ahead of the sync routers when
+# ASYNC_DB is enabled. The query logic is shared: each handler runs the sync
+# helper against the AsyncSession's underlying Session with run_sync, so the
+# request waits on the event loop instead of holding a threadpool thread.
+# The write-behind read barrier is awaited before that, off the event loop.
+# Cached views go through view_cache.cached_async, so identical requests
+# in flight (async or sync) share one computation.
+router = APIRouter(tags=["async"])
+
+
+@router.get("/api/learning/today", response_model=list[QuizWord])
+async def today_words(
+    response: Response,
+    child: Principal = Depends(require_child_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    def run(s):
+        return [QuizWord.model_validate(w) for w in _today_words(s, child.id)]
+
+    await writebehind.sync_async(child.id)
+    words = await db.run_sync(run)
+    response.headers[quiz_sessions.HEADER] = quiz_sessions.issue(child.id, "today", [w.id for w in words])
+    return words
+
+
+@router.post("/api/learning/answer", response_model=AnswerResult)
+async def submit_answer(
+    data: AnswerSubmit,
+    quiz_session: str | None = Header(None, alias=quiz_sessions.HEADER),
+    child: Principal = Depends(require_child_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    session = quiz_sessions.resolve(quiz_session, child.id)
+    return await db.run_sync(_submit_answer, child.id, data, session)
+
+
+@router.get("/api/learning/menu-status", response_model=MenuStatus)
+async def menu_status(
+    child: Principal = Depends(require_child_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    await writebehind.sync_async(child.id)
+    params = await db.run_sync(_menu_status_params, child.id)
+    return await view_cache.cached_async(
+        child.id, "menu_status", params,
+        lambda: db.run_sync(_count_menu_status, child.id),
+    )
+
+
+@router.get("/api/parent/children/{child_id}/stats", response_model=list[DailyStat])
+async def child_stats(
+    child_id: int,
+    year: int = Query(..., ge=2000, le=2100),
+    month: int = Query(..., ge=1, le=12),
+    parent: Principal = Depends(require_parent_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    await db.run_sync(_get_child, parent.id, child_id)
+    await writebehind.sync_async(child_id)
+    return await view_cache.cached_async(
+        child_id, "daily_stats", (year, month),
+        lambda: db.run_sync(_compute_daily_stats, child_id, year, month),
+    )
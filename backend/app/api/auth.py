@@ -1,50 +1,142 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import ipaddress
+import math
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 
-from app.auth import create_access_token, get_current_user, hash_password, verify_password
+from app.auth import (
+    Principal,
+    create_user_token,
+    get_current_user,
+    hash_password,
+    password_needs_rehash,
+    verify_password,
+)
+from app.config import (
+    LOGIN_IP_BURST,
+    LOGIN_IP_PER_MINUTE,
+    LOGIN_USER_BURST,
+    LOGIN_USER_PER_MINUTE,
+    TRUSTED_PROXIES,
+)
 from app.database import get_db
 from app.models import User
+from app.ratelimit import TokenBucketLimiter
+from app import sharding
 from app.schemas import Login, ParentRegister, Token, UserOut
+from app.writer import run_write
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
+user_limiter = TokenBucketLimiter(LOGIN_USER_BURST, LOGIN_USER_PER_MINUTE)
+ip_limiter = TokenBucketLimiter(LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE)
+trusted_proxies = [ipaddress.ip_network(p, strict=False) for p in TRUSTED_PROXIES]
+
+
+def _trusted(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in trusted_proxies)
+
+
+def client_ip(request: Request) -> str:
+    """The caller's address, read through forwarding headers only when they
+    were set by a trusted proxy."""
+    peer = request.client.host if request.client else "unknown"
+    if not _trusted(peer):
+        return peer
+    # Walk X-Forwarded-For from the right, skipping our own proxies
+    forwarded = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+    for host in reversed(forwarded):
+        if not _trusted(host):
+            return host
+    return request.headers.get("x-real-ip", "").strip() or (forwarded[0] if forwarded else peer)
+
+
+def _admit(request: Request, username: str) -> None:
+    """Reject before any bcrypt work when the username or client IP is over its limit."""
+    ip = client_ip(request)
+    retry_after = ip_limiter.acquire(ip)
+    if retry_after == 0:
+        retry_after = user_limiter.acquire(username)
+        if retry_after > 0:
+            # A locked-out username must not use up its caller's IP budget
+            ip_limiter.refund(ip)
+    if retry_after > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="試行回数が多すぎます。しばらくしてから再度お試しください",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
 
 @router.post("/register", response_model=UserOut)
-def register(data: ParentRegister, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.username == data.username).first():
+def register(data: ParentRegister, request: Request, db: Session = Depends(get_db)):
+    _admit(request, data.username)
+    if sharding.username_taken(db, data.username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="このユーザー名は既に使用されています",
         )
-    if db.query(User).filter(User.email == data.email).first():
+    if sharding.email_taken(db, data.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="このメールアドレスは既に使用されています",
         )
-    user = User(
+    fields = dict(
         email=data.email,
         username=data.username,
         hashed_password=hash_password(data.password),
         role="parent",
     )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    return user
+    if sharding.shards is not None:
+        return sharding.shards.create_user(db, **fields)
+
+    def create(s: Session) -> int:
+        user = User(**fields)
+        s.add(user)
+        s.flush()
+        return user.id
+
+    return db.get(User, run_write(db, create))
 
 
 @router.post("/login", response_model=Token)
-def login(data: Login, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == data.username).first()
-    if not user or not verify_password(data.password, user.hashed_password):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="ユーザー名またはパスワードが正しくありません",
-        )
-    access_token = create_access_token(data={"sub": user.username})
+def login(data: Login, request: Request, db: Session = Depends(get_db)):
+    _admit(request, data.username)
+    with sharding.user_session(db, data.username) as user_db:
+        user = None
+        if user_db is not None:
+            user = user_db.query(User).filter(User.username == data.username).first()
+        if not user or not verify_password(data.password, user.hashed_password):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="ユーザー名またはパスワードが正しくありません",
+            )
+        if password_needs_rehash(user.hashed_password):
+            hashed = hash_password(data.password)
+
+            def rehash(s: Session) -> None:
+                s.get(User, user.id).hashed_password = hashed
+
+            run_write(user_db, rehash)
+        access_token = create_user_token(user_db, user)
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.get("/me", response_model=UserOut)
-def me(current_user: User = Depends(get_current_user)):
-    return current_user
+def me(
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    # Claims tokens carry no email, so read the profile itself from the DB
+    user = db.get(User, current_user.id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="認証情報が無効です",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
@@ -1,14 +1,21 @@
+import random
 from datetime import datetime, timedelta, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import and_, case, func
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app.auth import require_child
-from app.database import get_db
-from app.models import ChildProgress, LearningRecord, User, Word
-from app.schemas import AnswerResult, AnswerSubmit, MenuStatus, QuizWord, WeakWordOut
-from app.api.parent import _get_weak_words
+from app import plans, quiz_sessions, view_cache, writebehind
+from app.auth import Principal, require_child
+from app.catalog import CatalogWord, catalog
+from app.config import QUIZ_SIZE, WEAK_WEIGHTED
+from app.database import get_db, get_read_db
+from app.models import OUTCOME_CORRECT, ChildProgress, DailyPlan, LearningRecord, WordMastery
+from app.sampling import reservoir_sample, weighted_sample
+from app.schemas import AnswerBatch, AnswerResult, AnswerSubmit, MenuStatus, QuizWord, WeakWordOut
+from app.writer import run_write
+from app.api.parent import _get_daily_stats, _get_weak_words
 
 router = APIRouter(prefix="/api/learning", tags=["learning"])
 
@@ -16,10 +23,12 @@ router = APIRouter(prefix="/api/learning", tags=["learning"])
 def _get_progress(db: Session, child_id: int) -> ChildProgress:
     progress = db.query(ChildProgress).filter(ChildProgress.child_id == child_id).first()
     if not progress:
-        progress = ChildProgress(child_id=child_id)
-        db.add(progress)
-        db.commit()
-        db.refresh(progress)
+        def create(s: Session):
+            if not s.query(ChildProgress).filter(ChildProgress.child_id == child_id).first():
+                s.add(ChildProgress(child_id=child_id))
+
+        run_write(db, create)
+        progress = db.query(ChildProgress).filter(ChildProgress.child_id == child_id).first()
     return progress
 
 
@@ -29,345 +38,349 @@ def _get_today_jst() -> datetime:
     return now_jst
 
 
+def _today_words(db: Session, child_id: int) -> list[CatalogWord]:
+    progress = _get_progress(db, child_id)
+    words = catalog.get(db)
+    today = _get_today_jst().date()
+    plan = db.get(DailyPlan, child_id)
+    if not plans.is_current(plan, progress, words, today):
+        # Not planned by the midnight job (new child, scheduler disabled, or
+        # the progress was changed since): roll over now
+        values, plan = plans.next_plan(db, progress, words, today)
+        run_write(db, lambda s: plans.save_plan(s, values, plan))
+    return words.get_many(db, plans.plan_word_ids(plan))
+
+
 @router.get("/today", response_model=list[QuizWord])
 def today_words(
-    child: User = Depends(require_child),
+    response: Response,
+    child: Principal = Depends(require_child),
     db: Session = Depends(get_db),
 ):
-    progress = _get_progress(db, child.id)
-    today_jst = _get_today_jst().date()
-
-    if progress.last_section_date is None:
-        progress.last_section_date = datetime.now(timezone.utc)
-        db.commit()
-    else:
-        last_date_jst = (progress.last_section_date + timedelta(hours=9)).date()
-        if last_date_jst != today_jst:
-            section_word_ids = db.query(Word.id).filter(
-                Word.section == progress.current_section
-            )
-            total_words = section_word_ids.count()
-            answered_count = (
-                db.query(LearningRecord.word_id)
-                .filter(
-                    LearningRecord.child_id == child.id,
-                    LearningRecord.session_type == "today",
-                    LearningRecord.word_id.in_(section_word_ids),
-                )
-                .distinct()
-                .count()
-            )
-            if total_words > 0 and answered_count >= total_words:
-                progress.current_section += 1
-            progress.last_section_date = datetime.now(timezone.utc)
-            db.commit()
-
-    words = (
-        db.query(Word)
-        .filter(Word.section == progress.current_section)
-        .order_by(func.random())
-        .all()
-    )
+    writebehind.sync(child.id)
+    words = _today_words(db, child.id)
+    response.headers[quiz_sessions.HEADER] = quiz_sessions.issue(child.id, "today", [w.id for w in words])
     return words
 
 
-def _get_learned_word_ids(db: Session, child_id: int, period: str | None = None):
-    query = (
-        db.query(LearningRecord.word_id)
-        .filter(LearningRecord.child_id == child_id)
-        .distinct()
-    )
+def _learned_word_query(db: Session, child_id: int, period: str | None = None):
+    query = db.query(WordMastery.word_id).filter(WordMastery.child_id == child_id)
 
     if period:
         now = datetime.now(timezone.utc)
         if period == "week":
             cutoff = now - timedelta(days=7)
-            query = query.filter(LearningRecord.answered_at >= cutoff)
+            query = query.filter(WordMastery.last_at >= cutoff)
         elif period == "month":
             cutoff = now - timedelta(days=30)
-            query = query.filter(LearningRecord.answered_at >= cutoff)
+            query = query.filter(WordMastery.last_at >= cutoff)
         elif period == "over_month":
             cutoff = now - timedelta(days=30)
-            query = query.filter(LearningRecord.answered_at < cutoff)
+            query = query.filter(WordMastery.first_at < cutoff)
+
+    return query
 
-    return [row[0] for row in query.all()]
+
+def _get_learned_word_ids(db: Session, child_id: int, period: str | None = None):
+    return [row[0] for row in _learned_word_query(db, child_id, period).all()]
 
 
 @router.get("/review", response_model=list[QuizWord])
 def review_words(
+    response: Response,
     period: str = Query("all"),
-    child: User = Depends(require_child),
-    db: Session = Depends(get_db),
+    child: Principal = Depends(require_child),
+    db: Session = Depends(get_read_db),
 ):
-    word_ids = _get_learned_word_ids(db, child.id, period if period != "all" else None)
-    if not word_ids:
-        return []
-    words = (
-        db.query(Word)
-        .filter(Word.id.in_(word_ids))
-        .order_by(func.random())
-        .limit(10)
-        .all()
+    writebehind.sync(child.id)
+    period = period if period != "all" else None
+    # The candidates are cached per child; the quiz is drawn from them each time
+    candidates = view_cache.cached(
+        child.id, "review", period,
+        lambda: tuple(_get_learned_word_ids(db, child.id, period)),
+    )
+    word_ids = reservoir_sample(candidates, QUIZ_SIZE)
+    response.headers[quiz_sessions.HEADER] = quiz_sessions.issue(child.id, "review", word_ids)
+    return catalog.get(db).get_many(db, word_ids)
+
+
+def _recent_by_word(child_id: int, cutoff: datetime):
+    """Per-word attempts and pure-correct answers since cutoff. Reads only the
+    window's records (ix_learning_records_child_answered)."""
+    outcome = LearningRecord.outcome
+    return (
+        select(
+            LearningRecord.word_id,
+            func.count().label("attempts"),
+            func.sum(case((outcome == OUTCOME_CORRECT, 1), else_=0)).label("correct"),
+        )
+        .where(LearningRecord.child_id == child_id, LearningRecord.answered_at >= cutoff)
+        .group_by(LearningRecord.word_id)
+        .subquery()
     )
-    return words
 
 
-def _get_weak_word_ids(db: Session, child_id: int, period: str | None = None):
-    total = func.count(LearningRecord.id).label("total")
-    pure_correct = func.sum(case(
-        (and_(LearningRecord.is_correct == True, LearningRecord.used_hint == False), 1),
-        else_=0,
-    ))
-
-    query = (
-        db.query(LearningRecord.word_id)
-        .filter(LearningRecord.child_id == child_id)
+def _weak_rates(recent):
+    """(accuracy within the last 30 days, accuracy before them) per
+    word_mastery row outer-joined to recent. The earlier part is the whole
+    history minus the window; NULL where a part has no answers."""
+    m = WordMastery
+    before = m.attempts - func.coalesce(recent.c.attempts, 0)
+    return (
+        recent.c.correct * 1.0 / recent.c.attempts,
+        (m.correct - func.coalesce(recent.c.correct, 0)) * 1.0 / func.nullif(before, 0),
     )
 
-    if period:
-        now = datetime.now(timezone.utc)
-        if period == "month":
-            cutoff = now - timedelta(days=30)
-            query = query.filter(LearningRecord.answered_at >= cutoff)
-        elif period == "over_month":
-            cutoff = now - timedelta(days=30)
-            query = query.filter(LearningRecord.answered_at < cutoff)
 
-    rows = (
-        query
-        .group_by(LearningRecord.word_id)
-        .having(pure_correct * 1.0 / func.count(LearningRecord.id) < 0.9)
-        .all()
+def _weak_word_query(db: Session, child_id: int, period: str | None = None):
+    # Accuracy over the answers in the period: the whole history for "all",
+    # the last 30 days for "month", everything before them for "over_month"
+    if period in ("month", "over_month"):
+        recent = _recent_by_word(child_id, datetime.now(timezone.utc) - timedelta(days=30))
+        month_rate, over_month_rate = _weak_rates(recent)
+        rate = month_rate if period == "month" else over_month_rate
+        return (
+            db.query(WordMastery.word_id, (1 - rate).label("error_rate"))
+            .outerjoin(recent, recent.c.word_id == WordMastery.word_id)
+            .filter(WordMastery.child_id == child_id, rate < 0.9)
+        )
+    rate = WordMastery.correct * 1.0 / WordMastery.attempts
+    return (
+        db.query(WordMastery.word_id, (1 - rate).label("error_rate"))
+        .filter(WordMastery.child_id == child_id, rate < 0.9)
     )
-    return [row[0] for row in rows]
+
+
+def _get_weak_word_ids(db: Session, child_id: int, period: str | None = None):
+    return [row.word_id for row in _weak_word_query(db, child_id, period).all()]
 
 
 @router.get("/weak", response_model=list[QuizWord])
 def weak_words(
+    response: Response,
     period: str = Query("all"),
-    child: User = Depends(require_child),
-    db: Session = Depends(get_db),
+    child: Principal = Depends(require_child),
+    db: Session = Depends(get_read_db),
 ):
-    word_ids = _get_weak_word_ids(db, child.id, period if period != "all" else None)
-    if not word_ids:
-        return []
-    words = (
-        db.query(Word)
-        .filter(Word.id.in_(word_ids))
-        .order_by(func.random())
-        .limit(10)
-        .all()
+    writebehind.sync(child.id)
+    period = period if period != "all" else None
+    rows = view_cache.cached(
+        child.id, "weak", period,
+        lambda: tuple(tuple(row) for row in _weak_word_query(db, child.id, period)),
     )
-    return words
+    word_ids = [word_id for word_id, _ in rows]
+    if WEAK_WEIGHTED:
+        # Words missed more often come up more often
+        word_ids = weighted_sample(word_ids, [error_rate for _, error_rate in rows], QUIZ_SIZE)
+    else:
+        word_ids = random.sample(word_ids, min(QUIZ_SIZE, len(word_ids)))
+    response.headers[quiz_sessions.HEADER] = quiz_sessions.issue(child.id, "weak", word_ids)
+    return catalog.get(db).get_many(db, word_ids)
+
+
+def _submit_answers(
+    db: Session,
+    child_id: int,
+    items: list[AnswerSubmit],
+    session: quiz_sessions.QuizSession | None = None,
+) -> list[AnswerResult]:
+    """Grade items against the catalog and store them in one transaction.
+
+    With a quiz session every item must be one of its words, answered in
+    its session type. An item whose idempotency_key is already stored for
+    the child is not recorded again; its stored result is returned instead.
+    """
+    words = catalog.get(db)
+    graded = []
+    for data in items:
+        if session is not None:
+            quiz_sessions.check(session, data.word_id, data.session_type)
+        word = words.get(db, data.word_id)
+        if not word:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="単語が見つかりません",
+            )
+        graded.append((data, word, data.answer.strip().lower() == word.english.lower()))
+
+    now = datetime.now(timezone.utc)
+    keys = {data.idempotency_key for data in items if data.idempotency_key}
+
+    def new_record(data: AnswerSubmit, is_correct: bool) -> LearningRecord:
+        return LearningRecord(
+            child_id=child_id,
+            word_id=data.word_id,
+            is_correct=is_correct,
+            used_hint=data.used_hint,
+            answered_at=now,
+            session_type=data.session_type,
+            idempotency_key=data.idempotency_key,
+        )
+
+    def write(s: Session) -> list[bool]:
+        stored = {}
+        if keys:
+            stored = dict(
+                s.query(LearningRecord.idempotency_key, LearningRecord.outcome)
+                .filter(LearningRecord.child_id == child_id, LearningRecord.idempotency_key.in_(keys))
+            )
+        results = []
+        for data, word, is_correct in graded:
+            key = data.idempotency_key
+            if key in stored:
+                results.append(bool(stored[key] & OUTCOME_CORRECT))
+                continue
+            record = new_record(data, is_correct)
+            s.add(record)
+            if key:
+                stored[key] = record.outcome
+            results.append(is_correct)
+        s.flush()
+        return results
+
+    if writebehind.buffer is not None and not keys:
+        # Keyed answers need the stored ones checked first, so only unkeyed
+        # ones are buffered
+        writebehind.buffer.add([new_record(data, is_correct) for data, _, is_correct in graded])
+        outcomes = [is_correct for _, _, is_correct in graded]
+    else:
+        try:
+            outcomes = run_write(db, write)
+        except IntegrityError:
+            # A concurrent retry stored one of the keys first; this pass sees it
+            db.rollback()
+            outcomes = run_write(db, write)
+    return [
+        AnswerResult(
+            is_correct=is_correct,
+            correct_answer=word.english,
+            english_katakana=word.english_katakana,
+        )
+        for (_, word, _), is_correct in zip(graded, outcomes)
+    ]
+
+
+def _submit_answer(
+    db: Session,
+    child_id: int,
+    data: AnswerSubmit,
+    session: quiz_sessions.QuizSession | None = None,
+) -> AnswerResult:
+    return _submit_answers(db, child_id, [data], session)[0]
 
 
 @router.post("/answer", response_model=AnswerResult)
 def submit_answer(
     data: AnswerSubmit,
-    child: User = Depends(require_child),
+    quiz_session: str | None = Header(None, alias=quiz_sessions.HEADER),
+    child: Principal = Depends(require_child),
     db: Session = Depends(get_db),
 ):
-    word = db.query(Word).filter(Word.id == data.word_id).first()
-    if not word:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="単語が見つかりません",
-        )
-    is_correct = data.answer.strip().lower() == word.english.lower()
-    record = LearningRecord(
-        child_id=child.id,
-        word_id=data.word_id,
-        is_correct=is_correct,
-        used_hint=data.used_hint,
-        answered_at=datetime.now(timezone.utc),
-        session_type=data.session_type,
-    )
-    db.add(record)
-    db.commit()
-    return AnswerResult(
-        is_correct=is_correct,
-        correct_answer=word.english,
-        english_katakana=word.english_katakana,
-    )
+    session = quiz_sessions.resolve(quiz_session, child.id)
+    return _submit_answer(db, child.id, data, session)
 
 
-@router.get("/menu-status", response_model=MenuStatus)
-def menu_status(
-    child: User = Depends(require_child),
+@router.post("/answers", response_model=list[AnswerResult])
+def submit_answers(
+    data: AnswerBatch,
+    quiz_session: str | None = Header(None, alias=quiz_sessions.HEADER),
+    child: Principal = Depends(require_child),
     db: Session = Depends(get_db),
 ):
-    progress = _get_progress(db, child.id)
-    today_count = db.query(Word).filter(Word.section == progress.current_section).count()
-
-    today_jst = _get_today_jst().date().isoformat()
-    studied_today = (
-        db.query(LearningRecord)
-        .filter(
-            LearningRecord.child_id == child.id,
-            func.date(LearningRecord.answered_at, "+9 hours")
-            == today_jst,
-        )
-        .first()
-    ) is not None
+    session = quiz_sessions.resolve(quiz_session, child.id)
+    return _submit_answers(db, child.id, data.answers, session)
+
+
+def _menu_status_params(db: Session, child_id: int) -> tuple:
+    # Counts use the JST date and the section size, so both are in the key
+    return (_get_today_jst().date(), catalog.get(db).version)
+
 
-    review_week = len(_get_learned_word_ids(db, child.id, "week"))
-    review_month = len(_get_learned_word_ids(db, child.id, "month"))
-    review_over_month = len(_get_learned_word_ids(db, child.id, "over_month"))
-    review_all = len(_get_learned_word_ids(db, child.id, None))
+def _menu_status(db: Session, child_id: int) -> MenuStatus:
+    writebehind.sync(child_id)
+    params = _menu_status_params(db, child_id)
+    return view_cache.cached(child_id, "menu_status", params, lambda: _count_menu_status(db, child_id))
 
-    weak_month = len(_get_weak_word_ids(db, child.id, "month"))
-    weak_over_month = len(_get_weak_word_ids(db, child.id, "over_month"))
-    weak_all = len(_get_weak_word_ids(db, child.id, None))
+
+def _count_menu_status(db: Session, child_id: int) -> MenuStatus:
+    # Everything in one statement: conditional counts over the child's
+    # word_mastery rows, joined to the last 30 days of records for the
+    # windowed weak counts
+    now = datetime.now(timezone.utc)
+    week = now - timedelta(days=7)
+    month = now - timedelta(days=30)
+    today_start = datetime.combine(_get_today_jst().date(), datetime.min.time()) - timedelta(hours=9)
+
+    m = WordMastery
+    weak = m.correct * 1.0 / m.attempts < 0.9
+    recent = _recent_by_word(child_id, month)
+    month_rate, over_month_rate = _weak_rates(recent)
+
+    def counted(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+    section = (
+        select(ChildProgress.current_section)
+        .where(ChildProgress.child_id == child_id)
+        .scalar_subquery()
+    )
+    row = db.execute(
+        select(
+            section.label("section"),
+            counted(m.last_at >= today_start).label("studied_today"),
+            counted(m.last_at >= week).label("review_week"),
+            counted(m.last_at >= month).label("review_month"),
+            counted(m.first_at < month).label("review_over_month"),
+            func.count(m.word_id).label("review_all"),
+            counted(month_rate < 0.9).label("weak_month"),
+            counted(over_month_rate < 0.9).label("weak_over_month"),
+            counted(weak).label("weak_all"),
+        )
+        .select_from(m)
+        .outerjoin(recent, recent.c.word_id == m.word_id)
+        .where(m.child_id == child_id)
+    ).one()
+
+    current_section = row.section
+    if current_section is None:
+        current_section = _get_progress(db, child_id).current_section
 
     return MenuStatus(
-        today=today_count,
-        studied_today=studied_today,
-        review_week=review_week,
-        review_month=review_month,
-        review_over_month=review_over_month,
-        review_all=review_all,
-        weak_month=weak_month,
-        weak_over_month=weak_over_month,
-        weak_all=weak_all,
+        today=catalog.get(db).section_size(current_section),
+        studied_today=bool(row.studied_today),
+        review_week=row.review_week,
+        review_month=row.review_month,
+        review_over_month=row.review_over_month,
+        review_all=row.review_all,
+        weak_month=row.weak_month,
+        weak_over_month=row.weak_over_month,
+        weak_all=row.weak_all,
     )
 
 
+@router.get("/menu-status", response_model=MenuStatus)
+def menu_status(
+    child: Principal = Depends(require_child),
+    db: Session = Depends(get_read_db),
+):
+    return _menu_status(db, child.id)
+
+
 @router.get("/stats")
 def my_stats(
     year: int = Query(..., ge=2000, le=2100),
     month: int = Query(..., ge=1, le=12),
-    child: User = Depends(require_child),
-    db: Session = Depends(get_db),
+    child: Principal = Depends(require_child),
+    db: Session = Depends(get_read_db),
 ):
-    from app.api.parent import child_stats as _parent_child_stats
-    from types import SimpleNamespace
-
-    # Reuse parent stats logic but with child's own ID
-    from calendar import monthrange
-    from datetime import date
-
-    jst_date = func.date(LearningRecord.answered_at, "+9 hours")
-
-    start_date = date(year, month, 1)
-    _, last_day = monthrange(year, month)
-    end_date = date(year, month, last_day)
-
-    start_str = start_date.isoformat()
-    end_str = end_date.isoformat()
-
-    from app.schemas import DailyStat
-
-    rows = (
-        db.query(
-            jst_date.label("date"),
-            func.sum(case(
-                (and_(
-                    LearningRecord.session_type == "today",
-                    LearningRecord.is_correct == True,
-                    LearningRecord.used_hint == False,
-                ), 1), else_=0,
-            )).label("today_correct"),
-            func.sum(case(
-                (and_(
-                    LearningRecord.session_type == "today",
-                    LearningRecord.is_correct == True,
-                    LearningRecord.used_hint == True,
-                ), 1), else_=0,
-            )).label("today_hint"),
-            func.sum(case(
-                (and_(
-                    LearningRecord.session_type == "today",
-                    LearningRecord.is_correct == False,
-                ), 1), else_=0,
-            )).label("today_incorrect"),
-            func.sum(case(
-                (and_(
-                    LearningRecord.session_type == "review",
-                    LearningRecord.is_correct == True,
-                    LearningRecord.used_hint == False,
-                ), 1), else_=0,
-            )).label("review_correct"),
-            func.sum(case(
-                (and_(
-                    LearningRecord.session_type == "review",
-                    LearningRecord.is_correct == True,
-                    LearningRecord.used_hint == True,
-                ), 1), else_=0,
-            )).label("review_hint"),
-            func.sum(case(
-                (and_(
-                    LearningRecord.session_type == "review",
-                    LearningRecord.is_correct == False,
-                ), 1), else_=0,
-            )).label("review_incorrect"),
-            func.sum(case(
-                (and_(
-                    LearningRecord.session_type == "weak",
-                    LearningRecord.is_correct == True,
-                    LearningRecord.used_hint == False,
-                ), 1), else_=0,
-            )).label("weak_correct"),
-            func.sum(case(
-                (and_(
-                    LearningRecord.session_type == "weak",
-                    LearningRecord.is_correct == True,
-                    LearningRecord.used_hint == True,
-                ), 1), else_=0,
-            )).label("weak_hint"),
-            func.sum(case(
-                (and_(
-                    LearningRecord.session_type == "weak",
-                    LearningRecord.is_correct == False,
-                ), 1), else_=0,
-            )).label("weak_incorrect"),
-        )
-        .filter(
-            LearningRecord.child_id == child.id,
-            jst_date >= start_str,
-            jst_date <= end_str,
-        )
-        .group_by(jst_date)
-        .all()
-    )
-
-    stats_map = {}
-    for row in rows:
-        stats_map[row.date] = DailyStat(
-            date=row.date,
-            today_correct=row.today_correct or 0,
-            today_hint=row.today_hint or 0,
-            today_incorrect=row.today_incorrect or 0,
-            review_correct=row.review_correct or 0,
-            review_hint=row.review_hint or 0,
-            review_incorrect=row.review_incorrect or 0,
-            weak_correct=row.weak_correct or 0,
-            weak_hint=row.weak_hint or 0,
-            weak_incorrect=row.weak_incorrect or 0,
-        )
-
-    result = []
-    current = start_date
-    while current <= end_date:
-        date_str = current.isoformat()
-        if date_str in stats_map:
-            result.append(stats_map[date_str])
-        else:
-            result.append(DailyStat(
-                date=date_str,
-                today_correct=0, today_hint=0, today_incorrect=0,
-                review_correct=0, review_hint=0, review_incorrect=0,
-                weak_correct=0, weak_hint=0, weak_incorrect=0,
-            ))
-        current += timedelta(days=1)
-
-    return result
+    return _get_daily_stats(db, child.id, year, month)
 
 
 @router.get("/weak-words", response_model=list[WeakWordOut])
 def my_weak_words(
     sort_by: str = Query("accuracy"),
     order: str = Query("asc"),
-    child: User = Depends(require_child),
-    db: Session = Depends(get_db),
+    child: Principal = Depends(require_child),
+    db: Session = Depends(get_read_db),
 ):
     return _get_weak_words(db, child.id, sort_by, order)
@@ -2,21 +2,39 @@ from calendar import monthrange
 from datetime import date, timedelta
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import and_, case, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app.auth import hash_password, require_parent
-from app.database import get_db
-from app.models import ChildProgress, LearningRecord, User, Word
-from app.schemas import ChildCreate, ChildOut, ChildPasswordUpdate, DailyStat, WeakWordOut
+from app.auth import (
+    Principal,
+    hash_password,
+    hash_passwords,
+    invalidate_principal,
+    require_parent,
+    token_versions,
+)
+from app.database import get_db, get_read_db
+from app import sharding, view_cache, writebehind
+from app.catalog import catalog
+from app.models import ChildProgress, DailyRollup, LearningRecord, User, Word, WordMastery
+from app.schemas import (
+    ChildBulkCreate,
+    ChildBulkResult,
+    ChildCreate,
+    ChildOut,
+    ChildPasswordUpdate,
+    DailyStat,
+    WeakWordOut,
+)
+from app.writer import run_write
 
 router = APIRouter(prefix="/api/parent", tags=["parent"])
 
 
 @router.get("/children", response_model=list[ChildOut])
 def list_children(
-    parent: User = Depends(require_parent),
-    db: Session = Depends(get_db),
+    parent: Principal = Depends(require_parent),
+    db: Session = Depends(get_read_db),
 ):
     children = db.query(User).filter(User.parent_id == parent.id).all()
     return children
@@ -25,33 +43,87 @@ def list_children(
 @router.post("/children", response_model=ChildOut, status_code=status.HTTP_201_CREATED)
 def create_child(
     data: ChildCreate,
-    parent: User = Depends(require_parent),
+    parent: Principal = Depends(require_parent),
     db: Session = Depends(get_db),
 ):
-    if db.query(User).filter(User.username == data.username).first():
+    if sharding.username_taken(db, data.username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="このユーザー名は既に使用されています",
         )
-    child = User(
-        username=data.username,
-        hashed_password=hash_password(data.password),
-        role="child",
-        parent_id=parent.id,
-    )
-    db.add(child)
-    db.flush()
-    progress = ChildProgress(child_id=child.id)
-    db.add(progress)
-    db.commit()
-    db.refresh(child)
-    return child
+    hashed = hash_password(data.password)
+
+    def create(s: Session) -> int:
+        [child_id] = sharding.reserve_user_ids(s, [data.username], parent.id)
+        child = User(
+            id=child_id,
+            username=data.username,
+            hashed_password=hashed,
+            role="child",
+            parent_id=parent.id,
+        )
+        s.add(child)
+        s.flush()
+        s.add(ChildProgress(child_id=child.id))
+        return child.id
+
+    return db.get(User, run_write(db, create))
+
+
+@router.post(
+    "/children/bulk",
+    response_model=list[ChildBulkResult],
+    status_code=status.HTTP_201_CREATED,
+)
+def create_children_bulk(
+    data: ChildBulkCreate,
+    parent: Principal = Depends(require_parent),
+    db: Session = Depends(get_db),
+):
+    taken = sharding.usernames_taken(db, [c.username for c in data.children])
+
+    to_create = []
+    results = []
+    for c in data.children:
+        if c.username in taken:
+            results.append(ChildBulkResult(username=c.username, status="duplicate"))
+            continue
+        taken.add(c.username)
+        to_create.append((len(results), c))
+        results.append(ChildBulkResult(username=c.username, status="created"))
+
+    hashed = hash_passwords([c.password for _, c in to_create])
+
+    def create(s: Session) -> list[int]:
+        ids = sharding.reserve_user_ids(s, [c.username for _, c in to_create], parent.id)
+        children = [
+            User(id=uid, username=c.username, hashed_password=h, role="child", parent_id=parent.id)
+            for (_, c), h, uid in zip(to_create, hashed, ids)
+        ]
+        s.add_all(children)
+        s.flush()
+        s.add_all(ChildProgress(child_id=child.id) for child in children)
+        return [child.id for child in children]
+
+    try:
+        child_ids = run_write(db, create)
+    except IntegrityError:
+        # A concurrent request took one of the names while we were hashing
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="他の操作で同じユーザー名が登録されました。もう一度お試しください",
+        )
+
+    for (i, _), child_id in zip(to_create, child_ids):
+        results[i].id = child_id
+    return results
 
 
 @router.delete("/children/{child_id}")
 def delete_child(
     child_id: int,
-    parent: User = Depends(require_parent),
+    parent: Principal = Depends(require_parent),
     db: Session = Depends(get_db),
 ):
     child = db.query(User).filter(User.id == child_id, User.parent_id == parent.id).first()
@@ -60,10 +132,17 @@ def delete_child(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="子アカウントが見つかりません",
         )
-    db.query(LearningRecord).filter(LearningRecord.child_id == child_id).delete()
-    db.query(ChildProgress).filter(ChildProgress.child_id == child_id).delete()
-    db.delete(child)
-    db.commit()
+    writebehind.sync(child_id)
+
+    def delete(s: Session) -> None:
+        s.query(LearningRecord).filter(LearningRecord.child_id == child_id).delete()
+        s.query(ChildProgress).filter(ChildProgress.child_id == child_id).delete()
+        s.delete(s.get(User, child_id))
+        sharding.release_user(s, child_id)
+        token_versions.bump(s, child_id)
+
+    run_write(db, delete)
+    invalidate_principal(child_id)
     return {"detail": "子アカウントを削除しました"}
 
 
@@ -71,7 +150,7 @@ def delete_child(
 def update_child_password(
     child_id: int,
     data: ChildPasswordUpdate,
-    parent: User = Depends(require_parent),
+    parent: Principal = Depends(require_parent),
     db: Session = Depends(get_db),
 ):
     child = db.query(User).filter(User.id == child_id, User.parent_id == parent.id).first()
@@ -80,166 +159,93 @@ def update_child_password(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="子アカウントが見つかりません",
         )
-    child.hashed_password = hash_password(data.password)
-    db.commit()
+    hashed = hash_password(data.password)
+
+    def update(s: Session) -> None:
+        s.get(User, child_id).hashed_password = hashed
+        token_versions.bump(s, child_id)
+
+    run_write(db, update)
+    invalidate_principal(child_id)
     return {"detail": "パスワードを更新しました"}
 
 
-@router.get("/children/{child_id}/stats", response_model=list[DailyStat])
-def child_stats(
-    child_id: int,
-    year: int = Query(..., ge=2000, le=2100),
-    month: int = Query(..., ge=1, le=12),
-    parent: User = Depends(require_parent),
-    db: Session = Depends(get_db),
-):
-    child = db.query(User).filter(User.id == child_id, User.parent_id == parent.id).first()
+def _get_child(db: Session, parent_id: int, child_id: int) -> User:
+    child = db.query(User).filter(User.id == child_id, User.parent_id == parent_id).first()
     if not child:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="子アカウントが見つかりません",
         )
+    return child
 
-    jst_date = func.date(LearningRecord.answered_at, "+9 hours")
 
+def _get_daily_stats(db: Session, child_id: int, year: int, month: int) -> list[DailyStat]:
+    writebehind.sync(child_id)
+    return view_cache.cached(
+        child_id, "daily_stats", (year, month),
+        lambda: _compute_daily_stats(db, child_id, year, month),
+    )
+
+
+def _compute_daily_stats(db: Session, child_id: int, year: int, month: int) -> list[DailyStat]:
     start_date = date(year, month, 1)
     _, last_day = monthrange(year, month)
     end_date = date(year, month, last_day)
 
-    start_str = start_date.isoformat()
-    end_str = end_date.isoformat()
-
-    rows = (
-        db.query(
-            jst_date.label("date"),
-            # today
-            func.sum(case(
-                (and_(
-                    LearningRecord.session_type == "today",
-                    LearningRecord.is_correct == True,
-                    LearningRecord.used_hint == False,
-                ), 1),
-                else_=0,
-            )).label("today_correct"),
-            func.sum(case(
-                (and_(
-                    LearningRecord.session_type == "today",
-                    LearningRecord.is_correct == True,
-                    LearningRecord.used_hint == True,
-                ), 1),
-                else_=0,
-            )).label("today_hint"),
-            func.sum(case(
-                (and_(
-                    LearningRecord.session_type == "today",
-                    LearningRecord.is_correct == False,
-                ), 1),
-                else_=0,
-            )).label("today_incorrect"),
-            # review
-            func.sum(case(
-                (and_(
-                    LearningRecord.session_type == "review",
-                    LearningRecord.is_correct == True,
-                    LearningRecord.used_hint == False,
-                ), 1),
-                else_=0,
-            )).label("review_correct"),
-            func.sum(case(
-                (and_(
-                    LearningRecord.session_type == "review",
-                    LearningRecord.is_correct == True,
-                    LearningRecord.used_hint == True,
-                ), 1),
-                else_=0,
-            )).label("review_hint"),
-            func.sum(case(
-                (and_(
-                    LearningRecord.session_type == "review",
-                    LearningRecord.is_correct == False,
-                ), 1),
-                else_=0,
-            )).label("review_incorrect"),
-            # weak
-            func.sum(case(
-                (and_(
-                    LearningRecord.session_type == "weak",
-                    LearningRecord.is_correct == True,
-                    LearningRecord.used_hint == False,
-                ), 1),
-                else_=0,
-            )).label("weak_correct"),
-            func.sum(case(
-                (and_(
-                    LearningRecord.session_type == "weak",
-                    LearningRecord.is_correct == True,
-                    LearningRecord.used_hint == True,
-                ), 1),
-                else_=0,
-            )).label("weak_hint"),
-            func.sum(case(
-                (and_(
-                    LearningRecord.session_type == "weak",
-                    LearningRecord.is_correct == False,
-                ), 1),
-                else_=0,
-            )).label("weak_incorrect"),
-        )
-        .filter(
-            LearningRecord.child_id == child_id,
-            jst_date >= start_str,
-            jst_date <= end_str,
-        )
-        .group_by(jst_date)
-        .all()
+    # At most 31 days x 3 session types of rows, kept by app.rollups
+    counts: dict[date, dict[str, int]] = {}
+    rows = db.query(DailyRollup).filter(
+        DailyRollup.child_id == child_id,
+        DailyRollup.day >= start_date,
+        DailyRollup.day <= end_date,
     )
-
-    stats_map = {}
     for row in rows:
-        stats_map[row.date] = DailyStat(
-            date=row.date,
-            today_correct=row.today_correct or 0,
-            today_hint=row.today_hint or 0,
-            today_incorrect=row.today_incorrect or 0,
-            review_correct=row.review_correct or 0,
-            review_hint=row.review_hint or 0,
-            review_incorrect=row.review_incorrect or 0,
-            weak_correct=row.weak_correct or 0,
-            weak_hint=row.weak_hint or 0,
-            weak_incorrect=row.weak_incorrect or 0,
-        )
+        day = counts.setdefault(row.day, {})
+        day[f"{row.session_type}_correct"] = row.correct
+        day[f"{row.session_type}_hint"] = row.hinted
+        day[f"{row.session_type}_incorrect"] = row.incorrect
 
     result = []
     current = start_date
     while current <= end_date:
-        date_str = current.isoformat()
-        if date_str in stats_map:
-            result.append(stats_map[date_str])
-        else:
-            result.append(DailyStat(
-                date=date_str,
-                today_correct=0,
-                today_hint=0,
-                today_incorrect=0,
-                review_correct=0,
-                review_hint=0,
-                review_incorrect=0,
-                weak_correct=0,
-                weak_hint=0,
-                weak_incorrect=0,
-            ))
+        stats = counts.get(current, {})
+        result.append(DailyStat(
+            date=current.isoformat(),
+            today_correct=stats.get("today_correct", 0),
+            today_hint=stats.get("today_hint", 0),
+            today_incorrect=stats.get("today_incorrect", 0),
+            review_correct=stats.get("review_correct", 0),
+            review_hint=stats.get("review_hint", 0),
+            review_incorrect=stats.get("review_incorrect", 0),
+            weak_correct=stats.get("weak_correct", 0),
+            weak_hint=stats.get("weak_hint", 0),
+            weak_incorrect=stats.get("weak_incorrect", 0),
+        ))
         current += timedelta(days=1)
 
     return result
 
 
+@router.get("/children/{child_id}/stats", response_model=list[DailyStat])
+def child_stats(
+    child_id: int,
+    year: int = Query(..., ge=2000, le=2100),
+    month: int = Query(..., ge=1, le=12),
+    parent: Principal = Depends(require_parent),
+    db: Session = Depends(get_read_db),
+):
+    _get_child(db, parent.id, child_id)
+    return _get_daily_stats(db, child_id, year, month)
+
+
 @router.get("/children/{child_id}/weak-words", response_model=list[WeakWordOut])
 def child_weak_words(
     child_id: int,
     sort_by: str = Query("accuracy"),
     order: str = Query("asc"),
-    parent: User = Depends(require_parent),
-    db: Session = Depends(get_db),
+    parent: Principal = Depends(require_parent),
+    db: Session = Depends(get_read_db),
 ):
     child = db.query(User).filter(User.id == child_id, User.parent_id == parent.id).first()
     if not child:
@@ -252,54 +258,49 @@ def child_weak_words(
 
 
 def _get_weak_words(db: Session, child_id: int, sort_by: str, order: str) -> list[WeakWordOut]:
+    writebehind.sync(child_id)
     if order not in ("asc", "desc"):
         order = "asc"
+    # The report joins words, so a catalog change is a different entry
+    version = catalog.get(db).version
+    return view_cache.cached(
+        child_id, "weak_words", (sort_by, order, version),
+        lambda: _compute_weak_words(db, child_id, sort_by, order),
+    )
 
-    total = func.count(LearningRecord.id).label("total_attempts")
-    correct_count = func.sum(case(
-        (LearningRecord.is_correct == True, 1),
-        else_=0,
-    )).label("correct_count")
-    hint_count = func.sum(case(
-        (and_(LearningRecord.is_correct == True, LearningRecord.used_hint == True), 1),
-        else_=0,
-    )).label("hint_count")
-    pure_correct = func.sum(case(
-        (and_(LearningRecord.is_correct == True, LearningRecord.used_hint == False), 1),
-        else_=0,
-    ))
 
+def _compute_weak_words(db: Session, child_id: int, sort_by: str, order: str) -> list[WeakWordOut]:
     rows = (
         db.query(
             Word.id,
             Word.english,
             Word.japanese,
             Word.english_katakana,
-            total,
-            correct_count,
-            hint_count,
+            WordMastery.attempts,
+            WordMastery.correct,
+            WordMastery.hinted,
+        )
+        .join(WordMastery, WordMastery.word_id == Word.id)
+        .filter(
+            WordMastery.child_id == child_id,
+            WordMastery.correct * 1.0 / WordMastery.attempts < 0.9,
         )
-        .join(LearningRecord, LearningRecord.word_id == Word.id)
-        .filter(LearningRecord.child_id == child_id)
-        .group_by(Word.id)
-        .having(pure_correct * 1.0 / func.count(LearningRecord.id) < 0.9)
         .all()
     )
 
-    result = []
-    for row in rows:
-        pure = row.correct_count - row.hint_count if row.correct_count and row.hint_count else (row.correct_count or 0)
-        accuracy = round(pure / row.total_attempts, 3) if row.total_attempts else 0.0
-        result.append(WeakWordOut(
+    result = [
+        WeakWordOut(
             id=row.id,
             english=row.english,
             japanese=row.japanese,
             english_katakana=row.english_katakana,
-            total_attempts=row.total_attempts,
-            correct_count=pure,
-            hint_count=row.hint_count or 0,
-            accuracy=accuracy,
-        ))
+            total_attempts=row.attempts,
+            correct_count=row.correct,
+            hint_count=row.hinted,
+            accuracy=round(row.correct / row.attempts, 3),
+        )
+        for row in rows
+    ]
 
     sort_key_map = {
         "accuracy": lambda x: x.accuracy,
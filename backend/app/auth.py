@@ -1,24 +1,130 @@
+import threading
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 
-import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.config import ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, SECRET_KEY
-from app.database import get_db
-from app.models import User
+from app.cache import CoherentCache, LRUCache, versions
+from app.config import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    ALGORITHM,
+    PRINCIPAL_CACHE_SIZE,
+    PRINCIPAL_CACHE_TTL_SECONDS,
+    SECRET_KEY,
+    SHARD_DIR,
+    TOKEN_FORMAT,
+)
+from app.database import get_async_db, get_db
+from app.hashing import hasher
+from app.models import TokenVersion, User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 
+@dataclass(frozen=True)
+class Principal:
+    """Snapshot of the authenticated user, safe to share across requests."""
+
+    id: int
+    username: str
+    role: str
+    parent_id: int | None = None
+    email: str | None = None
+    created_at: datetime | None = None
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            role=user.role,
+            parent_id=user.parent_id,
+            email=user.email,
+            created_at=user.created_at,
+        )
+
+
+def _user_scope(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+# token -> Principal. A hit skips both the JWT decode and the users lookup.
+principal_cache = CoherentCache(
+    LRUCache(PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS), versions
+)
+
+
+def invalidate_principal(user_id: int) -> None:
+    """Drop cached principals and token versions for the user in every worker.
+    Call after the change is committed."""
+    principal_cache.invalidate(_user_scope(user_id))
+
+
+class TokenVersionTable:
+    """In-memory mirror of token_versions, loaded lazily per user and
+    reloaded when the user's version stamp moves or after ttl seconds.
+
+    The TTL bounds how long a revocation can go unseen when its stamp bump
+    is lost (made during a cache backend outage by a worker that restarted
+    before replaying it).
+    """
+
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        # user_id -> (stamp, version, expires_at)
+        self._versions: dict[int, tuple[int, int, float]] = {}
+        self._lock = threading.Lock()
+
+    def current(self, db: Session, user_id: int) -> int:
+        stamp = versions.get(_user_scope(user_id))
+        entry = self._versions.get(user_id)
+        now = time.monotonic()
+        if stamp is not None and entry is not None and entry[0] == stamp and entry[2] > now:
+            return entry[1]
+        row = db.get(TokenVersion, user_id)
+        version = row.version if row else 0
+        if stamp is not None:
+            with self._lock:
+                self._versions[user_id] = (stamp, version, now + self.ttl)
+        return version
+
+    def bump(self, db: Session, user_id: int) -> None:
+        """Revoke the user's claims tokens. Takes effect when db commits."""
+        row = db.get(TokenVersion, user_id)
+        if row is None:
+            row = TokenVersion(user_id=user_id, version=0)
+            db.add(row)
+        row.version += 1
+        with self._lock:
+            self._versions.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._versions.clear()
+
+
+token_versions = TokenVersionTable()
+
+
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    return hasher.hash(password)
+
+
+def hash_passwords(passwords: list[str]) -> list[str]:
+    return hasher.hash_many(passwords)
 
 
 def verify_password(plain: str, hashed: str) -> bool:
-    return bcrypt.checkpw(plain.encode(), hashed.encode())
+    return hasher.verify(plain, hashed)
+
+
+def password_needs_rehash(hashed: str) -> bool:
+    return hasher.needs_rehash(hashed)
 
 
 def create_access_token(data: dict) -> str:
@@ -28,10 +134,19 @@ def create_access_token(data: dict) -> str:
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
-) -> User:
+def create_user_token(db: Session, user: User) -> str:
+    if TOKEN_FORMAT != "claims":
+        return create_access_token(data={"sub": user.username})
+    return create_access_token(data={
+        "sub": user.username,
+        "uid": user.id,
+        "role": user.role,
+        "pid": user.parent_id,
+        "ver": token_versions.current(db, user.id),
+    })
+
+
+def _authenticate(db: Session, token: str) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="認証情報が無効です",
@@ -45,25 +160,82 @@ def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
+    if "uid" in payload:
+        # Claims token: authorize without loading the user row
+        stamp = principal_cache.stamp(_user_scope(payload["uid"]))
+        if payload.get("ver") != token_versions.current(db, payload["uid"]):
+            raise credentials_exception
+        principal = Principal(
+            id=payload["uid"],
+            username=username,
+            role=payload["role"],
+            parent_id=payload.get("pid"),
+        )
+    elif SHARD_DIR:
+        # Without claims there is no way to pick the family shard
         raise credentials_exception
-    return user
+    else:
+        user = db.query(User).filter(User.username == username).first()
+        if user is None:
+            raise credentials_exception
+        stamp = principal_cache.stamp(_user_scope(user.id))
+        principal = Principal.from_user(user)
+    # Never keep an entry past the token's own expiry
+    exp = payload.get("exp")
+    principal_cache.set(
+        token,
+        principal,
+        scope=_user_scope(principal.id),
+        stamp=stamp,
+        ttl=exp - time.time() if exp else None,
+    )
+    return principal
 
 
-def require_parent(current_user: User = Depends(get_current_user)) -> User:
-    if current_user.role != "parent":
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="親アカウントのみ利用可能です",
-        )
-    return current_user
+def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db),
+) -> Principal:
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+    return _authenticate(db, token)
+
+
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
+) -> Principal:
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+    return await db.run_sync(_authenticate, token)
 
 
-def require_child(current_user: User = Depends(get_current_user)) -> User:
-    if current_user.role != "child":
+def _check_role(principal: Principal, role: str) -> Principal:
+    if principal.role != role:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="子アカウントのみ利用可能です",
+            detail="親アカウントのみ利用可能です" if role == "parent" else "子アカウントのみ利用可能です",
         )
-    return current_user
+    return principal
+
+
+def require_parent(current_user: Principal = Depends(get_current_user)) -> Principal:
+    return _check_role(current_user, "parent")
+
+
+def require_child(current_user: Principal = Depends(get_current_user)) -> Principal:
+    return _check_role(current_user, "child")
+
+
+async def require_parent_async(
+    current_user: Principal = Depends(get_current_user_async),
+) -> Principal:
+    return _check_role(current_user, "parent")
+
+
+async def require_child_async(
+    current_user: Principal = Depends(get_current_user_async),
+) -> Principal:
+    return _check_role(current_user, "child")
@@ -0,0 +1,346 @@
+import logging
+import socket
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+from urllib.parse import urlparse
+
+from app.config import CACHE_URL
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional per-entry TTL."""
+
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float | None, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl or ttl)
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def discard_where(self, predicate: Callable[[Any], bool]) -> int:
+        with self._lock:
+            keys = [k for k, (_, v) in self._data.items() if predicate(v)]
+            for k in keys:
+                del self._data[k]
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class MemoryBackend:
+    """Process-local backend. Only coherent within a single worker."""
+
+    def __init__(self):
+        self._data: dict[str, tuple[float | None, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ttl: int | None = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            _, value = self._data.get(key, (None, b"0"))
+            value = int(value) + 1
+            self._data[key] = (None, str(value).encode())
+            return value
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisBackend:
+    """Minimal RESP2 client: GET/SET/DEL/INCR over one socket per thread."""
+
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0, timeout: float = 1.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            conn = (sock, sock.makefile("rb"))
+            self._local.conn = conn
+            if self.db:
+                self._command("SELECT", self.db)
+        return conn
+
+    def _close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
+            self._local.conn = None
+
+    def _command(self, *args) -> Any:
+        sock, reader = self._connection()
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        try:
+            sock.sendall(b"".join(parts))
+            return self._read_reply(reader)
+        except OSError:
+            self._close()
+            raise
+
+    def _read_reply(self, reader) -> Any:
+        line = reader.readline()
+        if not line:
+            raise ConnectionError("redis connection closed")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body
+        if kind == b"-":
+            raise RedisError(body.decode())
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(body)
+            if count < 0:
+                return None
+            return [self._read_reply(reader) for _ in range(count)]
+        raise RedisError(f"unexpected reply: {line!r}")
+
+    def get(self, key: str) -> bytes | None:
+        return self._command("GET", key)
+
+    def set(self, key: str, value: bytes, ttl: int | None = None) -> None:
+        if ttl:
+            self._command("SET", key, value, "EX", int(ttl))
+        else:
+            self._command("SET", key, value)
+
+    def delete(self, key: str) -> None:
+        self._command("DEL", key)
+
+    def incr(self, key: str) -> int:
+        return self._command("INCR", key)
+
+
+def create_backend(url: str):
+    parsed = urlparse(url)
+    if parsed.scheme == "memory":
+        return MemoryBackend()
+    if parsed.scheme == "redis":
+        db = int(parsed.path.lstrip("/") or 0)
+        return RedisBackend(parsed.hostname or "localhost", parsed.port or 6379, db)
+    raise ValueError(f"unsupported CACHE_URL: {url}")
+
+
+class VersionStamps:
+    """Named counters in the shared backend. Bumping one invalidates every
+    per-process cache entry that was stored under an older value.
+
+    When the backend fails (Redis down or timing out) get() returns None,
+    which callers treat as a miss, and the backend is not tried again for
+    retry_seconds. Bumps made in the meantime are replayed once it answers.
+    """
+
+    def __init__(self, backend, prefix: str = "vocab:ver:", retry_seconds: float = 5.0):
+        self.backend = backend
+        self.prefix = prefix
+        self.retry_seconds = retry_seconds
+        self._down_until = 0.0
+        self._missed: set[str] = set()
+        self._lock = threading.Lock()
+        self.errors = 0
+
+    def _failed(self, exc: Exception) -> None:
+        with self._lock:
+            if not self._down_until:
+                logger.warning("cache backend unavailable, bypassing caches: %s", exc)
+            self._down_until = time.monotonic() + self.retry_seconds
+            self.errors += 1
+
+    def _ready(self) -> bool:
+        if not self._down_until:
+            return True
+        if time.monotonic() < self._down_until:
+            return False
+        with self._lock:
+            missed, self._missed = self._missed, set()
+        try:
+            for name in missed:
+                self.backend.incr(self.prefix + name)
+        except (OSError, RedisError) as e:
+            with self._lock:
+                self._missed |= missed
+            self._failed(e)
+            return False
+        with self._lock:
+            if self._down_until:
+                logger.info("cache backend recovered; replayed %d invalidations", len(missed))
+            self._down_until = 0.0
+        return True
+
+    def get(self, name: str) -> int | None:
+        if not self._ready():
+            return None
+        try:
+            value = self.backend.get(self.prefix + name)
+        except (OSError, RedisError) as e:
+            self._failed(e)
+            return None
+        return int(value) if value is not None else 0
+
+    def bump(self, name: str) -> int | None:
+        if self._ready():
+            try:
+                return self.backend.incr(self.prefix + name)
+            except (OSError, RedisError) as e:
+                self._failed(e)
+        with self._lock:
+            self._missed.add(name)
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "available": not self._down_until,
+            "errors": self.errors,
+            "missed_bumps": len(self._missed),
+        }
+
+
+class CoherentCache:
+    """Per-process LRU whose entries are only valid while their scope's
+    version stamp is unchanged, so invalidation reaches every worker.
+
+    Read the stamp with stamp() *before* computing a value and pass it to
+    set(); a bump that races with the computation then makes the entry stale
+    instead of caching old data under the new version.
+    """
+
+    def __init__(self, local: LRUCache, versions: VersionStamps):
+        self.local = local
+        self.versions = versions
+        self.stale = 0
+
+    def stamp(self, scope: str) -> int | None:
+        """The scope's current stamp; None while the backend is unavailable."""
+        return self.versions.get(scope)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self.local.get(key)
+        if entry is None:
+            return default
+        scope, stamp, value = entry
+        current = self.versions.get(scope)
+        if current is None:
+            # Cannot be validated right now
+            return default
+        if stamp != current:
+            self.local.pop(key)
+            self.stale += 1
+            return default
+        return value
+
+    def set(self, key: Hashable, value: Any, scope: str, stamp: int | None, ttl: float | None = None) -> None:
+        if stamp is None:
+            return
+        self.local.set(key, (scope, stamp, value), ttl=ttl)
+
+    def invalidate(self, scope: str) -> None:
+        self.versions.bump(scope)
+
+    def clear(self) -> None:
+        self.local.clear()
+        self.stale = 0
+
+    def stats(self) -> dict:
+        return {**self.local.stats(), "stale": self.stale}
+
+
+backend = create_backend(CACHE_URL)
+versions = VersionStamps(backend)
+
+
+def check_workers(workers: int) -> None:
+    """Invalidations (revoked tokens, catalog swaps, views) reach other
+    workers only through a shared backend."""
+    if isinstance(backend, MemoryBackend) and workers > 1:
+        raise RuntimeError("Multiple workers require a shared CACHE_URL (redis://...)")
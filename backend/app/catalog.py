@@ -0,0 +1,231 @@
+import threading
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Iterable, Mapping, Sequence
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.cache import LRUCache, versions
+from app.config import CATALOG_MAX_WORDS
+from app.models import Word
+
+_SCOPE = "catalog"
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogWord:
+    id: int
+    english: str
+    japanese: str
+    english_katakana: str
+    section: int
+
+
+class CatalogSnapshot:
+    """One immutable version of the word catalog.
+
+    In full mode every word is held in memory. In bounded mode (more words
+    than CATALOG_MAX_WORDS) only the ids per section are kept, packed in
+    arrays, and word details go through an LRU filled from the caller's
+    session on a miss.
+    """
+
+    def __init__(
+        self,
+        version: int,
+        section_ids: Mapping[int, Sequence[int]],
+        words: Mapping[int, CatalogWord] | None,
+        cache_size: int = 0,
+    ):
+        self.version = version
+        self._section_ids = section_ids
+        self._words = words
+        self._lru = LRUCache(cache_size) if words is None else None
+
+    @property
+    def bounded(self) -> bool:
+        return self._words is None
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self._section_ids.values())
+
+    def section_ids(self, section: int) -> Sequence[int]:
+        return self._section_ids.get(section, ())
+
+    def section_size(self, section: int) -> int:
+        return len(self.section_ids(section))
+
+    def locate(self, db: Session, word_id: int) -> tuple[int, int] | None:
+        """(section, position of the word within its section's ids)."""
+        word = self.get(db, word_id)
+        if word is None:
+            return None
+        ids = self.section_ids(word.section)
+        return word.section, bisect_left(ids, word_id)
+
+    def get(self, db: Session, word_id: int) -> CatalogWord | None:
+        found = self.get_many(db, [word_id])
+        return found[0] if found else None
+
+    def get_many(self, db: Session, word_ids: Iterable[int]) -> list[CatalogWord]:
+        """Words for the given ids, in the same order; unknown ids are dropped."""
+        word_ids = list(word_ids)
+        if self._words is not None:
+            return [self._words[i] for i in word_ids if i in self._words]
+        found = {}
+        missing = []
+        for i in word_ids:
+            word = self._lru.get(i)
+            if word is None:
+                missing.append(i)
+            else:
+                found[i] = word
+        if missing:
+            for row in db.query(Word).filter(Word.id.in_(missing)).all():
+                word = _to_catalog_word(row)
+                self._lru.set(word.id, word)
+                found[word.id] = word
+        return [found[i] for i in word_ids if i in found]
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "words": len(self),
+            "sections": len(self._section_ids),
+            "bounded": self.bounded,
+            "word_cache": self._lru.stats() if self._lru is not None else None,
+        }
+
+
+def _to_catalog_word(row) -> CatalogWord:
+    return CatalogWord(row.id, row.english, row.japanese, row.english_katakana, row.section)
+
+
+class WordCatalog:
+    """Process-wide catalog, reloaded when its version stamp moves.
+
+    Committing any change to Word bumps the stamp (see the session hooks
+    below), so every worker sharing the cache backend reloads on its next
+    access. Readers always see a complete snapshot; a reload builds a new
+    one and swaps the reference.
+    """
+
+    def __init__(self, max_words: int = CATALOG_MAX_WORDS):
+        self.max_words = max_words
+        self._snapshot: CatalogSnapshot | None = None
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get(self, db: Session) -> CatalogSnapshot:
+        version = versions.get(_SCOPE)
+        snapshot = self._snapshot
+        # While the cache backend is down (version None) keep serving the
+        # snapshot we have rather than reloading the catalog every request
+        if snapshot is not None and (version is None or snapshot.version == version):
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version:
+                snapshot = self._load(db, version)
+                self._snapshot = snapshot
+        return snapshot
+
+    def _load(self, db: Session, version: int) -> CatalogSnapshot:
+        self.loads += 1
+        total = db.query(Word).count()
+        if total <= self.max_words:
+            words = {}
+            section_ids: dict[int, list[int]] = {}
+            for row in db.query(Word).order_by(Word.id).all():
+                words[row.id] = _to_catalog_word(row)
+                section_ids.setdefault(row.section, []).append(row.id)
+            return CatalogSnapshot(
+                version,
+                MappingProxyType({s: tuple(ids) for s, ids in section_ids.items()}),
+                MappingProxyType(words),
+            )
+        packed: dict[int, array] = {}
+        for word_id, section in db.query(Word.id, Word.section).order_by(Word.id).yield_per(10_000):
+            packed.setdefault(section, array("q")).append(word_id)
+        return CatalogSnapshot(version, MappingProxyType(packed), None, self.max_words)
+
+    def invalidate(self) -> None:
+        versions.bump(_SCOPE)
+        self._snapshot = None
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "loads": self.loads,
+            "snapshot": snapshot.stats() if snapshot is not None else None,
+        }
+
+
+catalog = WordCatalog()
+
+
+# Invalidate after any commit that touched words, whichever session did it
+# (import_words, manage scripts, tests).
+
+# Sections whose word positions (id order) may have moved are noted in
+# session.info["catalog_sections"] (None: any section); app.completion
+# recomputes its bitsets for them.
+
+def _note_sections(session: Session, sections: Iterable[int] | None) -> None:
+    noted = session.info.get("catalog_sections", set())
+    if noted is None:
+        return
+    if sections is None:
+        session.info["catalog_sections"] = None
+    elif sections:
+        session.info["catalog_sections"] = noted | set(sections)
+
+
+@event.listens_for(Word.section, "set", active_history=True)
+def _keep_old_section(target, value, oldvalue, initiator) -> None:
+    # active_history loads the old section before it is overwritten, so the
+    # section a word moves out of shows up in its history below
+    pass
+
+
+@event.listens_for(Session, "after_flush")
+def _note_word_changes(session: Session, flush_context) -> None:
+    sections = set()
+    changed = False
+    for obj in (*session.new, *session.deleted):
+        if isinstance(obj, Word):
+            changed = True
+            sections.add(obj.section)
+    for obj in session.dirty:
+        if isinstance(obj, Word):
+            changed = True
+            history = inspect(obj).attrs.section.history
+            sections.update(history.added)
+            sections.update(history.deleted)
+    if changed:
+        session.info["catalog_dirty"] = True
+        _note_sections(session, sections)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_bulk_word_changes(state) -> None:
+    if (state.is_update or state.is_delete or state.is_insert) and any(
+        m.class_ is Word for m in state.all_mappers
+    ):
+        state.session.info["catalog_dirty"] = True
+        _note_sections(state.session, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session) -> None:
+    if session.info.pop("catalog_dirty", False):
+        catalog.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session: Session) -> None:
+    session.info.pop("catalog_dirty", None)
+    session.info.pop("catalog_sections", None)
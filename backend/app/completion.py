@@ -0,0 +1,172 @@
+import logging
+from typing import Iterable
+
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.orm import Session
+
+from app import derived, sharding
+from app.catalog import CatalogSnapshot, WordCatalog, catalog
+from app.models import LearningRecord, SectionCompletion, Word
+
+# Keeps section_completion in step with the "today" answers in
+# learning_records, inside the same transaction as the answer itself, so the
+# daily rollover check in today_words is a primary-key lookup. Maintained
+# through app.derived.
+#
+# A word's bit is its position in its section's id order, so adding,
+# deleting or moving a word shifts the bits of that section. The sections
+# app.catalog notes as changed are recomputed for every child when the
+# word change commits (see the hooks at the bottom).
+
+logger = logging.getLogger(__name__)
+
+_table = SectionCompletion.__table__
+
+
+def answered_count(db: Session, child_id: int, section: int) -> int:
+    """Distinct words of section the child has answered in "today" sessions."""
+    answered = db.execute(
+        select(_table.c.answered).where(
+            _table.c.child_id == child_id, _table.c.section == section
+        )
+    ).scalar()
+    return answered or 0
+
+
+def _mark(db: Session, child_id: int, section: int, positions: list[int]) -> None:
+    row = db.execute(
+        select(_table.c.words).where(
+            _table.c.child_id == child_id, _table.c.section == section
+        )
+    ).first()
+    bits = bytearray(row.words) if row is not None else bytearray()
+    added = 0
+    for position in positions:
+        byte, bit = divmod(position, 8)
+        if byte >= len(bits):
+            bits.extend(bytes(byte + 1 - len(bits)))
+        if not bits[byte] & (1 << bit):
+            bits[byte] |= 1 << bit
+            added += 1
+    if not added:
+        return
+    if row is None:
+        db.execute(insert(_table).values(
+            child_id=child_id, section=section, words=bytes(bits), answered=added
+        ))
+    else:
+        db.execute(
+            update(_table)
+            .where(_table.c.child_id == child_id, _table.c.section == section)
+            .values(words=bytes(bits), answered=_table.c.answered + added)
+        )
+
+
+def record_answers(db: Session, answers: Iterable[tuple[int, int]]) -> None:
+    """Apply newly stored (child_id, word_id) "today" answers."""
+    words = catalog.get(db)
+    marks: dict[tuple[int, int], list[int]] = {}
+    for child_id, word_id in answers:
+        located = words.locate(db, word_id)
+        if located is not None:
+            section, position = located
+            marks.setdefault((child_id, section), []).append(position)
+    for (child_id, section), positions in marks.items():
+        _mark(db, child_id, section, positions)
+
+
+def rebuild(
+    db: Session,
+    child_ids: Iterable[int] | None = None,
+    words: CatalogSnapshot | None = None,
+    sections: Iterable[int] | None = None,
+) -> int:
+    """Recompute section_completion from learning_records (all children and
+    sections by default). Returns the number of rows written."""
+    words = words or catalog.get(db)
+    query = (
+        select(LearningRecord.child_id, LearningRecord.word_id)
+        .where(LearningRecord.session_type == "today")
+        .distinct()
+    )
+    clear = delete(_table)
+    if child_ids is not None:
+        child_ids = list(child_ids)
+        query = query.where(LearningRecord.child_id.in_(child_ids))
+        clear = clear.where(_table.c.child_id.in_(child_ids))
+    if sections is not None:
+        sections = list(sections)
+        query = query.join(Word, Word.id == LearningRecord.word_id).where(Word.section.in_(sections))
+        clear = clear.where(_table.c.section.in_(sections))
+
+    state: dict[tuple[int, int], bytearray] = {}
+    for child_id, word_id in db.execute(query):
+        located = words.locate(db, word_id)
+        if located is None:
+            continue
+        section, position = located
+        bits = state.setdefault((child_id, section), bytearray())
+        byte, bit = divmod(position, 8)
+        if byte >= len(bits):
+            bits.extend(bytes(byte + 1 - len(bits)))
+        bits[byte] |= 1 << bit
+
+    db.execute(clear)
+    rows = [
+        {
+            "child_id": child_id,
+            "section": section,
+            "words": bytes(bits),
+            "answered": sum(b.bit_count() for b in bits),
+        }
+        for (child_id, section), bits in state.items()
+    ]
+    if rows:
+        db.execute(insert(_table), rows)
+    return len(rows)
+
+
+def _records_added(db: Session, records) -> None:
+    record_answers(db, ((r.child_id, r.word_id) for r in records if r.session_type == "today"))
+
+
+derived.register("section_completion", _records_added, rebuild)
+
+
+def _has_word_changes(session: Session) -> bool:
+    return any(isinstance(obj, Word) for obj in (*session.new, *session.dirty, *session.deleted))
+
+
+@event.listens_for(Session, "before_commit")
+def _rebuild_moved_sections(session: Session) -> None:
+    if _has_word_changes(session):
+        session.flush()
+    if sharding.shards is not None or "catalog_sections" not in session.info:
+        return
+    sections = session.info.pop("catalog_sections")
+    # Positions from this transaction's words, not the cached catalog
+    rebuild(session, words=WordCatalog().get(session), sections=sections)
+
+
+@event.listens_for(Session, "after_commit")
+def _rebuild_moved_sections_in_families(session: Session) -> None:
+    # Records live in the family files, words in the global one: recompute
+    # each family once the change is visible to them
+    if sharding.shards is None or "catalog_sections" not in session.info:
+        return
+    sections = session.info.pop("catalog_sections")
+    global_db = sharding.shards.global_session()
+    try:
+        words = WordCatalog().get(global_db)
+    finally:
+        global_db.close()
+    for family_id in sharding.shards.family_ids():
+        family = sharding.shards.session(family_id)
+        try:
+            rebuild(family, words=words, sections=sections)
+            family.commit()
+        except Exception:
+            logger.exception("section completion rebuild failed for family %d", family_id)
+            family.rollback()
+        finally:
+            family.close()
@@ -4,3 +4,101 @@ SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24時間
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./vocab.db")
+# SQLite の PRAGMA 設定。"performance" (WAL 等) または "default" (SQLite 既定値)
+# 個別の値は SQLITE_JOURNAL_MODE などで上書きできる
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "performance")
+SQLITE_PRAGMA_OVERRIDES = {
+    name: os.environ[f"SQLITE_{name.upper()}"]
+    for name in (
+        "journal_mode",
+        "synchronous",
+        "busy_timeout",
+        "cache_size",
+        "mmap_size",
+        "temp_store",
+        "foreign_keys",
+    )
+    if f"SQLITE_{name.upper()}" in os.environ
+}
+
+# 認証済みユーザーのキャッシュ
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024"))
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "300"))
+
+# パスワードハッシュ (bcrypt)
+# BCRYPT_ROUNDS を指定しない場合は起動時に BCRYPT_TARGET_MS を目安に自動調整する
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "0")) or None
+BCRYPT_TARGET_MS = int(os.getenv("BCRYPT_TARGET_MS", "250"))
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "thread")  # "thread" or "process"
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+
+# アクセストークンの形式
+# "subject": ユーザー名のみ (毎回DBで照会)
+# "claims": ユーザーID・ロール・親ID・トークンバージョンを含む (DB照会不要)
+TOKEN_FORMAT = os.getenv("TOKEN_FORMAT", "subject")
+
+# ログイン・登録の流量制限 (トークンバケット)
+LOGIN_USER_BURST = int(os.getenv("LOGIN_USER_BURST", "10"))
+LOGIN_USER_PER_MINUTE = float(os.getenv("LOGIN_USER_PER_MINUTE", "10"))
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", "30"))
+LOGIN_IP_PER_MINUTE = float(os.getenv("LOGIN_IP_PER_MINUTE", "60"))
+# X-Forwarded-For / X-Real-IP を信頼するプロキシのアドレス (カンマ区切り、CIDR 可)
+# nginx 経由で動かす場合はその接続元を指定する。空ならヘッダーは使わない
+TRUSTED_PROXIES = [p.strip() for p in os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1").split(",") if p.strip()]
+# 同時に実行・待機できるハッシュ処理の上限
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", str(HASH_WORKERS * 4)))
+HASH_WAIT_SECONDS = float(os.getenv("HASH_WAIT_SECONDS", "2"))
+
+# 書き込みを専用スレッド・専用接続に集約する (グループコミット)
+WRITE_QUEUE = os.getenv("WRITE_QUEUE", "0") == "1"
+WRITE_QUEUE_MAX_BATCH = int(os.getenv("WRITE_QUEUE_MAX_BATCH", "64"))
+READ_POOL_SIZE = int(os.getenv("READ_POOL_SIZE", "8"))
+
+# プロセス間で共有するキャッシュ (バージョン番号による無効化)
+# "memory://" (単一プロセス) または "redis://host:6379/0" (複数ワーカー)
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+
+# 家族 (親とその子) ごとに SQLite ファイルを分ける。空なら単一DB
+# 単語カタログとユーザー名台帳は DATABASE_URL 側に残る
+SHARD_DIR = os.getenv("SHARD_DIR", "")
+# 同時に開いておく家族ファイル (エンジン) の上限。超えると古いものから閉じる
+SHARD_MAX_OPEN = int(os.getenv("SHARD_MAX_OPEN", "64"))
+if SHARD_DIR:
+    # シャードの選択にトークン内の ID を使うため
+    TOKEN_FORMAT = "claims"
+
+# 主要な学習 API を非同期エンドポイント (aiosqlite) で提供する
+ASYNC_DB = os.getenv("ASYNC_DB", "0") == "1"
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL", DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+)
+
+# 単語カタログをメモリに保持する。単語数がこれを超える場合は
+# セクションごとの ID 一覧だけを持ち、単語本体はこの件数までの LRU に置く
+CATALOG_MAX_WORDS = int(os.getenv("CATALOG_MAX_WORDS", "50000"))
+
+# 復習・苦手クイズの出題数
+QUIZ_SIZE = int(os.getenv("QUIZ_SIZE", "10"))
+# 苦手クイズで間違いの多い単語ほど出やすくする (WEAK_WEIGHTED=1)。既定は均等に出題
+WEAK_WEIGHTED = os.getenv("WEAK_WEIGHTED", "0") == "1"
+
+# 毎日 0:00 (JST) 直後に全員の「今日の単語」を作成しておく
+DAILY_PLAN_SCHEDULER = os.getenv("DAILY_PLAN_SCHEDULER", "1") == "1"
+DAILY_PLAN_WORKERS = int(os.getenv("DAILY_PLAN_WORKERS", "4"))
+DAILY_PLAN_CHUNK = int(os.getenv("DAILY_PLAN_CHUNK", "200"))
+
+# 解答をメモリに溜めてまとめて保存する (write-behind)。採点結果はすぐ返す
+# 異常終了時に失われうるのは最大 WRITE_BEHIND_MS ミリ秒 / WRITE_BEHIND_MAX_RECORDS 件分
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "0") == "1"
+WRITE_BEHIND_MS = int(os.getenv("WRITE_BEHIND_MS", "50"))
+WRITE_BEHIND_MAX_RECORDS = int(os.getenv("WRITE_BEHIND_MAX_RECORDS", "500"))
+
+# 出題時に署名付きのクイズセッション (X-Quiz-Session ヘッダー) を発行する
+# セッションのない解答は受け付けない。QUIZ_SESSION_REQUIRED=0 で古いクライアントの解答も受け付ける
+QUIZ_SESSION_TTL_MINUTES = int(os.getenv("QUIZ_SESSION_TTL_MINUTES", str(60 * 24)))
+QUIZ_SESSION_REQUIRED = os.getenv("QUIZ_SESSION_REQUIRED", "1") == "1"
+
+# 子どもごとの集計画面 (メニュー・統計・苦手単語など) の結果キャッシュ
+# その子の解答が保存されると無効になる
+VIEW_CACHE_SIZE = int(os.getenv("VIEW_CACHE_SIZE", "4096"))
+VIEW_CACHE_TTL_SECONDS = int(os.getenv("VIEW_CACHE_TTL_SECONDS", "300"))
@@ -1,16 +1,156 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Callable
+
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+
+from app.config import (
+    ASYNC_DATABASE_URL,
+    ASYNC_DB,
+    DATABASE_URL,
+    READ_POOL_SIZE,
+    SHARD_DIR,
+    SQLITE_PRAGMA_OVERRIDES,
+    SQLITE_PROFILE,
+    WRITE_QUEUE,
+)
+
+SQLITE_PROFILES = {
+    "default": {},
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": "5000",
+        "cache_size": "-65536",  # 64MiB
+        "mmap_size": "268435456",  # 256MiB
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    },
+}
+
+
+def sqlite_pragmas(profile: str = SQLITE_PROFILE, overrides: dict | None = None) -> dict:
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"unknown SQLITE_PROFILE: {profile}")
+    pragmas = dict(SQLITE_PROFILES[profile])
+    pragmas.update(SQLITE_PRAGMA_OVERRIDES if overrides is None else overrides)
+    return pragmas
+
+
+def apply_sqlite_pragmas(engine: Engine, pragmas: dict) -> None:
+    """Run the PRAGMAs on every new DBAPI connection of engine."""
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
 
-from app.config import DATABASE_URL
 
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+apply_sqlite_pragmas(engine, sqlite_pragmas())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+if WRITE_QUEUE:
+    # Writes go through app.writer; read-only endpoints get their own pool
+    read_engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        pool_size=READ_POOL_SIZE,
+    )
+    apply_sqlite_pragmas(read_engine, {**sqlite_pragmas(), "query_only": "ON"})
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+else:
+    ReadSessionLocal = SessionLocal
 
-def get_db():
-    db = SessionLocal()
+AsyncSessionLocal: async_sessionmaker[AsyncSession] | None = None
+if ASYNC_DB:
+    if WRITE_QUEUE or SHARD_DIR:
+        raise RuntimeError("ASYNC_DB cannot be combined with WRITE_QUEUE or SHARD_DIR")
+    async_engine = create_async_engine(ASYNC_DATABASE_URL)
+    apply_sqlite_pragmas(async_engine.sync_engine, sqlite_pragmas())
+    # Nothing may lazy-load outside the event loop, so keep values after commit
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
+
+
+@contextmanager
+def _init_lock(engine: Engine):
+    """Inter-process lock so that only one worker creates the schema at a time."""
+    try:
+        import fcntl
+    except ImportError:  # Windows: single-process development only
+        yield
+        return
+    database = engine.url.database
+    if engine.dialect.name == "sqlite" and database and database != ":memory:":
+        path = os.path.abspath(database) + ".init.lock"
+    else:
+        path = os.path.join(tempfile.gettempdir(), "vocab-init.lock")
+    with open(path, "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_initialized = False
+
+# Tables that stay in DATABASE_URL when SHARD_DIR splits families into files
+GLOBAL_TABLES = ("words", "token_versions", "user_directory", "job_runs")
+
+# Picks the session for a request (set by app.sharding); None -> DATABASE_URL
+_session_resolver: Callable[[Request], Session] | None = None
+
+
+def set_session_resolver(resolver: Callable[[Request], Session] | None) -> None:
+    global _session_resolver
+    _session_resolver = resolver
+
+
+def init_db() -> None:
+    """Create or migrate the schema once per process, serialized across workers."""
+    global _initialized
+    if _initialized:
+        return
+    import app.models  # noqa: F401  (register the tables on Base.metadata)
+    from app.migrations import prepare
+
+    tables = None
+    if SHARD_DIR:
+        tables = [t for t in Base.metadata.sorted_tables if t.name in GLOBAL_TABLES]
+    with _init_lock(engine):
+        prepare(engine, tables)
+    _initialized = True
+
+
+def get_db(request: Request):
+    db = _session_resolver(request) if _session_resolver else SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+def get_read_db(request: Request):
+    db = _session_resolver(request) if _session_resolver else ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
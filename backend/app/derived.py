@@ -0,0 +1,90 @@
+from typing import Callable, Iterable, Sequence
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from app.models import LearningRecord
+
+# Tables derived from learning_records (section completion, word mastery,
+# ...) are kept current inside the same transaction as the records:
+#
+#   add(session, records)        new records were flushed
+#   rebuild(session, child_ids)  recompute these children from history
+#
+# Session hooks below call every registered maintainer. Code that inserts
+# records without the ORM unit of work (bulk insert()) must call
+# records_added() itself. The children involved are noted in session.info
+# so app.view_cache can drop their cached views once the transaction commits.
+
+AddFn = Callable[[Session, Sequence[LearningRecord]], None]
+RebuildFn = Callable[[Session, list[int] | None], object]
+
+_maintainers: list[tuple[str, AddFn, RebuildFn]] = []
+
+# Changing one of these on an existing record means recomputing its child
+_KEYS = ("child_id", "word_id", "session_type", "outcome", "answered_at")
+
+
+def register(name: str, add: AddFn, rebuild: RebuildFn) -> None:
+    _maintainers.append((name, add, rebuild))
+
+
+def touch(session: Session, child_ids: Iterable[int]) -> None:
+    """Note that these children's learning data changed in this transaction."""
+    session.info.setdefault("changed_children", set()).update(child_ids)
+
+
+def records_added(session: Session, records: Sequence[LearningRecord]) -> None:
+    if not records:
+        return
+    touch(session, (r.child_id for r in records))
+    with session.no_autoflush:
+        for _, add, _ in _maintainers:
+            add(session, records)
+
+
+def rebuild(session: Session, child_ids: Iterable[int] | None = None) -> None:
+    """Recompute every derived table (for all children by default)."""
+    if child_ids is not None:
+        child_ids = list(child_ids)
+        touch(session, child_ids)
+    with session.no_autoflush:
+        for _, _, rebuild_fn in _maintainers:
+            rebuild_fn(session, child_ids)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flushed_records(session: Session, flush_context) -> None:
+    changed = {obj.child_id for obj in session.deleted if isinstance(obj, LearningRecord)}
+    for obj in session.dirty:
+        if isinstance(obj, LearningRecord):
+            attrs = inspect(obj).attrs
+            if any(attrs[key].history.has_changes() for key in _KEYS):
+                changed.add(obj.child_id)
+                changed.update(attrs.child_id.history.deleted)
+    new = [
+        obj for obj in session.new
+        if isinstance(obj, LearningRecord) and obj.child_id not in changed
+    ]
+    records_added(session, new)
+    if changed:
+        rebuild(session, changed)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_changes(state) -> None:
+    if not (state.is_delete or state.is_update) or not any(
+        m.class_ is LearningRecord for m in state.all_mappers
+    ):
+        return
+    # Find the affected children with the statement's own criteria, run the
+    # statement, then recompute them
+    criteria = state.statement.whereclause
+    affected = select(LearningRecord.child_id).distinct()
+    if criteria is not None:
+        affected = affected.where(criteria)
+    child_ids = [row[0] for row in state.session.execute(affected)]
+    result = state.invoke_statement()
+    if child_ids:
+        rebuild(state.session, child_ids)
+    return result
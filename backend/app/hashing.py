@@ -0,0 +1,149 @@
+import logging
+import math
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+import bcrypt
+
+from app.config import (
+    BCRYPT_ROUNDS,
+    BCRYPT_TARGET_MS,
+    HASH_EXECUTOR,
+    HASH_MAX_PENDING,
+    HASH_WAIT_SECONDS,
+    HASH_WORKERS,
+)
+from app.ratelimit import ConcurrencyLimiter
+
+logger = logging.getLogger(__name__)
+
+# Calibration never goes below the previous fixed cost
+MIN_ROUNDS = 12
+MAX_ROUNDS = 16
+DEFAULT_ROUNDS = 12
+PROBE_ROUNDS = 10
+
+
+def _hashpw(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _checkpw(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+class HashBusyError(Exception):
+    """Raised when too many hash operations are already running or queued."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("password hashing is saturated")
+        self.retry_after = retry_after
+
+
+def hash_rounds(hashed: str) -> int:
+    # "$2b$12$<salt+hash>"
+    return int(hashed.split("$")[2])
+
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated, size-limited pool instead of request threads."""
+
+    def __init__(
+        self,
+        kind: str = "thread",
+        workers: int = 1,
+        rounds: int | None = None,
+        max_pending: int | None = None,
+        wait_seconds: float = HASH_WAIT_SECONDS,
+    ):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"unknown hash executor: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.rounds = rounds or DEFAULT_ROUNDS
+        self.calibrated = rounds is not None
+        self.slots = ConcurrencyLimiter(max_pending or workers * 4)
+        self.wait_seconds = wait_seconds
+        self._executor: Executor | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix="bcrypt"
+                    )
+            return self._executor
+
+    def calibrate(self, target_ms: int = BCRYPT_TARGET_MS) -> int:
+        """Pick the highest cost whose hash time stays near target_ms."""
+        if self.calibrated:
+            return self.rounds
+        # Untimed warm-up so pool (or worker process) start-up is not measured
+        self.executor.submit(_hashpw, b"warm-up", 4).result()
+        start = time.perf_counter()
+        self.executor.submit(_hashpw, b"calibration", PROBE_ROUNDS).result()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        # Each extra round doubles the cost
+        extra = math.floor(math.log2(max(target_ms / max(elapsed_ms, 1e-3), 1)))
+        self.rounds = max(MIN_ROUNDS, min(MAX_ROUNDS, PROBE_ROUNDS + extra))
+        self.calibrated = True
+        logger.info(
+            "bcrypt cost calibrated to %d (%.1fms at cost %d, target %dms)",
+            self.rounds, elapsed_ms, PROBE_ROUNDS, target_ms,
+        )
+        return self.rounds
+
+    def _run(self, fn, *args):
+        if not self.slots.acquire(timeout=self.wait_seconds):
+            raise HashBusyError(retry_after=max(self.wait_seconds, 1))
+        try:
+            return self.executor.submit(fn, *args).result()
+        finally:
+            self.slots.release()
+
+    def hash(self, password: str) -> str:
+        return self._run(_hashpw, password.encode(), self.rounds).decode()
+
+    def hash_many(self, passwords: list[str]) -> list[str]:
+        """Hash a batch across all workers, one chunk of at most `workers`
+        hashes at a time, so logins queue behind a chunk and not the batch.
+        Each hash in a chunk holds its own slot."""
+        hashed = []
+        size = max(1, min(self.workers, self.slots.limit))
+        for i in range(0, len(passwords), size):
+            chunk = passwords[i:i + size]
+            held = 0
+            try:
+                for _ in chunk:
+                    if not self.slots.acquire(timeout=self.wait_seconds):
+                        raise HashBusyError(retry_after=max(self.wait_seconds, 1))
+                    held += 1
+                futures = [
+                    self.executor.submit(_hashpw, p.encode(), self.rounds) for p in chunk
+                ]
+                hashed.extend(f.result().decode() for f in futures)
+            finally:
+                for _ in range(held):
+                    self.slots.release()
+        return hashed
+
+    def verify(self, plain: str, hashed: str) -> bool:
+        return self._run(_checkpw, plain.encode(), hashed.encode())
+
+    def needs_rehash(self, hashed: str) -> bool:
+        return hash_rounds(hashed) < self.rounds
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+hasher = PasswordHasher(HASH_EXECUTOR, HASH_WORKERS, BCRYPT_ROUNDS, HASH_MAX_PENDING)
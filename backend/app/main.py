@@ -1,14 +1,39 @@
+import math
 import os
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-from app.database import Base, engine
-from app.api import auth, parent, learning, admin
+from app import completion, mastery, rollups  # noqa: F401 - keep derived tables current
+from app import quiz_sessions, writebehind
+from app.config import ASYNC_DB, DAILY_PLAN_SCHEDULER
+from app.database import init_db
+from app.hashing import HashBusyError, hasher
+from app.plans import scheduler
+from app.writer import writer
+from app.api import auth, parent, learning, admin, async_routes
 
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="英単語学習アプリ API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    hasher.calibrate()
+    if writer is not None:
+        writer.start()
+    if DAILY_PLAN_SCHEDULER:
+        scheduler.start()
+    yield
+    scheduler.stop()
+    if writebehind.buffer is not None:
+        writebehind.buffer.stop()
+    if writer is not None:
+        writer.stop()
+    hasher.shutdown()
+
+
+app = FastAPI(title="英単語学習アプリ API", lifespan=lifespan)
 
 cors_origins = os.getenv("CORS_ORIGINS", "http://localhost:5173")
 origins = [o.strip() for o in cors_origins.split(",")]
@@ -19,8 +44,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[quiz_sessions.HEADER],
 )
 
+
+@app.exception_handler(HashBusyError)
+def hash_busy_handler(request: Request, exc: HashBusyError):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "混み合っています。しばらくしてから再度お試しください"},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+
+if ASYNC_DB:
+    # Registered first so these paths take precedence over the sync handlers
+    app.include_router(async_routes.router)
 app.include_router(auth.router)
 app.include_router(parent.router)
 app.include_router(learning.router)
@@ -0,0 +1,100 @@
+from typing import Iterable, Sequence
+
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as upsert
+from sqlalchemy.orm import Session
+
+from app import derived
+from app.models import OUTCOME_CORRECT, OUTCOME_HINT, LearningRecord, WordMastery
+
+# Keeps word_mastery (one row per child and word) in step with
+# learning_records, inside the same transaction as the answer itself, so the
+# review/weak pickers and the weak-word report read one row per studied word
+# instead of re-aggregating every answer. Maintained through app.derived.
+
+_table = WordMastery.__table__
+_epoch = WordMastery.first_at.type.process_bind_param
+
+
+def _summary_query():
+    """word_mastery rows computed from learning_records."""
+    outcome = LearningRecord.outcome
+    return (
+        select(
+            LearningRecord.child_id,
+            LearningRecord.word_id,
+            func.count().label("attempts"),
+            func.sum(case((outcome == OUTCOME_CORRECT, 1), else_=0)).label("correct"),
+            func.sum(case((outcome == OUTCOME_CORRECT | OUTCOME_HINT, 1), else_=0)).label("hinted"),
+            func.min(LearningRecord.answered_at).label("first_at"),
+            func.max(LearningRecord.answered_at).label("last_at"),
+        )
+        .group_by(LearningRecord.child_id, LearningRecord.word_id)
+    )
+
+
+def record_answers(db: Session, records: Sequence[LearningRecord]) -> None:
+    """Fold newly stored records into word_mastery."""
+    rows: dict[tuple[int, int], dict] = {}
+    for r in records:
+        at = _epoch(r.answered_at, None)
+        row = rows.setdefault((r.child_id, r.word_id), {
+            "child_id": r.child_id, "word_id": r.word_id,
+            "attempts": 0, "correct": 0, "hinted": 0, "first_at": at, "last_at": at,
+        })
+        row["attempts"] += 1
+        row["correct"] += r.outcome == OUTCOME_CORRECT
+        row["hinted"] += r.outcome == OUTCOME_CORRECT | OUTCOME_HINT
+        row["first_at"] = min(row["first_at"], at)
+        row["last_at"] = max(row["last_at"], at)
+    if not rows:
+        return
+    stmt = upsert(_table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[_table.c.child_id, _table.c.word_id],
+        set_={
+            "attempts": _table.c.attempts + stmt.excluded.attempts,
+            "correct": _table.c.correct + stmt.excluded.correct,
+            "hinted": _table.c.hinted + stmt.excluded.hinted,
+            "first_at": func.min(_table.c.first_at, stmt.excluded.first_at),
+            "last_at": func.max(_table.c.last_at, stmt.excluded.last_at),
+        },
+    )
+    db.execute(stmt, list(rows.values()))
+
+
+def rebuild(db: Session, child_ids: Iterable[int] | None = None) -> int:
+    """Recompute word_mastery from learning_records (all children by
+    default). Returns the number of rows written."""
+    query = _summary_query()
+    clear = delete(_table)
+    if child_ids is not None:
+        child_ids = list(child_ids)
+        query = query.where(LearningRecord.child_id.in_(child_ids))
+        clear = clear.where(_table.c.child_id.in_(child_ids))
+    db.execute(clear)
+    result = db.execute(insert(_table).from_select(
+        ["child_id", "word_id", "attempts", "correct", "hinted", "first_at", "last_at"],
+        query,
+    ))
+    return result.rowcount
+
+
+def verify(db: Session, child_ids: Iterable[int] | None = None) -> list[tuple[int, int]]:
+    """(child_id, word_id) pairs where word_mastery disagrees with
+    learning_records."""
+    query = _summary_query()
+    stored_query = select(_table)
+    if child_ids is not None:
+        child_ids = list(child_ids)
+        query = query.where(LearningRecord.child_id.in_(child_ids))
+        stored_query = stored_query.where(_table.c.child_id.in_(child_ids))
+    expected = {(r.child_id, r.word_id): tuple(r) for r in db.execute(query)}
+    stored = {(r.child_id, r.word_id): tuple(r) for r in db.execute(stored_query)}
+    return sorted(
+        key for key in expected.keys() | stored.keys()
+        if expected.get(key) != stored.get(key)
+    )
+
+
+derived.register("word_mastery", record_answers, rebuild)
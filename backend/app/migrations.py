@@ -0,0 +1,241 @@
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+from sqlalchemy import Connection, Engine, Table, inspect, text
+from sqlalchemy.orm import Session
+
+from app.database import Base
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+# Applied in version order; each one is recorded in schema_migrations.
+# create_all() builds the latest schema for new databases, which are then
+# stamped as fully migrated, so a migration only ever runs against a database
+# created by an older release. Keep them tolerant of tables that do not exist
+# (a family shard has no words table, the global database has no records).
+MIGRATIONS: list[Migration] = []
+
+
+def migration(version: int, name: str):
+    def register(fn: Callable[[Connection], None]):
+        MIGRATIONS.append(Migration(version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return fn
+
+    return register
+
+
+def has_table(conn: Connection, table: str) -> bool:
+    return inspect(conn).has_table(table)
+
+
+def has_column(conn: Connection, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+def create_index(conn: Connection, name: str, table: str, *columns: str) -> None:
+    if has_table(conn, table):
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+        ))
+
+
+@migration(1, "composite indexes for learning record queries")
+def _hot_query_indexes(conn: Connection) -> None:
+    create_index(conn, "ix_learning_records_child_answered", "learning_records", "child_id", "answered_at")
+    create_index(conn, "ix_learning_records_child_word", "learning_records", "child_id", "word_id")
+    create_index(
+        conn, "ix_learning_records_child_session_word",
+        "learning_records", "child_id", "session_type", "word_id",
+    )
+    # Prefix of every index above
+    conn.execute(text("DROP INDEX IF EXISTS ix_learning_records_child_id"))
+    create_index(conn, "ix_users_email", "users", "email")
+
+
+@migration(2, "stored JST learning day on learning records")
+def _local_day(conn: Connection) -> None:
+    if not has_table(conn, "learning_records"):
+        return
+    if not has_column(conn, "learning_records", "local_day"):
+        conn.execute(text("ALTER TABLE learning_records ADD COLUMN local_day DATE"))
+    conn.execute(text(
+        "UPDATE learning_records SET local_day = date(answered_at, '+9 hours') "
+        "WHERE local_day IS NULL"
+    ))
+    create_index(conn, "ix_learning_records_child_local_day", "learning_records", "child_id", "local_day")
+
+
+@migration(3, "compact learning record encoding")
+def _compact_learning_records(conn: Connection) -> None:
+    # SQLite cannot change column types in place, so rebuild the table:
+    # session_type -> 1/2/3, is_correct/used_hint -> outcome bits,
+    # answered_at -> Unix seconds, local_day -> days since 1970-01-01.
+    # The single-column id index duplicated the rowid and is not recreated.
+    if not has_table(conn, "learning_records") or has_column(conn, "learning_records", "outcome"):
+        return
+    conn.execute(text(
+        "CREATE TABLE learning_records_compact ("
+        "id INTEGER NOT NULL PRIMARY KEY, "
+        "child_id INTEGER NOT NULL REFERENCES users (id), "
+        "word_id INTEGER NOT NULL REFERENCES words (id), "
+        "outcome SMALLINT NOT NULL, "
+        "answered_at INTEGER, "
+        "session_type SMALLINT NOT NULL, "
+        "local_day INTEGER)"
+    ))
+    epoch = "CAST(strftime('%s', answered_at) AS INTEGER)"
+    conn.execute(text(
+        "INSERT INTO learning_records_compact "
+        "(id, child_id, word_id, outcome, answered_at, session_type, local_day) "
+        "SELECT id, child_id, word_id, "
+        "(CASE WHEN is_correct THEN 1 ELSE 0 END) | (CASE WHEN used_hint THEN 2 ELSE 0 END), "
+        f"{epoch}, "
+        "CASE session_type WHEN 'today' THEN 1 WHEN 'review' THEN 2 WHEN 'weak' THEN 3 END, "
+        f"({epoch} + 32400) / 86400 "
+        "FROM learning_records"
+    ))
+    conn.execute(text("DROP TABLE learning_records"))
+    conn.execute(text("ALTER TABLE learning_records_compact RENAME TO learning_records"))
+    create_index(conn, "ix_learning_records_child_answered", "learning_records", "child_id", "answered_at")
+    create_index(conn, "ix_learning_records_child_word", "learning_records", "child_id", "word_id")
+    create_index(
+        conn, "ix_learning_records_child_session_word",
+        "learning_records", "child_id", "session_type", "word_id",
+    )
+    create_index(conn, "ix_learning_records_child_local_day", "learning_records", "child_id", "local_day")
+
+
+@migration(4, "section completion state")
+def _section_completion(conn: Connection) -> None:
+    # The table itself comes from create_all; fill it from history
+    if not has_table(conn, "learning_records"):
+        return
+    from app.catalog import WordCatalog
+    from app.completion import rebuild
+
+    db = Session(bind=conn)
+    rebuild(db, words=WordCatalog().get(db))
+    db.flush()
+
+
+@migration(5, "word mastery summary")
+def _word_mastery(conn: Connection) -> None:
+    if not has_table(conn, "learning_records"):
+        return
+    from app.mastery import rebuild
+
+    db = Session(bind=conn)
+    rebuild(db)
+    db.flush()
+
+
+@migration(6, "daily stats rollup")
+def _daily_rollups(conn: Connection) -> None:
+    if not has_table(conn, "learning_records"):
+        return
+    from app.rollups import rebuild
+
+    db = Session(bind=conn)
+    rebuild(db)
+    db.flush()
+
+
+@migration(7, "idempotency keys for answers")
+def _answer_idempotency(conn: Connection) -> None:
+    if not has_table(conn, "learning_records"):
+        return
+    if not has_column(conn, "learning_records", "idempotency_key"):
+        conn.execute(text("ALTER TABLE learning_records ADD COLUMN idempotency_key VARCHAR"))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_learning_records_child_idempotency "
+        "ON learning_records (child_id, idempotency_key)"
+    ))
+
+
+@migration(8, "failed job runs")
+def _job_run_errors(conn: Connection) -> None:
+    if has_table(conn, "job_runs") and not has_column(conn, "job_runs", "error"):
+        conn.execute(text("ALTER TABLE job_runs ADD COLUMN error VARCHAR"))
+
+
+def _ensure_version_table(conn: Connection) -> None:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at VARCHAR NOT NULL)"
+    ))
+
+
+def applied_versions(engine: Engine) -> set[int]:
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def _record(conn: Connection, m: Migration) -> None:
+    conn.execute(
+        text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+        {"v": m.version, "n": m.name, "t": datetime.now(timezone.utc).isoformat()},
+    )
+
+
+def pending(engine: Engine) -> list[Migration]:
+    done = applied_versions(engine)
+    return [m for m in MIGRATIONS if m.version not in done]
+
+
+def migrate(engine: Engine, target: int | None = None) -> list[Migration]:
+    """Apply pending migrations up to target (default: all), one transaction each."""
+    applied = []
+    for m in pending(engine):
+        if target is not None and m.version > target:
+            break
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            m.upgrade(conn)
+            _record(conn, m)
+        logger.info("migration %d (%s) applied in %.1fs", m.version, m.name, time.perf_counter() - start)
+        applied.append(m)
+    if applied:
+        # Refresh planner statistics so the new indexes are picked up
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+    return applied
+
+
+def stamp(engine: Engine) -> None:
+    """Mark every migration as applied without running it."""
+    todo = pending(engine)
+    with engine.begin() as conn:
+        for m in todo:
+            _record(conn, m)
+
+
+def prepare(engine: Engine, tables: list[Table] | None = None) -> list[Migration]:
+    """Bring a database to the current schema.
+
+    A new database gets create_all() and is stamped; an existing one gets any
+    missing tables and then the pending migrations.
+    """
+    tables = tables if tables is not None else Base.metadata.sorted_tables
+    with engine.connect() as conn:
+        inspector = inspect(conn)
+        fresh = not inspector.has_table("schema_migrations") and not any(
+            inspector.has_table(t.name) for t in tables
+        )
+    Base.metadata.create_all(bind=engine, tables=tables)
+    if fresh:
+        stamp(engine)
+        return []
+    return migrate(engine)
@@ -1,6 +1,19 @@
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    SmallInteger,
+    String,
+    TypeDecorator,
+    event,
+)
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -10,7 +23,7 @@ class User(Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True, index=True)
-    email = Column(String, nullable=True)
+    email = Column(String, index=True, nullable=True)
     username = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
     role = Column(String, nullable=False)  # "parent" or "child"
@@ -32,6 +45,25 @@ class User(Base):
     learning_records = relationship("LearningRecord", back_populates="child")
 
 
+class UserDirectory(Base):
+    """Global username/email registry used when families are sharded."""
+
+    __tablename__ = "user_directory"
+
+    id = Column(Integer, primary_key=True)  # becomes users.id in the family shard
+    username = Column(String, unique=True, index=True, nullable=False)
+    email = Column(String, index=True, nullable=True)
+    family_id = Column(Integer, index=True, nullable=True)  # the parent's id
+
+
+class TokenVersion(Base):
+    __tablename__ = "token_versions"
+
+    # Kept after the user is deleted so their tokens stay revoked
+    user_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
 class Word(Base):
     __tablename__ = "words"
 
@@ -53,16 +85,210 @@ class ChildProgress(Base):
     child = relationship("User", back_populates="progress")
 
 
+# Compact column types for learning_records, the largest table. Python-side
+# values keep their original types; only the stored representation changes.
+
+class SessionType(TypeDecorator):
+    """"today" / "review" / "weak" stored as a small integer."""
+
+    impl = SmallInteger
+    cache_ok = True
+
+    codes = {"today": 1, "review": 2, "weak": 3}
+    names = {v: k for k, v in codes.items()}
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else self.codes[value]
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else self.names[value]
+
+
+class EpochSeconds(TypeDecorator):
+    """UTC datetime stored as integer Unix seconds; read back naive UTC."""
+
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp())
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+
+
+EPOCH_DAY = date(1970, 1, 1)
+
+
+class DayNumber(TypeDecorator):
+    """date stored as days since 1970-01-01."""
+
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else (value - EPOCH_DAY).days
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else EPOCH_DAY + timedelta(days=value)
+
+
+# Bits of LearningRecord.outcome
+OUTCOME_CORRECT = 1
+OUTCOME_HINT = 2
+
+
 class LearningRecord(Base):
     __tablename__ = "learning_records"
 
-    id = Column(Integer, primary_key=True, index=True)
-    child_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    id = Column(Integer, primary_key=True)
+    child_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     word_id = Column(Integer, ForeignKey("words.id"), nullable=False)
-    is_correct = Column(Boolean, nullable=False)
-    used_hint = Column(Boolean, default=False)
-    answered_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    session_type = Column(String, nullable=False)  # "today" / "review" / "weak"
+    outcome = Column(SmallInteger, nullable=False, default=0)  # OUTCOME_* bits
+    answered_at = Column(EpochSeconds, default=lambda: datetime.now(timezone.utc))
+    session_type = Column(SessionType, nullable=False)
+    local_day = Column(DayNumber, nullable=True)  # JST day of answered_at, set on flush
+    idempotency_key = Column(String, nullable=True)
+
+    def _flag(self, bit: int) -> bool:
+        return bool((self.outcome or 0) & bit)
+
+    def _set_flag(self, bit: int, value: bool) -> None:
+        outcome = self.outcome or 0
+        self.outcome = outcome | bit if value else outcome & ~bit
+
+    @hybrid_property
+    def is_correct(self) -> bool:
+        return self._flag(OUTCOME_CORRECT)
+
+    @is_correct.inplace.setter
+    def _is_correct_setter(self, value: bool) -> None:
+        self._set_flag(OUTCOME_CORRECT, value)
+
+    @is_correct.inplace.expression
+    @classmethod
+    def _is_correct_expression(cls):
+        return cls.outcome.op("&")(OUTCOME_CORRECT) != 0
+
+    @hybrid_property
+    def used_hint(self) -> bool:
+        return self._flag(OUTCOME_HINT)
+
+    @used_hint.inplace.setter
+    def _used_hint_setter(self, value: bool) -> None:
+        self._set_flag(OUTCOME_HINT, value)
+
+    @used_hint.inplace.expression
+    @classmethod
+    def _used_hint_expression(cls):
+        return cls.outcome.op("&")(OUTCOME_HINT) != 0
 
     child = relationship("User", back_populates="learning_records")
     word = relationship("Word")
+
+    # Every hot query filters on child_id first; see app.migrations
+    __table_args__ = (
+        Index("ix_learning_records_child_answered", "child_id", "answered_at"),
+        Index("ix_learning_records_child_word", "child_id", "word_id"),
+        Index("ix_learning_records_child_session_word", "child_id", "session_type", "word_id"),
+        Index("ix_learning_records_child_local_day", "child_id", "local_day"),
+        Index("ux_learning_records_child_idempotency", "child_id", "idempotency_key", unique=True),
+    )
+
+
+class SectionCompletion(Base):
+    """Which words of a section a child has answered in "today" sessions.
+
+    Bit n of words is the n-th word of the section in id order; answered is
+    the number of bits set. Maintained by app.completion.
+    """
+
+    __tablename__ = "section_completion"
+
+    child_id = Column(Integer, primary_key=True)
+    section = Column(Integer, primary_key=True)
+    words = Column(LargeBinary, nullable=False, default=b"")
+    answered = Column(Integer, nullable=False, default=0)
+
+
+class WordMastery(Base):
+    """Per (child, word) summary of learning_records.
+
+    correct counts answers right without a hint, hinted those right with one.
+    Maintained by app.mastery.
+    """
+
+    __tablename__ = "word_mastery"
+
+    child_id = Column(Integer, primary_key=True)
+    word_id = Column(Integer, primary_key=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    correct = Column(Integer, nullable=False, default=0)
+    hinted = Column(Integer, nullable=False, default=0)
+    first_at = Column(EpochSeconds, nullable=False)
+    last_at = Column(EpochSeconds, nullable=False)
+
+
+class DailyRollup(Base):
+    """Answer counts per child, JST day and session type.
+
+    correct is right without a hint, hinted right with one, incorrect the
+    rest. Maintained by app.rollups.
+    """
+
+    __tablename__ = "daily_rollups"
+
+    child_id = Column(Integer, primary_key=True)
+    day = Column(DayNumber, primary_key=True)
+    session_type = Column(SessionType, primary_key=True)
+    correct = Column(Integer, nullable=False, default=0)
+    hinted = Column(Integer, nullable=False, default=0)
+    incorrect = Column(Integer, nullable=False, default=0)
+
+
+class DailyPlan(Base):
+    """A child's quiz for one JST day: the section and its shuffled word order."""
+
+    __tablename__ = "daily_plans"
+
+    child_id = Column(Integer, primary_key=True)
+    day = Column(DayNumber, nullable=False)
+    section = Column(Integer, nullable=False)
+    word_ids = Column(String, nullable=False)  # comma-separated, in quiz order
+
+
+class JobRun(Base):
+    """One row per (job, JST day); inserting it is how a worker claims the run."""
+
+    __tablename__ = "job_runs"
+
+    job = Column(String, primary_key=True)
+    day = Column(DayNumber, primary_key=True)
+    worker = Column(String, nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    items = Column(Integer, nullable=True)
+    seconds = Column(Float, nullable=True)
+    # Set when the run failed; the claim can then be taken over at once
+    error = Column(String, nullable=True)
+
+
+def jst_day(dt: datetime) -> date:
+    """JST calendar day of a timestamp; naive values are taken as UTC."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return (dt + timedelta(hours=9)).date()
+
+
+@event.listens_for(LearningRecord, "before_insert")
+@event.listens_for(LearningRecord, "before_update")
+def _set_local_day(mapper, connection, target: LearningRecord) -> None:
+    if target.answered_at is None:
+        target.answered_at = datetime.now(timezone.utc)
+    target.local_day = jst_day(target.answered_at)
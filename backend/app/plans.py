@@ -0,0 +1,296 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Iterator
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import completion, derived, sharding
+from app.catalog import CatalogSnapshot, catalog
+from app.config import DAILY_PLAN_CHUNK, DAILY_PLAN_WORKERS
+from app.database import SessionLocal
+from app.models import ChildProgress, DailyPlan, JobRun, User, jst_day
+from app.writer import run_write
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "daily_plans"
+# A claim that has not finished after this long is taken over
+STALE_CLAIM = timedelta(minutes=30)
+
+
+def today_jst() -> date:
+    return jst_day(datetime.now(timezone.utc))
+
+
+def plan_word_ids(plan: DailyPlan) -> list[int]:
+    return [int(i) for i in plan.word_ids.split(",")] if plan.word_ids else []
+
+
+def is_current(
+    plan: DailyPlan | None,
+    progress: ChildProgress,
+    words: CatalogSnapshot,
+    today: date,
+) -> bool:
+    """Whether plan is today's quiz for progress as it stands."""
+    return (
+        plan is not None
+        and plan.day == today
+        and progress.last_section_date is not None
+        and jst_day(progress.last_section_date) == today
+        and plan.section == progress.current_section
+        and len(plan_word_ids(plan)) == words.section_size(plan.section)
+    )
+
+
+def next_plan(
+    db: Session,
+    progress: ChildProgress,
+    words: CatalogSnapshot,
+    today: date,
+) -> tuple[dict, DailyPlan]:
+    """Day rollover for one child: the ChildProgress values to write and the new plan.
+
+    The section advances once every word in it has been answered in a
+    "today" session.
+    """
+    values = {}
+    section = progress.current_section
+    if progress.last_section_date is None or jst_day(progress.last_section_date) != today:
+        values["last_section_date"] = datetime.now(timezone.utc)
+        if progress.last_section_date is not None:
+            total = words.section_size(section)
+            if total > 0 and completion.answered_count(db, progress.child_id, section) >= total:
+                section += 1
+                values["current_section"] = section
+    ids = list(words.section_ids(section))
+    random.shuffle(ids)
+    plan = DailyPlan(
+        child_id=progress.child_id,
+        day=today,
+        section=section,
+        word_ids=",".join(map(str, ids)),
+    )
+    return values, plan
+
+
+def save_plan(db: Session, values: dict, plan: DailyPlan) -> None:
+    if values:
+        db.query(ChildProgress).filter(ChildProgress.child_id == plan.child_id).update(values)
+        derived.touch(db, [plan.child_id])
+    db.merge(plan)
+
+
+def _plan_chunk(session_factory: Callable[[], Session], child_ids: list[int], today: date) -> int:
+    db = session_factory()
+    try:
+        words = catalog.get(db)
+        progresses = db.query(ChildProgress).filter(ChildProgress.child_id.in_(child_ids)).all()
+        plans = {
+            p.child_id: p
+            for p in db.query(DailyPlan).filter(DailyPlan.child_id.in_(child_ids))
+        }
+        new_plans = [
+            next_plan(db, progress, words, today)
+            for progress in progresses
+            if not is_current(plans.get(progress.child_id), progress, words, today)
+        ]
+
+        def write(s: Session) -> None:
+            for values, plan in new_plans:
+                save_plan(s, values, plan)
+
+        run_write(db, write)
+        return len(new_plans)
+    finally:
+        db.close()
+
+
+def _chunks(chunk_size: int) -> Iterator[tuple[Callable[[], Session], list[int]]]:
+    """(session factory, child ids) batches covering every child."""
+    if sharding.shards is None:
+        families = [(SessionLocal, None)]
+    else:
+        families = [
+            (lambda f=f: sharding.shards.session(f), f) for f in sharding.shards.family_ids()
+        ]
+
+    for factory, _ in families:
+        db = factory()
+        try:
+            ids = [
+                row[0] for row in
+                db.query(User.id).filter(User.role == "child").order_by(User.id)
+            ]
+        finally:
+            db.close()
+        for i in range(0, len(ids), chunk_size):
+            yield factory, ids[i:i + chunk_size]
+
+
+def _claim(day: date, force: bool) -> bool:
+    """Record that this process runs today's job; False if another one has it."""
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+    try:
+        try:
+            run_write(db, lambda s: s.add(JobRun(job=JOB_NAME, day=day, worker=worker, started_at=now)))
+            return True
+        except IntegrityError:
+            db.rollback()
+        run = db.get(JobRun, (JOB_NAME, day))
+        stale = run.finished_at is None and run.started_at < (now - STALE_CLAIM).replace(tzinfo=None)
+        if not (force or stale or run.error is not None):
+            return False
+        started_at = run.started_at
+
+        # Conditional update: only one worker wins a takeover
+        def take(s: Session) -> int:
+            return (
+                s.query(JobRun)
+                .filter(JobRun.job == JOB_NAME, JobRun.day == day, JobRun.started_at == started_at)
+                .update({"worker": worker, "started_at": now, "finished_at": None, "error": None})
+            )
+
+        return run_write(db, take) == 1
+    finally:
+        db.close()
+
+
+def _update_run(day: date, values: dict) -> None:
+    db = SessionLocal()
+    try:
+        run_write(
+            db,
+            lambda s: s.query(JobRun).filter(JobRun.job == JOB_NAME, JobRun.day == day).update(values),
+        )
+    finally:
+        db.close()
+
+
+def _finish(day: date, items: int, seconds: float) -> None:
+    _update_run(day, {
+        "finished_at": datetime.now(timezone.utc),
+        "items": items,
+        "seconds": seconds,
+    })
+
+
+def _fail(day: date, error: str) -> None:
+    _update_run(day, {"error": error[:500]})
+
+
+def run_daily_plans(
+    day: date | None = None,
+    workers: int = DAILY_PLAN_WORKERS,
+    chunk_size: int = DAILY_PLAN_CHUNK,
+    force: bool = False,
+) -> dict | None:
+    """Plan every child's quiz for day (default: today, JST).
+
+    Returns timing stats, or None when another worker already ran or is
+    running the job for that day. Only the word catalog is primed: /today
+    reads the stored plan, and per-child views filled at midnight would
+    expire (VIEW_CACHE_TTL_SECONDS) long before the children use them.
+    """
+    day = day or today_jst()
+    if not _claim(day, force):
+        return None
+    start = time.perf_counter()
+    try:
+        # Prime the catalog once before the chunks fan out
+        db = SessionLocal()
+        try:
+            catalog.get(db)
+        finally:
+            db.close()
+        batches = list(_chunks(chunk_size))
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="daily-plans") as pool:
+            planned = sum(pool.map(lambda b: _plan_chunk(b[0], b[1], day), batches))
+    except Exception as e:
+        # Release the claim so the scheduler's retry (on any worker) can take it
+        _fail(day, f"{type(e).__name__}: {e}")
+        raise
+    seconds = time.perf_counter() - start
+    _finish(day, planned, seconds)
+    stats = {
+        "day": day.isoformat(),
+        "chunks": len(batches),
+        "children": sum(len(ids) for _, ids in batches),
+        "planned": planned,
+        "seconds": round(seconds, 3),
+    }
+    logger.info("daily plans: %s", stats)
+    return stats
+
+
+class DailyPlanScheduler:
+    """Background thread that runs the daily plan job just after 00:00 JST.
+
+    Every worker runs one; the job_runs claim makes sure only one of them
+    does the work each day. On start it also catches up if today's run is
+    missing (e.g. the server was down at midnight). A failed run is retried
+    after retry_after seconds instead of waiting for the next midnight.
+    """
+
+    def __init__(
+        self,
+        job: Callable[[], dict | None] = run_daily_plans,
+        delay: float = 5.0,
+        retry_after: float = STALE_CLAIM.total_seconds(),
+    ):
+        self.job = job
+        self.delay = delay
+        self.retry_after = retry_after
+        self.last_result: dict | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def seconds_until_next_run(self, now: datetime | None = None) -> float:
+        now = now or datetime.now(timezone.utc)
+        now_jst = now + timedelta(hours=9)
+        next_midnight = datetime.combine(now_jst.date() + timedelta(days=1), datetime.min.time())
+        return (next_midnight - now_jst.replace(tzinfo=None)).total_seconds() + self.delay
+
+    def _run_once(self) -> bool:
+        try:
+            result = self.job()
+            if result is not None:
+                self.last_result = result
+            return True
+        except Exception:
+            logger.exception("daily plan job failed; retrying in %ds", self.retry_after)
+            return False
+
+    def next_wait(self, succeeded: bool, now: datetime | None = None) -> float:
+        until_midnight = self.seconds_until_next_run(now)
+        return until_midnight if succeeded else min(self.retry_after, until_midnight)
+
+    def _loop(self) -> None:
+        succeeded = self._run_once()
+        while not self._stop.wait(self.next_wait(succeeded)):
+            succeeded = self._run_once()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="daily-plan-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+scheduler = DailyPlanScheduler()
@@ -0,0 +1,79 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException, status
+from jose import JWTError, jwt
+
+from app.config import ALGORITHM, QUIZ_SESSION_REQUIRED, QUIZ_SESSION_TTL_MINUTES, SECRET_KEY
+
+# A quiz hands out a signed token listing its words and session type; the
+# client sends it back with each answer (X-Quiz-Session). Answers are then
+# graded against the in-memory catalog, and a session type or word outside
+# the quiz is rejected. The expected answers are deliberately not in the
+# token: it is signed, not encrypted, so the client can read it.
+
+HEADER = "X-Quiz-Session"
+_TYPE = "quiz"
+
+
+@dataclass(frozen=True, slots=True)
+class QuizSession:
+    child_id: int
+    session_type: str
+    word_ids: frozenset[int]
+
+
+def issue(child_id: int, session_type: str, word_ids) -> str:
+    expire = datetime.now(timezone.utc) + timedelta(minutes=QUIZ_SESSION_TTL_MINUTES)
+    return jwt.encode(
+        {
+            "typ": _TYPE,
+            "cid": child_id,
+            "st": session_type,
+            "w": ",".join(map(str, word_ids)),
+            "exp": expire,
+        },
+        SECRET_KEY,
+        algorithm=ALGORITHM,
+    )
+
+
+def verify(token: str, child_id: int) -> QuizSession:
+    invalid = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="クイズの有効期限が切れたか、不正なクイズです",
+    )
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise invalid
+    if payload.get("typ") != _TYPE or payload.get("cid") != child_id:
+        raise invalid
+    ids = payload.get("w") or ""
+    return QuizSession(
+        child_id=child_id,
+        session_type=payload["st"],
+        word_ids=frozenset(int(i) for i in ids.split(",") if i),
+    )
+
+
+def resolve(token: str | None, child_id: int) -> QuizSession | None:
+    """The session an answer request was sent with (None when there is none
+    and QUIZ_SESSION_REQUIRED is off)."""
+    if token:
+        return verify(token, child_id)
+    if QUIZ_SESSION_REQUIRED:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="クイズセッションがありません。問題を取得し直してください",
+        )
+    return None
+
+
+def check(session: QuizSession, word_id: int, session_type: str) -> None:
+    """Reject an answer that is not part of the quiz session."""
+    if session_type != session.session_type or word_id not in session.word_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="このクイズの単語ではありません",
+        )
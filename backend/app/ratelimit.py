@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets. Idle buckets are evicted oldest-first past max_keys."""
+
+    def __init__(self, capacity: float, per_minute: float, max_keys: int = 10000):
+        self.capacity = capacity
+        self.rate = per_minute / 60.0
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[Hashable, list[float]] = OrderedDict()  # key -> [tokens, updated_at]
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+
+    def _refill(self, bucket: list[float], now: float) -> None:
+        bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+
+    def acquire(self, key: Hashable) -> float:
+        """Take one token. Returns 0 when allowed, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [float(self.capacity), now]
+                self._buckets[key] = bucket
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._refill(bucket, now)
+                self._buckets.move_to_end(key)
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                self.allowed += 1
+                return 0.0
+            self.rejected += 1
+            return (1 - bucket[0]) / self.rate if self.rate > 0 else float("inf")
+
+    def refund(self, key: Hashable) -> None:
+        """Give back a token taken by acquire() for an attempt that was rejected elsewhere."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket[0] = min(self.capacity, bucket[0] + 1)
+                self.allowed -= 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+            self.allowed = 0
+            self.rejected = 0
+
+    def snapshot(self, limit: int = 20) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            for bucket in self._buckets.values():
+                self._refill(bucket, now)
+            throttled = sorted(
+                ((str(k), round(b[0], 2)) for k, b in self._buckets.items() if b[0] < 1),
+                key=lambda item: item[1],
+            )
+            return {
+                "capacity": self.capacity,
+                "per_minute": self.rate * 60,
+                "keys": len(self._buckets),
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+                "throttled": dict(throttled[:limit]),
+            }
+
+
+class ConcurrencyLimiter:
+    """Caps how many operations may run or wait at once."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.rejected = 0
+
+    def acquire(self, timeout: float) -> bool:
+        if not self._semaphore.acquire(timeout=timeout):
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "peak": self.peak,
+            "rejected": self.rejected,
+        }
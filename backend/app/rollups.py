@@ -0,0 +1,74 @@
+from typing import Iterable, Sequence
+
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as upsert
+from sqlalchemy.orm import Session
+
+from app import derived
+from app.models import OUTCOME_CORRECT, OUTCOME_HINT, DailyRollup, LearningRecord
+
+# Keeps daily_rollups (answer counts per child, JST day and session type) in
+# step with learning_records, inside the same transaction as the answer
+# itself, so a month of stats is at most 31 days x 3 session types of small
+# rows. Maintained through app.derived.
+
+_table = DailyRollup.__table__
+_COUNTS = ("correct", "hinted", "incorrect")
+
+
+def _kind(outcome: int) -> str:
+    if outcome == OUTCOME_CORRECT:
+        return "correct"
+    if outcome == OUTCOME_CORRECT | OUTCOME_HINT:
+        return "hinted"
+    return "incorrect"
+
+
+def record_answers(db: Session, records: Sequence[LearningRecord]) -> None:
+    """Fold newly stored records into daily_rollups."""
+    rows: dict[tuple, dict] = {}
+    for r in records:
+        key = (r.child_id, r.local_day, r.session_type)
+        row = rows.setdefault(key, {
+            "child_id": r.child_id, "day": r.local_day, "session_type": r.session_type,
+            "correct": 0, "hinted": 0, "incorrect": 0,
+        })
+        row[_kind(r.outcome)] += 1
+    if not rows:
+        return
+    stmt = upsert(_table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[_table.c.child_id, _table.c.day, _table.c.session_type],
+        set_={name: _table.c[name] + stmt.excluded[name] for name in _COUNTS},
+    )
+    db.execute(stmt, list(rows.values()))
+
+
+def rebuild(db: Session, child_ids: Iterable[int] | None = None) -> int:
+    """Recompute daily_rollups from learning_records (all children by
+    default). Returns the number of rows written."""
+    outcome = LearningRecord.outcome
+    query = (
+        select(
+            LearningRecord.child_id,
+            LearningRecord.local_day,
+            LearningRecord.session_type,
+            func.sum(case((outcome == OUTCOME_CORRECT, 1), else_=0)),
+            func.sum(case((outcome == OUTCOME_CORRECT | OUTCOME_HINT, 1), else_=0)),
+            func.sum(case((outcome.op("&")(OUTCOME_CORRECT) == 0, 1), else_=0)),
+        )
+        .group_by(LearningRecord.child_id, LearningRecord.local_day, LearningRecord.session_type)
+    )
+    clear = delete(_table)
+    if child_ids is not None:
+        child_ids = list(child_ids)
+        query = query.where(LearningRecord.child_id.in_(child_ids))
+        clear = clear.where(_table.c.child_id.in_(child_ids))
+    db.execute(clear)
+    result = db.execute(insert(_table).from_select(
+        ["child_id", "day", "session_type", *_COUNTS], query,
+    ))
+    return result.rowcount
+
+
+derived.register("daily_rollups", record_answers, rebuild)
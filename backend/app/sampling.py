@@ -0,0 +1,101 @@
+import heapq
+import math
+import random
+from itertools import islice
+from typing import Iterable, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
+def _open_unit(rng) -> float:
+    """Uniform in (0, 1)."""
+    u = rng.random()
+    while u == 0.0:
+        u = rng.random()
+    return u
+
+
+def reservoir_sample(items: Iterable[T], k: int, rng: random.Random | None = None) -> list[T]:
+    """k items chosen uniformly from a stream of unknown length, in O(k) memory.
+
+    Algorithm L: after the reservoir fills, skip ahead a geometrically
+    distributed number of items instead of drawing for every item.
+    """
+    rng = rng or random
+    it = iter(items)
+    reservoir = list(islice(it, k))
+    if k <= 0 or len(reservoir) < k:
+        rng.shuffle(reservoir)
+        return reservoir
+    w = math.exp(math.log(_open_unit(rng)) / k)
+    while True:
+        skip = math.floor(math.log(_open_unit(rng)) / math.log1p(-w))
+        nxt = next(islice(it, skip, skip + 1), None)
+        if nxt is None:
+            break
+        reservoir[rng.randrange(k)] = nxt
+        w *= math.exp(math.log(_open_unit(rng)) / k)
+    rng.shuffle(reservoir)
+    return reservoir
+
+
+class AliasTable:
+    """Vose's alias method: O(n) to build, O(1) per weighted draw."""
+
+    def __init__(self, weights: Sequence[float]):
+        n = len(weights)
+        total = sum(weights)
+        if n == 0 or total <= 0:
+            raise ValueError("weights must contain a positive value")
+        scaled = [w * n / total for w in weights]
+        self.prob = [0.0] * n
+        self.alias = [0] * n
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        for i in large + small:
+            self.prob[i] = 1.0
+
+    def draw(self, rng: random.Random | None = None) -> int:
+        rng = rng or random
+        i = rng.randrange(len(self.prob))
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+def weighted_sample(
+    items: Sequence[T],
+    weights: Sequence[float],
+    k: int,
+    rng: random.Random | None = None,
+) -> list[T]:
+    """k distinct items, each draw proportional to its weight among those left."""
+    rng = rng or random
+    n = len(items)
+    if k >= n:
+        result = list(items)
+        rng.shuffle(result)
+        return result
+    if k <= 0:
+        return []
+    if 2 * k <= n:
+        # Few picks from many: alias draws, rejecting repeats
+        table = AliasTable(weights)
+        chosen: dict[int, None] = {}
+        for _ in range(32 * k):
+            chosen[table.draw(rng)] = None
+            if len(chosen) == k:
+                return [items[i] for i in chosen]
+    # Dense case (or heavy skew): Efraimidis-Spirakis keys u^(1/w)
+    keyed = (
+        (rng.random() ** (1.0 / w) if w > 0 else 0.0, i)
+        for i, w in enumerate(weights)
+    )
+    top = heapq.nlargest(k, keyed)
+    result = [items[i] for _, i in top]
+    rng.shuffle(result)
+    return result
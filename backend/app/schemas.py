@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Literal
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 
 
 # Auth
@@ -35,6 +35,16 @@ class ChildCreate(BaseModel):
     password: str
 
 
+class ChildBulkCreate(BaseModel):
+    children: list[ChildCreate] = Field(min_length=1, max_length=500)
+
+
+class ChildBulkResult(BaseModel):
+    username: str
+    status: Literal["created", "duplicate"]
+    id: int | None = None
+
+
 class ChildPasswordUpdate(BaseModel):
     password: str
 
@@ -62,6 +72,12 @@ class AnswerSubmit(BaseModel):
     answer: str
     session_type: Literal["today", "review", "weak"]
     used_hint: bool = False
+    # Client-generated per answer; resending the same key does not record it twice
+    idempotency_key: str | None = Field(default=None, max_length=64)
+
+
+class AnswerBatch(BaseModel):
+    answers: list[AnswerSubmit] = Field(min_length=1, max_length=200)
 
 
 class AnswerResult(BaseModel):
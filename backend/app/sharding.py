@@ -0,0 +1,229 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator
+
+from fastapi import Request
+from jose import JWTError, jwt
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.cache import LRUCache
+from app.config import ALGORITHM, SECRET_KEY, SHARD_DIR, SHARD_MAX_OPEN, WRITE_QUEUE
+from app.database import (
+    GLOBAL_TABLES,
+    Base,
+    SessionLocal,
+    apply_sqlite_pragmas,
+    set_session_resolver,
+    sqlite_pragmas,
+)
+from app.migrations import prepare
+from app.models import ChildProgress, User, UserDirectory
+
+
+class ShardRouter:
+    """Keeps each family (a parent and their children, with progress and
+    learning records) in its own SQLite file.
+
+    Shard connections ATTACH the global database as "catalog". The family
+    file has no words/token_versions/user_directory tables, so queries on
+    those names resolve to the global copies.
+
+    At most max_open family engines are kept; the least recently used one
+    is disposed when another family is opened. Sessions still using it
+    keep their connection until they close.
+    """
+
+    def __init__(
+        self,
+        shard_dir: str,
+        global_session: sessionmaker,
+        pragmas: dict,
+        max_open: int = SHARD_MAX_OPEN,
+    ):
+        self.shard_dir = shard_dir
+        self.global_session = global_session
+        self.global_path = os.path.abspath(global_session.kw["bind"].url.database)
+        # Foreign keys to words would point into the attached file
+        self.pragmas = {**pragmas, "foreign_keys": "OFF"}
+        self.max_open = max_open
+        self._makers: OrderedDict[int, sessionmaker] = OrderedDict()
+        self._lock = threading.Lock()
+        self._families = LRUCache(4096)  # token -> family id
+        os.makedirs(shard_dir, exist_ok=True)
+
+    def path(self, family_id: int) -> str:
+        return os.path.join(self.shard_dir, f"family_{family_id}.db")
+
+    def _sessionmaker(self, family_id: int) -> sessionmaker:
+        with self._lock:
+            maker = self._makers.get(family_id)
+            if maker is not None:
+                self._makers.move_to_end(family_id)
+            else:
+                shard_engine = create_engine(
+                    f"sqlite:///{self.path(family_id)}",
+                    connect_args={"check_same_thread": False},
+                )
+                apply_sqlite_pragmas(shard_engine, self.pragmas)
+
+                @event.listens_for(shard_engine, "connect")
+                def _attach_catalog(dbapi_connection, connection_record):
+                    dbapi_connection.execute(
+                        "ATTACH DATABASE ? AS catalog", (self.global_path,)
+                    )
+
+                family_tables = [
+                    t for t in Base.metadata.sorted_tables if t.name not in GLOBAL_TABLES
+                ]
+                prepare(shard_engine, family_tables)
+                maker = sessionmaker(autocommit=False, autoflush=False, bind=shard_engine)
+                self._makers[family_id] = maker
+                while len(self._makers) > self.max_open:
+                    _, evicted = self._makers.popitem(last=False)
+                    evicted.kw["bind"].dispose()
+        return maker
+
+    def session(self, family_id: int) -> Session:
+        return self._sessionmaker(family_id)()
+
+    def family_ids(self) -> list[int]:
+        db = self.global_session()
+        try:
+            return [
+                row[0] for row in db.query(UserDirectory.family_id).distinct()
+                if row[0] is not None
+            ]
+        finally:
+            db.close()
+
+    def family_of(self, token: str) -> int | None:
+        family_id = self._families.get(token)
+        if family_id is None:
+            try:
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            except JWTError:
+                return None
+            family_id = payload.get("pid") or payload.get("uid")
+            if family_id is None:
+                return None
+            self._families.set(token, family_id)
+        return family_id
+
+    def session_for_request(self, request: Request) -> Session:
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        family_id = self.family_of(token) if scheme.lower() == "bearer" and token else None
+        if family_id is None:
+            return self.global_session()
+        return self.session(family_id)
+
+    def create_user(self, db: Session, family_id: int | None = None, **fields) -> User:
+        """Register a user from a global session; family_id=None starts a new family."""
+        entry = UserDirectory(
+            username=fields["username"],
+            email=fields.get("email"),
+            family_id=family_id,
+        )
+        db.add(entry)
+        db.flush()
+        if family_id is None:
+            entry.family_id = entry.id
+        db.commit()
+        family = self.session(entry.family_id)
+        try:
+            user = User(id=entry.id, parent_id=family_id, **fields)
+            family.add(user)
+            if user.role == "child":
+                family.add(ChildProgress(child_id=user.id))
+            family.commit()
+            family.refresh(user)
+        except Exception:
+            family.rollback()
+            db.delete(entry)
+            db.commit()
+            raise
+        finally:
+            family.close()
+        return user
+
+    def drop_family(self, family_id: int) -> None:
+        """Delete a whole family: its directory entries and its file."""
+        db = self.global_session()
+        try:
+            db.query(UserDirectory).filter(UserDirectory.family_id == family_id).delete()
+            db.commit()
+        finally:
+            db.close()
+        with self._lock:
+            maker = self._makers.pop(family_id, None)
+        if maker is not None:
+            maker.kw["bind"].dispose()
+        for suffix in ("", "-wal", "-shm"):
+            path = self.path(family_id) + suffix
+            if os.path.exists(path):
+                os.remove(path)
+
+
+shards: ShardRouter | None = None
+if SHARD_DIR:
+    if WRITE_QUEUE:
+        raise RuntimeError("WRITE_QUEUE cannot be combined with SHARD_DIR")
+    shards = ShardRouter(SHARD_DIR, SessionLocal, sqlite_pragmas())
+    set_session_resolver(shards.session_for_request)
+
+
+# Username directory helpers. Without sharding the users table itself is the
+# directory; with sharding they go through user_directory, which is reachable
+# from both the global session and (via ATTACH) every family session.
+
+def username_taken(db: Session, username: str) -> bool:
+    model = UserDirectory if shards is not None else User
+    return db.query(model.id).filter(model.username == username).first() is not None
+
+
+def usernames_taken(db: Session, usernames: list[str]) -> set[str]:
+    model = UserDirectory if shards is not None else User
+    return {
+        row[0]
+        for row in db.query(model.username).filter(model.username.in_(usernames)).all()
+    }
+
+
+def email_taken(db: Session, email: str) -> bool:
+    model = UserDirectory if shards is not None else User
+    return db.query(model.id).filter(model.email == email).first() is not None
+
+
+def reserve_user_ids(db: Session, usernames: list[str], family_id: int) -> list[int | None]:
+    """Allocate global ids for new members of family_id (None = autoincrement)."""
+    if shards is None:
+        return [None] * len(usernames)
+    entries = [UserDirectory(username=u, family_id=family_id) for u in usernames]
+    db.add_all(entries)
+    db.flush()
+    return [e.id for e in entries]
+
+
+def release_user(db: Session, user_id: int) -> None:
+    if shards is not None:
+        db.query(UserDirectory).filter(UserDirectory.id == user_id).delete()
+
+
+@contextmanager
+def user_session(db: Session, username: str) -> Iterator[Session | None]:
+    """Session holding the given user's row (their family shard when sharded).
+    Yields None when a sharded username is unknown."""
+    if shards is None:
+        yield db
+        return
+    entry = db.query(UserDirectory).filter(UserDirectory.username == username).first()
+    if entry is None:
+        yield None
+        return
+    family = shards.session(entry.family_id)
+    try:
+        yield family
+    finally:
+        family.close()
@@ -1,18 +1,29 @@
+import os
+
+# The midnight job would run against DATABASE_URL, not the test database
+os.environ.setdefault("DAILY_PLAN_SCHEDULER", "0")
+# Most tests post answers directly; test_quiz_sessions covers the required mode
+os.environ.setdefault("QUIZ_SESSION_REQUIRED", "0")
+
 import pytest
 from sqlalchemy import create_engine, StaticPool
 from sqlalchemy.orm import sessionmaker
 from starlette.testclient import TestClient
 
-from app.database import Base, get_db
+from app.api.auth import ip_limiter, user_limiter
+from app.database import Base, apply_sqlite_pragmas, get_db, get_read_db, sqlite_pragmas
 from app.main import app
 from app.models import User, Word, ChildProgress
-from app.auth import hash_password, create_access_token
+from app.auth import hash_password, create_access_token, principal_cache, token_versions
+from app.catalog import catalog
+from app.view_cache import view_cache
 
 engine = create_engine(
     "sqlite:///:memory:",
     connect_args={"check_same_thread": False},
     poolclass=StaticPool,
 )
+apply_sqlite_pragmas(engine, sqlite_pragmas("performance"))
 TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
@@ -25,6 +36,7 @@ def override_get_db():
 
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -34,6 +46,17 @@ def setup_db():
     Base.metadata.drop_all(bind=engine)
 
 
+@pytest.fixture(autouse=True)
+def reset_caches():
+    principal_cache.clear()
+    token_versions.clear()
+    catalog.invalidate()
+    view_cache.clear()
+    user_limiter.reset()
+    ip_limiter.reset()
+    yield
+
+
 @pytest.fixture
 def db():
     db = TestSessionLocal()
@@ -0,0 +1,93 @@
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.testclient import TestClient
+
+from app.api import async_routes
+from app.auth import create_access_token, hash_password
+from app.database import Base, get_async_db
+from app.models import ChildProgress, LearningRecord, User, Word
+
+
+@pytest.fixture
+def async_client(tmp_path):
+    path = tmp_path / "async.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    parent = User(username="async_parent", hashed_password=hash_password("p"), role="parent")
+    db.add(parent)
+    db.flush()
+    child = User(username="async_child", hashed_password="x", role="child", parent_id=parent.id)
+    db.add(child)
+    db.flush()
+    db.add(ChildProgress(child_id=child.id))
+    db.add_all(
+        Word(english=f"async{i}", japanese=f"非同期{i}", english_katakana="アシンク", section=1)
+        for i in range(3)
+    )
+    db.commit()
+    child_id = child.id
+    db.close()
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def override():
+        async with AsyncSessionLocal() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(async_routes.router)
+    app.dependency_overrides[get_async_db] = override
+    with TestClient(app) as c:
+        c.parent_headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'async_parent'})}"}
+        c.child_headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'async_child'})}"}
+        c.child_id = child_id
+        c.engine = engine
+        yield c
+    engine.dispose()
+
+
+class TestAsyncEndpoints:
+    def test_today_and_answer(self, async_client):
+        resp = async_client.get("/api/learning/today", headers=async_client.child_headers)
+        assert resp.status_code == 200
+        words = resp.json()
+        assert len(words) == 3
+
+        word = words[0]
+        resp = async_client.post(
+            "/api/learning/answer",
+            json={"word_id": word["id"], "answer": word["english"], "session_type": "today"},
+            headers=async_client.child_headers,
+        )
+        assert resp.status_code == 200
+        assert resp.json()["is_correct"] is True
+
+        db = sessionmaker(bind=async_client.engine)()
+        assert db.query(LearningRecord).filter(LearningRecord.child_id == async_client.child_id).count() == 1
+        db.close()
+
+    def test_menu_status_and_child_stats(self, async_client):
+        resp = async_client.get("/api/learning/menu-status", headers=async_client.child_headers)
+        assert resp.status_code == 200
+        assert resp.json()["today"] == 3
+
+        resp = async_client.get(
+            f"/api/parent/children/{async_client.child_id}/stats?year=2024&month=2",
+            headers=async_client.parent_headers,
+        )
+        assert resp.status_code == 200
+        assert len(resp.json()) == 29
+
+    def test_role_checks(self, async_client):
+        resp = async_client.get("/api/learning/today", headers=async_client.parent_headers)
+        assert resp.status_code == 403
+        resp = async_client.get(
+            f"/api/parent/children/{async_client.child_id}/stats?year=2024&month=2",
+            headers=async_client.child_headers,
+        )
+        assert resp.status_code == 403
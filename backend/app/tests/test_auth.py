@@ -1,3 +1,17 @@
+import ipaddress
+import time
+
+import bcrypt
+import pytest
+from jose import jwt
+from starlette.requests import Request
+
+from app.api.auth import client_ip, ip_limiter, user_limiter
+from app.auth import TokenVersionTable
+from app.hashing import HashBusyError, PasswordHasher, hash_rounds
+from app.models import TokenVersion, User
+
+
 class TestAuth:
     def test_register_parent(self, client):
         res = client.post("/api/auth/register", json={
@@ -80,3 +94,220 @@ class TestAuth:
         data = res.json()
         assert data["username"] == "testchild"
         assert data["role"] == "child"
+
+    def test_principal_cache_hit(self, client, parent_headers):
+        client.get("/api/auth/me", headers=parent_headers)
+        client.get("/api/auth/me", headers=parent_headers)
+        res = client.get("/api/admin/metrics", headers=parent_headers)
+        stats = res.json()["principal_cache"]
+        assert stats["misses"] == 1
+        assert stats["hits"] == 2
+
+    def test_principal_cache_invalidated_on_delete(self, client, parent_headers):
+        res = client.post("/api/parent/children", headers=parent_headers, json={
+            "username": "cachedchild",
+            "password": "childpass",
+        })
+        cid = res.json()["id"]
+        res = client.post("/api/auth/login", json={
+            "username": "cachedchild",
+            "password": "childpass",
+        })
+        headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+        assert client.get("/api/auth/me", headers=headers).status_code == 200
+
+        client.delete(f"/api/parent/children/{cid}", headers=parent_headers)
+        res = client.get("/api/auth/me", headers=headers)
+        assert res.status_code == 401
+
+    def test_login_rehashes_outdated_cost(self, client, db):
+        user = User(
+            email="oldcost@test.com",
+            username="oldcost",
+            hashed_password=bcrypt.hashpw(b"pass123", bcrypt.gensalt(4)).decode(),
+            role="parent",
+        )
+        db.add(user)
+        db.commit()
+        res = client.post("/api/auth/login", json={
+            "username": "oldcost",
+            "password": "pass123",
+        })
+        assert res.status_code == 200
+        db.refresh(user)
+        assert hash_rounds(user.hashed_password) > 4
+        assert bcrypt.checkpw(b"pass123", user.hashed_password.encode())
+
+    def test_login_rate_limited_per_username(self, client, parent_user):
+        for _ in range(user_limiter.capacity):
+            client.post("/api/auth/login", json={
+                "username": "testparent",
+                "password": "wrongpass",
+            })
+        res = client.post("/api/auth/login", json={
+            "username": "testparent",
+            "password": "parentpass",
+        })
+        assert res.status_code == 429
+        assert int(res.headers["Retry-After"]) >= 1
+        # Other usernames are unaffected
+        res = client.post("/api/auth/login", json={
+            "username": "nouser",
+            "password": "pass",
+        })
+        assert res.status_code == 401
+
+    def test_username_lockout_keeps_ip_budget(self, client, parent_user):
+        for _ in range(user_limiter.capacity + 5):
+            client.post("/api/auth/login", json={
+                "username": "testparent",
+                "password": "wrongpass",
+            })
+        # Only the attempts the username bucket admitted were charged to the IP
+        assert ip_limiter.snapshot()["allowed"] == user_limiter.capacity
+
+    def test_client_ip_from_trusted_proxy_only(self, monkeypatch):
+        monkeypatch.setattr("app.api.auth.trusted_proxies", [ipaddress.ip_network("172.16.0.0/12")])
+
+        def request(peer, **headers):
+            return Request({
+                "type": "http",
+                "client": (peer, 1234),
+                "headers": [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()],
+            })
+
+        assert client_ip(request("172.18.0.3", x_real_ip="203.0.113.7")) == "203.0.113.7"
+        assert client_ip(request(
+            "172.18.0.3", x_forwarded_for="198.51.100.1, 203.0.113.7, 172.18.0.2",
+        )) == "203.0.113.7"
+        # Headers from anyone else are ignored
+        assert client_ip(request("203.0.113.9", x_real_ip="1.2.3.4")) == "203.0.113.9"
+
+    def test_hash_saturation_returns_429(self, client, monkeypatch):
+        def busy(*args):
+            raise HashBusyError(retry_after=2)
+
+        monkeypatch.setattr("app.hashing.hasher._run", busy)
+        res = client.post("/api/auth/register", json={
+            "email": "busy@test.com",
+            "username": "busyparent",
+            "password": "pass123",
+        })
+        assert res.status_code == 429
+        assert res.headers["Retry-After"] == "2"
+
+
+class TestPasswordHasher:
+    def test_calibrate_within_bounds(self):
+        hasher = PasswordHasher("thread", 1)
+        rounds = hasher.calibrate(target_ms=1)
+        assert rounds == 12
+        assert hasher.needs_rehash(bcrypt.hashpw(b"x", bcrypt.gensalt(4)).decode())
+        hasher.shutdown()
+
+    def test_rejects_when_slots_exhausted(self):
+        hasher = PasswordHasher("thread", 1, rounds=4, max_pending=1, wait_seconds=0.01)
+        assert hasher.slots.acquire(timeout=0)
+        with pytest.raises(HashBusyError):
+            hasher.hash("secret")
+        hasher.slots.release()
+        assert hasher.slots.snapshot()["rejected"] == 1
+        hasher.shutdown()
+
+    def test_hash_many_submits_one_chunk_at_a_time(self):
+        hasher = PasswordHasher("thread", 2, rounds=4)
+        outstanding, peak = [], 0
+        submit = hasher.executor.submit
+
+        def tracking_submit(*args):
+            nonlocal peak
+            outstanding[:] = [f for f in outstanding if not f.done()]
+            future = submit(*args)
+            outstanding.append(future)
+            peak = max(peak, len(outstanding))
+            return future
+
+        hasher.executor.submit = tracking_submit
+        hashed = hasher.hash_many([f"pw{i}" for i in range(7)])
+        assert len(hashed) == 7
+        assert hasher.verify("pw6", hashed[6])
+        assert peak <= 2
+        assert hasher.slots.snapshot()["peak"] == 2
+        hasher.shutdown()
+
+    def test_hash_many_takes_a_slot_per_hash(self):
+        hasher = PasswordHasher("thread", 2, rounds=4, max_pending=2, wait_seconds=0.01)
+        assert hasher.slots.acquire(timeout=0)
+        # One slot left: the first chunk of two cannot start
+        with pytest.raises(HashBusyError):
+            hasher.hash_many(["a", "b"])
+        assert hasher.slots.snapshot()["in_flight"] == 1
+        hasher.slots.release()
+        hasher.shutdown()
+
+    def test_process_executor(self):
+        hasher = PasswordHasher("process", 1, rounds=4)
+        hashed = hasher.hash("secret")
+        assert hash_rounds(hashed) == 4
+        assert hasher.verify("secret", hashed)
+        assert not hasher.verify("wrong", hashed)
+        hasher.shutdown()
+
+
+class TestClaimsToken:
+    def _login(self, client, username, password):
+        res = client.post("/api/auth/login", json={
+            "username": username,
+            "password": password,
+        })
+        assert res.status_code == 200
+        return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+    def test_claims_token_authorizes_without_user_row(self, client, parent_headers, monkeypatch):
+        monkeypatch.setattr("app.auth.TOKEN_FORMAT", "claims")
+        client.post("/api/parent/children", headers=parent_headers, json={
+            "username": "claimschild",
+            "password": "childpass",
+        })
+        headers = self._login(client, "claimschild", "childpass")
+        token = headers["Authorization"].split()[1]
+        claims = jwt.get_unverified_claims(token)
+        assert claims["role"] == "child"
+        assert claims["ver"] == 0
+
+        res = client.get("/api/learning/menu-status", headers=headers)
+        assert res.status_code == 200
+        res = client.get("/api/parent/children", headers=headers)
+        assert res.status_code == 403
+
+    def test_password_change_revokes_claims_token(self, client, parent_headers, monkeypatch):
+        monkeypatch.setattr("app.auth.TOKEN_FORMAT", "claims")
+        res = client.post("/api/parent/children", headers=parent_headers, json={
+            "username": "revokechild",
+            "password": "oldpass",
+        })
+        cid = res.json()["id"]
+        headers = self._login(client, "revokechild", "oldpass")
+        assert client.get("/api/learning/menu-status", headers=headers).status_code == 200
+
+        client.put(
+            f"/api/parent/children/{cid}/password",
+            headers=parent_headers,
+            json={"password": "newpass"},
+        )
+        res = client.get("/api/learning/menu-status", headers=headers)
+        assert res.status_code == 401
+
+        # A fresh login carries the bumped version
+        headers = self._login(client, "revokechild", "newpass")
+        assert client.get("/api/learning/menu-status", headers=headers).status_code == 200
+
+    def test_token_versions_expire_without_a_bump(self, db):
+        table = TokenVersionTable(ttl=0.05)
+        assert table.current(db, 999) == 0
+        # A revocation whose stamp bump was lost: only the row changed
+        db.add(TokenVersion(user_id=999, version=1))
+        db.commit()
+        assert table.current(db, 999) == 0
+        time.sleep(0.06)
+        assert table.current(db, 999) == 1
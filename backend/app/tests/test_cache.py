@@ -0,0 +1,162 @@
+import socket
+import socketserver
+import threading
+
+import pytest
+
+from app.cache import (
+    CoherentCache,
+    LRUCache,
+    MemoryBackend,
+    RedisBackend,
+    VersionStamps,
+    create_backend,
+)
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough RESP2 to stand in for Redis in tests."""
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        args = []
+        for _ in range(count):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            cmd = args[0].upper()
+            with self.server.lock:
+                if cmd == b"GET":
+                    value = store.get(args[1])
+                    reply = b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+                elif cmd == b"SET":
+                    store[args[1]] = args[2]
+                    reply = b"+OK\r\n"
+                elif cmd == b"DEL":
+                    reply = b":%d\r\n" % (store.pop(args[1], None) is not None)
+                elif cmd == b"INCR":
+                    store[args[1]] = str(int(store.get(args[1], b"0")) + 1).encode()
+                    reply = b":%s\r\n" % store[args[1]]
+                elif cmd == b"SELECT":
+                    reply = b"+OK\r\n"
+                else:
+                    reply = b"-ERR unknown command\r\n"
+            self.wfile.write(reply)
+
+
+@pytest.fixture
+def redis_standin():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _RespHandler)
+    server.daemon_threads = True
+    server.store = {}
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address
+    server.shutdown()
+    server.server_close()
+
+
+class TestCacheBackends:
+    def test_create_backend(self):
+        assert isinstance(create_backend("memory://"), MemoryBackend)
+        redis = create_backend("redis://cache:6380/2")
+        assert (redis.host, redis.port, redis.db) == ("cache", 6380, 2)
+        with pytest.raises(ValueError):
+            create_backend("memcached://localhost")
+
+    def test_several_workers_need_a_shared_backend(self, monkeypatch):
+        from app import cache
+
+        monkeypatch.setattr(cache, "backend", MemoryBackend())
+        cache.check_workers(1)
+        with pytest.raises(RuntimeError):
+            cache.check_workers(2)
+        monkeypatch.setattr(cache, "backend", create_backend("redis://cache:6379/0"))
+        cache.check_workers(4)
+
+    def test_redis_backend_commands(self, redis_standin):
+        host, port = redis_standin
+        backend = RedisBackend(host, port, db=1)
+        assert backend.get("missing") is None
+        backend.set("k", b"value")
+        assert backend.get("k") == b"value"
+        assert backend.incr("n") == 1
+        assert backend.incr("n") == 2
+        backend.delete("k")
+        assert backend.get("k") is None
+
+    def test_coherent_across_workers(self, redis_standin):
+        host, port = redis_standin
+        # Two workers: separate local LRUs, separate connections, one Redis
+        worker_a = CoherentCache(LRUCache(10), VersionStamps(RedisBackend(host, port)))
+        worker_b = CoherentCache(LRUCache(10), VersionStamps(RedisBackend(host, port)))
+
+        for worker in (worker_a, worker_b):
+            worker.set("token", "alice", scope="user:1", stamp=worker.stamp("user:1"))
+            assert worker.get("token") == "alice"
+
+        worker_a.invalidate("user:1")
+        assert worker_b.get("token") is None
+        assert worker_a.get("token") is None
+        assert worker_b.stats()["stale"] == 1
+
+    def test_stamp_taken_before_compute_wins_race(self):
+        cache = CoherentCache(LRUCache(10), VersionStamps(MemoryBackend()))
+        stamp = cache.stamp("child:1")
+        cache.invalidate("child:1")  # data changed while the value was computed
+        cache.set("view", "old result", scope="child:1", stamp=stamp)
+        assert cache.get("view") is None
+
+    def test_unreachable_redis_is_a_miss(self):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        stamps = VersionStamps(RedisBackend("127.0.0.1", port, timeout=0.2))
+        cache = CoherentCache(LRUCache(10), stamps)
+
+        stamp = cache.stamp("user:1")
+        assert stamp is None
+        cache.set("token", "alice", scope="user:1", stamp=stamp)
+        assert cache.get("token") is None
+        cache.invalidate("user:1")
+        # Bypassed after the first failure instead of timing out every call
+        assert stamps.stats() == {"available": False, "errors": 1, "missed_bumps": 1}
+
+    def test_bumps_missed_while_down_are_replayed(self):
+        class FlakyBackend(MemoryBackend):
+            down = False
+
+            def get(self, key):
+                if self.down:
+                    raise ConnectionError("down")
+                return super().get(key)
+
+            def incr(self, key):
+                if self.down:
+                    raise ConnectionError("down")
+                return super().incr(key)
+
+        backend = FlakyBackend()
+        worker_a = CoherentCache(LRUCache(10), VersionStamps(backend, retry_seconds=0))
+        worker_b = CoherentCache(LRUCache(10), VersionStamps(backend, retry_seconds=0))
+        worker_b.set("view", "old", scope="child:1", stamp=worker_b.stamp("child:1"))
+
+        backend.down = True
+        worker_a.invalidate("child:1")
+        assert worker_b.get("view") is None
+        backend.down = False
+        worker_a.stamp("child:1")  # first call after recovery replays the bump
+        assert worker_b.get("view") is None
+        assert worker_b.stats()["stale"] == 1
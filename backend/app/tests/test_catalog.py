@@ -0,0 +1,60 @@
+from sqlalchemy import event
+
+from app.catalog import WordCatalog, catalog
+from app.models import Word
+from app.tests.conftest import engine
+
+
+class TestCatalog:
+    def test_snapshot_is_reused_until_words_change(self, db, sample_words):
+        first = catalog.get(db)
+        assert catalog.get(db) is first
+        assert first.section_size(1) == 3
+
+        word = Word(english="fish", japanese="魚", english_katakana="フィッシュ", section=1)
+        db.add(word)
+        db.commit()
+        try:
+            second = catalog.get(db)
+            assert second is not first
+            assert second.section_size(1) == 4
+            assert second.get(db, word.id).english == "fish"
+            # The old snapshot is untouched
+            assert first.section_size(1) == 3
+        finally:
+            db.delete(word)
+            db.commit()
+        assert catalog.get(db).section_size(1) == 3
+
+    def test_answer_and_menu_do_not_query_words(self, client, child_headers, sample_words):
+        client.get("/api/learning/today", headers=child_headers)
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            res = client.post(
+                "/api/learning/answer",
+                json={"word_id": sample_words[0].id, "answer": sample_words[0].english, "session_type": "today"},
+                headers=child_headers,
+            )
+            assert res.json()["is_correct"] is True
+            client.get("/api/learning/menu-status", headers=child_headers)
+            client.get("/api/learning/today", headers=child_headers)
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        assert not [s for s in statements if "FROM words" in s]
+
+    def test_bounded_mode(self, db, sample_words):
+        bounded = WordCatalog(max_words=2)
+        snapshot = bounded.get(db)
+        assert snapshot.bounded
+        assert snapshot.section_size(1) == 3
+        ids = list(snapshot.section_ids(1))
+        words = snapshot.get_many(db, ids + [10**9])
+        assert [w.id for w in words] == ids
+        # Word details never exceed the configured bound
+        assert snapshot.stats()["word_cache"]["size"] == 2
+        assert [w.english for w in snapshot.get_many(db, ids)] == [w.english for w in words]
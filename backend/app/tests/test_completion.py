@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta, timezone
+
+from app import completion
+from app.auth import create_access_token
+from app.models import ChildProgress, LearningRecord, SectionCompletion, User, Word
+
+
+def _new_child(db, username):
+    child = User(username=username, hashed_password="x", role="child")
+    db.add(child)
+    db.flush()
+    db.add(ChildProgress(child_id=child.id))
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': username})}"}
+    return child.id, headers
+
+
+def _answer(client, headers, word, session_type="today"):
+    res = client.post(
+        "/api/learning/answer",
+        json={"word_id": word.id, "answer": word.english, "session_type": session_type},
+        headers=headers,
+    )
+    assert res.status_code == 200
+
+
+def _state(db, child_id):
+    db.expire_all()
+    return {
+        row.section: (row.answered, row.words)
+        for row in db.query(SectionCompletion).filter(SectionCompletion.child_id == child_id)
+    }
+
+
+class TestSectionCompletion:
+    def test_answers_update_state(self, client, db, sample_words):
+        child_id, headers = _new_child(db, "completion_a")
+        apple, banana = sample_words[0], sample_words[1]
+        _answer(client, headers, apple)
+        _answer(client, headers, apple)
+        _answer(client, headers, banana, session_type="review")
+        assert completion.answered_count(db, child_id, 1) == 1
+        _answer(client, headers, banana)
+        assert completion.answered_count(db, child_id, 1) == 2
+
+        incremental = _state(db, child_id)
+        completion.rebuild(db, [child_id])
+        db.commit()
+        assert _state(db, child_id) == incremental
+
+    def test_rollover_advances_when_section_done(self, client, db, sample_words):
+        child_id, headers = _new_child(db, "completion_b")
+        for word in sample_words:
+            if word.section == 1:
+                _answer(client, headers, word)
+        progress = db.query(ChildProgress).filter(ChildProgress.child_id == child_id).first()
+        progress.last_section_date = datetime.now(timezone.utc) - timedelta(days=1)
+        db.commit()
+
+        res = client.get("/api/learning/today", headers=headers)
+        assert {w["english"] for w in res.json()} == {"dog", "egg"}
+
+    def test_bulk_delete_recomputes(self, client, db, sample_words):
+        child_id, headers = _new_child(db, "completion_c")
+        _answer(client, headers, sample_words[0])
+        _answer(client, headers, sample_words[1])
+        db.query(LearningRecord).filter(
+            LearningRecord.child_id == child_id,
+            LearningRecord.word_id == sample_words[0].id,
+        ).delete()
+        db.commit()
+        assert completion.answered_count(db, child_id, 1) == 1
+
+        record = db.query(LearningRecord).filter(LearningRecord.child_id == child_id).one()
+        db.delete(record)
+        db.commit()
+        assert _state(db, child_id) == {}
+
+    def test_catalog_changes_rebuild_moved_sections(self, client, db, sample_words):
+        child_id, headers = _new_child(db, "completion_catalog")
+        first, second, third = [
+            Word(english=e, japanese=e, english_katakana=e, section=9) for e in ("kiwi", "lime", "mango")
+        ]
+        db.add_all([first, second, third])
+        db.commit()
+        _answer(client, headers, second)
+        _answer(client, headers, third)
+        assert _state(db, child_id)[9] == (2, bytes([0b110]))
+
+        # Removing an earlier word shifts the positions of the later ones
+        db.delete(first)
+        db.commit()
+        assert _state(db, child_id)[9] == (2, bytes([0b11]))
+
+        third.section = 10
+        db.commit()
+        state = _state(db, child_id)
+        assert state[9] == (1, bytes([0b1]))
+        assert state[10] == (1, bytes([0b1]))
+
+        db.query(LearningRecord).filter(LearningRecord.child_id == child_id).delete()
+        db.delete(second)
+        db.delete(third)
+        db.commit()
@@ -1,6 +1,7 @@
 from datetime import datetime, timezone, timedelta
 
 from app.models import ChildProgress, LearningRecord
+from app.view_cache import view_cache
 
 
 class TestLearning:
@@ -184,6 +185,36 @@ class TestLearning:
         assert res.status_code == 404
         assert "単語が見つかりません" in res.json()["detail"]
 
+    def test_answer_batch(self, client, child_headers, child_id, db, sample_words):
+        apple, banana = sample_words[0], sample_words[1]
+        batch = {"answers": [
+            {"word_id": apple.id, "answer": "apple", "session_type": "today", "idempotency_key": "b1-1"},
+            {"word_id": banana.id, "answer": "x", "session_type": "today", "idempotency_key": "b1-2"},
+            {"word_id": banana.id, "answer": "banana", "session_type": "review", "used_hint": True},
+        ]}
+        before = db.query(LearningRecord).filter(LearningRecord.child_id == child_id).count()
+        res = client.post("/api/learning/answers", headers=child_headers, json=batch)
+        assert res.status_code == 200
+        assert [(r["is_correct"], r["correct_answer"]) for r in res.json()] == [
+            (True, "apple"), (False, "banana"), (True, "banana"),
+        ]
+        assert db.query(LearningRecord).filter(LearningRecord.child_id == child_id).count() == before + 3
+
+        # A retry of the keyed items is answered from what was stored
+        retry = {"answers": [dict(batch["answers"][0], answer="wrong"), batch["answers"][1]]}
+        res = client.post("/api/learning/answers", headers=child_headers, json=retry)
+        assert [r["is_correct"] for r in res.json()] == [True, False]
+        assert db.query(LearningRecord).filter(LearningRecord.child_id == child_id).count() == before + 3
+
+    def test_answer_batch_unknown_word_stores_nothing(self, client, child_headers, child_id, db, sample_words):
+        before = db.query(LearningRecord).filter(LearningRecord.child_id == child_id).count()
+        res = client.post("/api/learning/answers", headers=child_headers, json={"answers": [
+            {"word_id": sample_words[0].id, "answer": "apple", "session_type": "today"},
+            {"word_id": 99999, "answer": "test", "session_type": "today"},
+        ]})
+        assert res.status_code == 404
+        assert db.query(LearningRecord).filter(LearningRecord.child_id == child_id).count() == before
+
     def test_menu_status(self, client, child_headers, sample_words):
         res = client.get("/api/learning/menu-status", headers=child_headers)
         assert res.status_code == 200
@@ -349,3 +380,59 @@ class TestLearning:
     def test_menu_status_require_child(self, client, parent_headers):
         res = client.get("/api/learning/menu-status", headers=parent_headers)
         assert res.status_code == 403
+
+    def test_menu_status_single_query(self, client, db, sample_words):
+        from sqlalchemy import event
+        from app.api.learning import _get_learned_word_ids, _get_weak_word_ids
+        from app.auth import create_access_token
+        from app.models import User
+        from app.tests.conftest import engine
+
+        user = User(username="menuuser", hashed_password="x", role="child")
+        db.add(user)
+        db.flush()
+        db.add(ChildProgress(child_id=user.id, current_section=2))
+        now = datetime.now(timezone.utc)
+        apple, banana, cat, dog = sample_words[:4]
+        for word, days_ago, correct, hint in [
+            (apple, 0, True, False),
+            (apple, 40, False, False),
+            (banana, 3, True, True),
+            (cat, 10, True, False),
+            (cat, 45, True, False),
+            (dog, 60, False, False),
+        ]:
+            db.add(LearningRecord(
+                child_id=user.id, word_id=word.id, is_correct=correct, used_hint=hint,
+                answered_at=now - timedelta(days=days_ago), session_type="review",
+            ))
+        db.commit()
+        headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'menuuser'})}"}
+        client.get("/api/learning/menu-status", headers=headers)  # warm auth and catalog
+        view_cache.clear()
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            data = client.get("/api/learning/menu-status", headers=headers).json()
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        assert len(statements) == 1
+
+        assert data == {
+            "today": 2,
+            "studied_today": True,
+            "review_week": len(_get_learned_word_ids(db, user.id, "week")),
+            "review_month": len(_get_learned_word_ids(db, user.id, "month")),
+            "review_over_month": len(_get_learned_word_ids(db, user.id, "over_month")),
+            "review_all": 4,
+            "weak_month": len(_get_weak_word_ids(db, user.id, "month")),
+            "weak_over_month": len(_get_weak_word_ids(db, user.id, "over_month")),
+            "weak_all": len(_get_weak_word_ids(db, user.id, None)),
+        }
+        assert (data["review_week"], data["review_month"], data["review_over_month"]) == (2, 3, 3)
+        assert (data["weak_month"], data["weak_over_month"], data["weak_all"]) == (1, 2, 3)
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta, timezone
+
+from app import mastery
+from app.auth import create_access_token
+from app.models import ChildProgress, LearningRecord, User, WordMastery
+
+
+def _new_child(db, username):
+    child = User(username=username, hashed_password="x", role="child")
+    db.add(child)
+    db.flush()
+    db.add(ChildProgress(child_id=child.id))
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': username})}"}
+    return child.id, headers
+
+
+def _answer(client, headers, word, answer=None, used_hint=False):
+    res = client.post(
+        "/api/learning/answer",
+        json={
+            "word_id": word.id,
+            "answer": answer or word.english,
+            "used_hint": used_hint,
+            "session_type": "review",
+        },
+        headers=headers,
+    )
+    assert res.status_code == 200
+
+
+def _state(db, child_id):
+    db.expire_all()
+    return {
+        row.word_id: (row.attempts, row.correct, row.hinted, row.first_at, row.last_at)
+        for row in db.query(WordMastery).filter(WordMastery.child_id == child_id)
+    }
+
+
+class TestWordMastery:
+    def test_answers_update_summary(self, client, db, sample_words):
+        child_id, headers = _new_child(db, "mastery_a")
+        apple, banana = sample_words[0], sample_words[1]
+        _answer(client, headers, apple)
+        _answer(client, headers, apple, used_hint=True)
+        _answer(client, headers, apple, answer="wrong")
+        _answer(client, headers, banana)
+
+        state = _state(db, child_id)
+        assert {w: s[:3] for w, s in state.items()} == {apple.id: (3, 1, 1), banana.id: (1, 1, 0)}
+        assert mastery.verify(db, [child_id]) == []
+
+        mastery.rebuild(db, [child_id])
+        db.commit()
+        assert _state(db, child_id) == state
+
+    def test_weak_words_read_summary(self, client, db, sample_words, parent_headers):
+        child_id, headers = _new_child(db, "mastery_b")
+        parent = db.query(User).filter(User.username == "testparent").one()
+        db.get(User, child_id).parent_id = parent.id
+        db.commit()
+        apple = sample_words[0]
+        _answer(client, headers, apple)
+        _answer(client, headers, apple, answer="wrong")
+
+        res = client.get(f"/api/parent/children/{child_id}/weak-words", headers=parent_headers)
+        assert [(w["english"], w["total_attempts"], w["accuracy"]) for w in res.json()] == [
+            ("apple", 2, 0.5),
+        ]
+        res = client.get("/api/learning/weak?period=all", headers=headers)
+        assert [w["english"] for w in res.json()] == ["apple"]
+
+    def test_changed_records_recompute(self, db, sample_words):
+        child_id, _ = _new_child(db, "mastery_c")
+        apple, banana = sample_words[0], sample_words[1]
+        now = datetime.now(timezone.utc)
+        db.add_all([
+            LearningRecord(child_id=child_id, word_id=apple.id, is_correct=True,
+                           answered_at=now - timedelta(days=2), session_type="review"),
+            LearningRecord(child_id=child_id, word_id=apple.id, is_correct=False,
+                           answered_at=now, session_type="review"),
+        ])
+        db.commit()
+        record = db.query(LearningRecord).filter(
+            LearningRecord.child_id == child_id, LearningRecord.is_correct == False
+        ).one()
+        record.word_id = banana.id
+        db.commit()
+        assert {w: s[:3] for w, s in _state(db, child_id).items()} == {
+            apple.id: (1, 1, 0), banana.id: (1, 0, 0),
+        }
+
+        db.query(LearningRecord).filter(LearningRecord.child_id == child_id).delete()
+        db.commit()
+        assert _state(db, child_id) == {}
+
+    def test_verify_reports_drift(self, client, db, sample_words):
+        child_id, headers = _new_child(db, "mastery_d")
+        _answer(client, headers, sample_words[0])
+        db.query(WordMastery).filter(WordMastery.child_id == child_id).update({"attempts": 5})
+        db.commit()
+        assert mastery.verify(db, [child_id]) == [(child_id, sample_words[0].id)]
+        mastery.rebuild(db)
+        db.commit()
+        assert mastery.verify(db) == []
@@ -0,0 +1,113 @@
+from datetime import date, datetime, timezone
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from app.migrations import MIGRATIONS, applied_versions, migrate, prepare
+from app.models import LearningRecord
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR, username VARCHAR NOT NULL UNIQUE,"
+    " hashed_password VARCHAR NOT NULL, role VARCHAR NOT NULL, parent_id INTEGER, created_at DATETIME)",
+    "CREATE TABLE words (id INTEGER PRIMARY KEY, english VARCHAR NOT NULL, japanese VARCHAR NOT NULL,"
+    " english_katakana VARCHAR NOT NULL, section INTEGER NOT NULL)",
+    "CREATE TABLE learning_records (id INTEGER PRIMARY KEY, child_id INTEGER NOT NULL,"
+    " word_id INTEGER NOT NULL, is_correct BOOLEAN NOT NULL, used_hint BOOLEAN,"
+    " answered_at DATETIME, session_type VARCHAR NOT NULL)",
+    "CREATE INDEX ix_learning_records_child_id ON learning_records (child_id)",
+]
+
+
+def _legacy_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text(
+            "INSERT INTO learning_records (child_id, word_id, is_correct, used_hint, answered_at, session_type)"
+            " VALUES (1, 1, 1, 0, '2024-01-01 20:00:00', 'today')"
+        ))
+    return engine
+
+
+class TestMigrations:
+    def test_fresh_database_is_stamped(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+        assert prepare(engine) == []
+        assert applied_versions(engine) == {m.version for m in MIGRATIONS}
+        indexes = {i["name"] for i in inspect(engine).get_indexes("learning_records")}
+        assert "ix_learning_records_child_session_word" in indexes
+
+    def test_legacy_database_is_migrated_once(self, tmp_path):
+        engine = _legacy_engine(tmp_path)
+        applied = prepare(engine)
+        assert [m.version for m in applied] == [m.version for m in MIGRATIONS]
+
+        indexes = {i["name"] for i in inspect(engine).get_indexes("learning_records")}
+        assert {
+            "ix_learning_records_child_answered",
+            "ix_learning_records_child_word",
+            "ix_learning_records_child_session_word",
+        } <= indexes
+        assert "ix_learning_records_child_id" not in indexes
+        assert "ix_users_email" in {i["name"] for i in inspect(engine).get_indexes("users")}
+        # Tables missing from the old release are created
+        assert inspect(engine).has_table("child_progress")
+        # Existing rows survive in the compact encoding, JST day backfilled
+        with engine.connect() as conn:
+            rows = conn.execute(text(
+                "SELECT outcome, session_type, answered_at, local_day FROM learning_records"
+            )).all()
+        assert rows == [(1, 1, 1704139200, (date(2024, 1, 2) - date(1970, 1, 1)).days)]
+        db = sessionmaker(bind=engine)()
+        record = db.query(LearningRecord).one()
+        assert (record.is_correct, record.used_hint, record.session_type) == (True, False, "today")
+        assert record.answered_at == datetime(2024, 1, 1, 20, 0)
+        assert record.local_day == date(2024, 1, 2)
+        db.close()
+
+        assert migrate(engine) == []
+
+    def test_local_day_is_set_on_flush(self, db):
+        record = LearningRecord(
+            child_id=1, word_id=1, is_correct=True, session_type="today",
+            answered_at=datetime(2024, 3, 31, 15, 30, tzinfo=timezone.utc),
+        )
+        db.add(record)
+        db.flush()
+        assert record.local_day == date(2024, 4, 1)
+        record.answered_at = datetime(2024, 3, 31, 14, 59)
+        db.flush()
+        assert record.local_day == date(2024, 3, 31)
+        db.rollback()
+
+    def test_outcome_flags_map_to_bits(self, db):
+        record = LearningRecord(
+            child_id=1, word_id=1, is_correct=False, used_hint=True, session_type="weak",
+        )
+        assert record.outcome == 2
+        record.is_correct = True
+        assert record.outcome == 3
+        db.add(record)
+        db.flush()
+        found = (
+            db.query(LearningRecord)
+            .filter(LearningRecord.is_correct == True, LearningRecord.used_hint == True)
+            .filter(LearningRecord.session_type == "weak")
+            .all()
+        )
+        assert found == [record]
+        db.rollback()
+
+    def test_hot_queries_use_indexes(self, tmp_path):
+        engine = _legacy_engine(tmp_path)
+        prepare(engine)
+        with engine.connect() as conn:
+            plan = " ".join(
+                str(row[-1]) for row in conn.execute(text(
+                    "EXPLAIN QUERY PLAN SELECT DISTINCT word_id FROM learning_records"
+                    " WHERE child_id = 1 AND answered_at >= 1704067200"
+                ))
+            )
+        assert "USING" in plan and "INDEX" in plan
+        assert "SCAN learning_records" not in plan
@@ -204,3 +204,43 @@ class TestParent:
             "username": "x", "password": "x",
         })
         assert res.status_code == 403
+
+    def test_create_children_bulk(self, client, parent_headers, child_user):
+        res = client.post("/api/parent/children/bulk", headers=parent_headers, json={
+            "children": [
+                {"username": "bulk1", "password": "pass1"},
+                {"username": "testchild", "password": "pass"},
+                {"username": "bulk2", "password": "pass2"},
+                {"username": "bulk1", "password": "again"},
+            ],
+        })
+        assert res.status_code == 201
+        data = res.json()
+        assert [r["status"] for r in data] == ["created", "duplicate", "created", "duplicate"]
+        assert data[0]["id"] is not None
+        assert data[1]["id"] is None
+
+        res = client.get("/api/parent/children", headers=parent_headers)
+        names = {c["username"] for c in res.json()}
+        assert {"bulk1", "bulk2"} <= names
+
+        res = client.post("/api/auth/login", json={"username": "bulk2", "password": "pass2"})
+        assert res.status_code == 200
+
+    def test_create_children_bulk_conflict(self, client, db, parent_headers, monkeypatch):
+        from app.api import parent as parent_api
+
+        parent_id = db.query(User).filter(User.username == "testparent").one().id
+        hash_passwords = parent_api.hash_passwords
+
+        def racing_hash(passwords):
+            # Another request registers the name while this batch is hashing
+            db.add(User(username="raced", hashed_password="x", role="child", parent_id=parent_id))
+            db.commit()
+            return hash_passwords(passwords)
+
+        monkeypatch.setattr(parent_api, "hash_passwords", racing_hash)
+        res = client.post("/api/parent/children/bulk", headers=parent_headers, json={
+            "children": [{"username": "raced", "password": "pass1"}],
+        })
+        assert res.status_code == 409
@@ -0,0 +1,139 @@
+import threading
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import plans
+from app.database import Base
+from app.models import ChildProgress, DailyPlan, User, Word
+from app.tests.conftest import TestSessionLocal, engine
+
+
+@pytest.fixture
+def file_db(tmp_path, monkeypatch):
+    file_engine = create_engine(
+        f"sqlite:///{tmp_path / 'plans.db'}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+    Base.metadata.create_all(bind=file_engine)
+    Session = sessionmaker(bind=file_engine)
+    db = Session()
+    db.add_all(
+        Word(english=f"plan{i}", japanese=f"計画{i}", english_katakana="プラン", section=1 + i % 2)
+        for i in range(6)
+    )
+    children = [User(username=f"plan_child{i}", hashed_password="x", role="child") for i in range(7)]
+    db.add_all(children)
+    db.flush()
+    db.add_all(ChildProgress(child_id=c.id) for c in children)
+    db.commit()
+    db.close()
+    monkeypatch.setattr(plans, "SessionLocal", Session)
+    plans.catalog.invalidate()
+    yield Session
+    plans.catalog.invalidate()
+    file_engine.dispose()
+
+
+class TestDailyPlans:
+    def test_job_plans_every_child_in_chunks(self, file_db):
+        stats = plans.run_daily_plans(workers=3, chunk_size=2)
+        assert stats["children"] == 7
+        assert stats["planned"] == 7
+        assert stats["chunks"] == 4
+
+        db = file_db()
+        rows = db.query(DailyPlan).all()
+        assert len(rows) == 7
+        assert all(r.day == plans.today_jst() and r.section == 1 for r in rows)
+        assert all(sorted(plans.plan_word_ids(r)) == [1, 3, 5] for r in rows)
+        db.close()
+
+        # Claimed for today: a second run is a no-op, a forced one finds nothing to do
+        assert plans.run_daily_plans() is None
+        assert plans.run_daily_plans(force=True)["planned"] == 0
+
+    def test_job_goes_through_the_write_queue(self, file_db, monkeypatch):
+        from app import writer as writer_module
+        from app.writer import WriteQueue, create_writer_engine
+
+        writer_engine = create_writer_engine(str(file_db.kw["bind"].url), {})
+        queue = WriteQueue(sessionmaker(bind=writer_engine, autoflush=False, expire_on_commit=False))
+        monkeypatch.setattr(writer_module, "writer", queue)
+        try:
+            stats = plans.run_daily_plans(workers=3, chunk_size=2)
+            assert plans.run_daily_plans() is None
+        finally:
+            queue.stop()
+            writer_engine.dispose()
+        assert stats["planned"] == 7
+        # Claim, four chunks, finish, and the second run's refused claim
+        assert queue.jobs == 7
+        db = file_db()
+        assert db.query(DailyPlan).count() == 7
+        db.close()
+
+    def test_only_one_worker_runs_the_job(self, file_db):
+        results = []
+        barrier = threading.Barrier(4)
+
+        def worker():
+            barrier.wait()
+            results.append(plans.run_daily_plans(day=date(2030, 1, 1), workers=1))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len([r for r in results if r is not None]) == 1
+
+    def test_today_is_a_pure_read_after_the_job(self, client, child_headers, sample_words, monkeypatch):
+        monkeypatch.setattr(plans, "SessionLocal", TestSessionLocal)
+        plans.run_daily_plans(workers=1, force=True)
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            res = client.get("/api/learning/today", headers=child_headers)
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        assert res.status_code == 200
+        assert not [s for s in statements if not s.lstrip().upper().startswith("SELECT")]
+
+    def test_next_run_is_just_after_jst_midnight(self):
+        scheduler = plans.DailyPlanScheduler(job=lambda: None, delay=5)
+        # 23:59 JST
+        now = datetime(2024, 5, 1, 14, 59, tzinfo=timezone.utc)
+        assert scheduler.seconds_until_next_run(now) == 65
+
+    def test_failed_run_releases_its_claim(self, file_db, monkeypatch):
+        plan_chunk = plans._plan_chunk
+
+        def broken(*args):
+            raise RuntimeError("disk full")
+
+        monkeypatch.setattr(plans, "_plan_chunk", broken)
+        with pytest.raises(RuntimeError):
+            plans.run_daily_plans(workers=1)
+        db = file_db()
+        run = db.get(plans.JobRun, (plans.JOB_NAME, plans.today_jst()))
+        assert run.finished_at is None and run.error == "RuntimeError: disk full"
+        db.close()
+
+        # The retry takes the claim over without waiting for it to go stale
+        monkeypatch.setattr(plans, "_plan_chunk", plan_chunk)
+        assert plans.run_daily_plans(workers=1)["planned"] == 7
+
+    def test_scheduler_retries_a_failed_run(self):
+        scheduler = plans.DailyPlanScheduler(job=lambda: None, delay=5, retry_after=1800)
+        now = datetime(2024, 5, 1, 3, 0, tzinfo=timezone.utc)
+        assert scheduler.next_wait(False, now) == 1800
+        assert scheduler.next_wait(True, now) > 1800
+        # 23:59 JST: the next midnight comes first anyway
+        assert scheduler.next_wait(False, datetime(2024, 5, 1, 14, 59, tzinfo=timezone.utc)) == 65
@@ -0,0 +1,57 @@
+from sqlalchemy import event
+
+from app import quiz_sessions
+from app.tests.conftest import engine
+
+
+def _quiz(client, headers):
+    res = client.get("/api/learning/today", headers=headers)
+    assert res.status_code == 200
+    return res.json(), res.headers[quiz_sessions.HEADER]
+
+
+def _post(client, headers, token, word_id, answer, session_type="today"):
+    return client.post(
+        "/api/learning/answer",
+        headers={**headers, quiz_sessions.HEADER: token},
+        json={"word_id": word_id, "answer": answer, "session_type": session_type},
+    )
+
+
+class TestQuizSessions:
+    def test_answers_graded_without_word_reads(self, client, child_headers, sample_words):
+        words, token = _quiz(client, child_headers)
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            res = _post(client, child_headers, token, words[0]["id"], words[0]["english"])
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        assert res.status_code == 200
+        assert res.json()["is_correct"] is True
+        assert not [s for s in statements if "FROM words" in s]
+
+    def test_answers_outside_the_session_are_rejected(self, client, child_headers, sample_words):
+        words, token = _quiz(client, child_headers)
+        quiz_ids = {w["id"] for w in words}
+        other = next(w for w in sample_words if w.id not in quiz_ids)
+        assert _post(client, child_headers, token, other.id, other.english).status_code == 400
+        res = _post(client, child_headers, token, words[0]["id"], "x", session_type="weak")
+        assert res.status_code == 400
+        assert _post(client, child_headers, token + "x", words[0]["id"], "x").status_code == 400
+
+    def test_session_is_bound_to_the_child(self, client, child_headers, sample_words):
+        words, _ = _quiz(client, child_headers)
+        token = quiz_sessions.issue(-1, "today", [words[0]["id"]])
+        assert _post(client, child_headers, token, words[0]["id"], "x").status_code == 400
+
+    def test_required_mode(self, client, child_headers, sample_words, monkeypatch):
+        monkeypatch.setattr(quiz_sessions, "QUIZ_SESSION_REQUIRED", True)
+        res = client.post("/api/learning/answer", headers=child_headers, json={
+            "word_id": sample_words[0].id, "answer": "apple", "session_type": "today",
+        })
+        assert res.status_code == 400
@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+
+from app import rollups
+from app.auth import create_access_token
+from app.models import DailyRollup, LearningRecord, User
+
+
+def _state(db, child_id):
+    db.expire_all()
+    return {
+        (row.day, row.session_type): (row.correct, row.hinted, row.incorrect)
+        for row in db.query(DailyRollup).filter(DailyRollup.child_id == child_id)
+    }
+
+
+class TestDailyRollups:
+    def test_records_update_rollup(self, client, db, sample_words, parent_headers):
+        parent = db.query(User).filter(User.username == "testparent").one()
+        child = User(username="rollup_a", hashed_password="x", role="child", parent_id=parent.id)
+        db.add(child)
+        db.commit()
+        child_id = child.id
+        apple, banana = sample_words[0], sample_words[1]
+        for word, at, correct, hint, session_type in [
+            (apple, datetime(2025, 4, 1, 14, 0), True, False, "today"),  # 04-01 23:00 JST
+            (apple, datetime(2025, 4, 1, 15, 30), True, True, "today"),  # 04-02 00:30 JST
+            (banana, datetime(2025, 4, 1, 16, 0), False, True, "today"),
+            (banana, datetime(2025, 4, 1, 17, 0), True, False, "weak"),
+        ]:
+            db.add(LearningRecord(
+                child_id=child_id, word_id=word.id, is_correct=correct, used_hint=hint,
+                answered_at=at.replace(tzinfo=timezone.utc), session_type=session_type,
+            ))
+        db.commit()
+
+        incremental = _state(db, child_id)
+        assert incremental == {
+            (datetime(2025, 4, 1).date(), "today"): (1, 0, 0),
+            (datetime(2025, 4, 2).date(), "today"): (0, 1, 1),
+            (datetime(2025, 4, 2).date(), "weak"): (1, 0, 0),
+        }
+        rollups.rebuild(db, [child_id])
+        db.commit()
+        assert _state(db, child_id) == incremental
+
+        res = client.get(f"/api/parent/children/{child_id}/stats?year=2025&month=4", headers=parent_headers)
+        days = {d["date"]: d for d in res.json()}
+        assert len(days) == 30
+        assert (days["2025-04-02"]["today_hint"], days["2025-04-02"]["today_incorrect"]) == (1, 1)
+        assert days["2025-04-02"]["weak_correct"] == 1
+
+        headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'rollup_a'})}"}
+        assert client.get("/api/learning/stats?year=2025&month=4", headers=headers).json() == res.json()
+
+        db.query(LearningRecord).filter(LearningRecord.child_id == child_id).delete()
+        db.commit()
+        assert _state(db, child_id) == {}
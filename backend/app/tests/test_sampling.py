@@ -0,0 +1,40 @@
+import random
+from collections import Counter
+
+from app.sampling import AliasTable, reservoir_sample, weighted_sample
+
+
+class TestSampling:
+    def test_reservoir_sample_is_uniform(self):
+        rng = random.Random(1)
+        counts = Counter()
+        for _ in range(4000):
+            picked = reservoir_sample(iter(range(100)), 5, rng)
+            assert len(set(picked)) == 5
+            counts.update(picked)
+        # Every item expected 200 times
+        assert min(counts.values()) > 120
+        assert max(counts.values()) < 280
+
+    def test_reservoir_sample_short_stream(self):
+        assert sorted(reservoir_sample(range(3), 10)) == [0, 1, 2]
+        assert reservoir_sample(range(3), 0) == []
+
+    def test_alias_table_follows_weights(self):
+        rng = random.Random(2)
+        table = AliasTable([1, 2, 7])
+        counts = Counter(table.draw(rng) for _ in range(20000))
+        assert abs(counts[2] / 20000 - 0.7) < 0.02
+        assert abs(counts[0] / 20000 - 0.1) < 0.02
+
+    def test_weighted_sample_distinct(self):
+        rng = random.Random(3)
+        items = list(range(50))
+        weights = [1.0] * 49 + [100.0]
+        hits = 0
+        for _ in range(200):
+            picked = weighted_sample(items, weights, 10, rng)
+            assert len(set(picked)) == 10
+            hits += 49 in picked
+        assert hits > 190
+        assert sorted(weighted_sample(items, weights, 80, rng)) == items
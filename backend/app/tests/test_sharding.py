@@ -0,0 +1,152 @@
+import os
+import sqlite3
+
+import pytest
+from fastapi import Request
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+
+from app.database import GLOBAL_TABLES, Base, get_db, get_read_db, sqlite_pragmas
+from app.main import app
+from app.models import Word
+from app.sharding import ShardRouter
+
+
+@pytest.fixture
+def shards(tmp_path, monkeypatch):
+    global_engine = create_engine(
+        f"sqlite:///{tmp_path / 'global.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    Base.metadata.create_all(
+        bind=global_engine,
+        tables=[t for t in Base.metadata.sorted_tables if t.name in GLOBAL_TABLES],
+    )
+    GlobalSession = sessionmaker(autocommit=False, autoflush=False, bind=global_engine)
+    router = ShardRouter(str(tmp_path / "shards"), GlobalSession, sqlite_pragmas("performance", overrides={}))
+    monkeypatch.setattr("app.sharding.shards", router)
+    db = GlobalSession()
+    db.add_all([
+        Word(english="apple", japanese="りんご", english_katakana="アップル", section=1),
+        Word(english="bird", japanese="鳥", english_katakana="バード", section=1),
+    ])
+    db.commit()
+    db.close()
+
+    def routed_db(request: Request):
+        db = router.session_for_request(request)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setattr("app.auth.TOKEN_FORMAT", "claims")
+    monkeypatch.setattr("app.auth.SHARD_DIR", str(tmp_path / "shards"))
+    monkeypatch.setitem(app.dependency_overrides, get_db, routed_db)
+    monkeypatch.setitem(app.dependency_overrides, get_read_db, routed_db)
+    yield router
+    global_engine.dispose()
+
+
+def _login(client, username, password):
+    res = client.post("/api/auth/login", json={"username": username, "password": password})
+    assert res.status_code == 200
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+
+def _register(client, username):
+    res = client.post("/api/auth/register", json={
+        "email": f"{username}@test.com",
+        "username": username,
+        "password": "pass",
+    })
+    assert res.status_code == 200
+    return res.json()["id"]
+
+
+class TestSharding:
+    def test_family_lives_in_its_own_file(self, client, shards):
+        family_a = _register(client, "fam_a")
+        family_b = _register(client, "fam_b")
+        headers_a = _login(client, "fam_a", "pass")
+        headers_b = _login(client, "fam_b", "pass")
+
+        res = client.post("/api/parent/children", headers=headers_a, json={
+            "username": "kid_a", "password": "kidpass",
+        })
+        assert res.status_code == 201
+        # Usernames stay unique across families
+        res = client.post("/api/parent/children", headers=headers_b, json={
+            "username": "kid_a", "password": "kidpass",
+        })
+        assert res.status_code == 400
+
+        kid = _login(client, "kid_a", "kidpass")
+        words = client.get("/api/learning/today", headers=kid).json()
+        assert {w["english"] for w in words} == {"apple", "bird"}
+        res = client.post("/api/learning/answer", headers=kid, json={
+            "word_id": words[0]["id"], "answer": words[0]["english"], "session_type": "today",
+        })
+        assert res.json()["is_correct"] is True
+        assert client.get("/api/learning/menu-status", headers=kid).json()["review_all"] == 1
+
+        assert [c["username"] for c in client.get("/api/parent/children", headers=headers_a).json()] == ["kid_a"]
+        assert client.get("/api/parent/children", headers=headers_b).json() == []
+
+        with sqlite3.connect(shards.path(family_a)) as conn:
+            assert conn.execute("SELECT count(*) FROM learning_records").fetchone()[0] == 1
+        with sqlite3.connect(shards.path(family_b)) as conn:
+            assert conn.execute("SELECT count(*) FROM learning_records").fetchone()[0] == 0
+        assert "users" not in inspect(shards.global_session.kw["bind"]).get_table_names()
+
+    def test_delete_child_and_drop_family(self, client, shards):
+        family = _register(client, "fam_c")
+        headers = _login(client, "fam_c", "pass")
+        res = client.post("/api/parent/children", headers=headers, json={
+            "username": "kid_c", "password": "kidpass",
+        })
+        kid_id = res.json()["id"]
+        kid = _login(client, "kid_c", "kidpass")
+
+        client.delete(f"/api/parent/children/{kid_id}", headers=headers)
+        assert client.get("/api/learning/menu-status", headers=kid).status_code == 401
+        res = client.post("/api/auth/login", json={"username": "kid_c", "password": "kidpass"})
+        assert res.status_code == 401
+
+        shards.drop_family(family)
+        assert not os.path.exists(shards.path(family))
+        res = client.post("/api/auth/login", json={"username": "fam_c", "password": "pass"})
+        assert res.status_code == 401
+
+    def test_open_family_engines_are_bounded(self, client, shards):
+        shards.max_open = 2
+        families = [_register(client, f"fam_lru{i}") for i in range(3)]
+        assert list(shards._makers) == families[1:]
+
+        # An evicted family reopens with its data intact
+        headers = _login(client, "fam_lru0", "pass")
+        assert client.get("/api/auth/me", headers=headers).json()["username"] == "fam_lru0"
+        assert list(shards._makers) == [families[2], families[0]]
+
+    def test_catalog_change_rebuilds_family_completion(self, client, shards):
+        family = _register(client, "fam_catalog")
+        headers = _login(client, "fam_catalog", "pass")
+        client.post("/api/parent/children", headers=headers, json={
+            "username": "kid_catalog", "password": "kidpass",
+        })
+        kid = _login(client, "kid_catalog", "kidpass")
+        words = {w["english"]: w for w in client.get("/api/learning/today", headers=kid).json()}
+        client.post("/api/learning/answer", headers=kid, json={
+            "word_id": words["bird"]["id"], "answer": "bird", "session_type": "today",
+        })
+
+        def bits():
+            with sqlite3.connect(shards.path(family)) as conn:
+                return conn.execute("SELECT words FROM section_completion").fetchone()[0]
+
+        assert bits() == bytes([0b10])
+        db = shards.global_session()
+        db.query(Word).filter(Word.english == "apple").delete()
+        db.commit()
+        db.close()
+        assert bits() == bytes([0b1])
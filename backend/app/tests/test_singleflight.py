@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from sqlalchemy import event
+
+from app.api.parent import _get_daily_stats
+from app.models import User
+from app.singleflight import SingleFlight
+from app.tests.conftest import TestSessionLocal, engine
+
+
+class TestSingleFlight:
+    def test_concurrent_identical_requests_run_one_query(self, db):
+        child = User(username="flight_a", hashed_password="x", role="child")
+        db.add(child)
+        db.commit()
+        child_id = child.id
+        queries = []
+
+        def slow_rollup_read(conn, cursor, statement, parameters, context, executemany):
+            if "FROM daily_rollups" in statement:
+                queries.append(statement)
+                time.sleep(0.2)  # keep the first computation in flight
+
+        n = 8
+        barrier = threading.Barrier(n)
+        results = []
+
+        def request():
+            session = TestSessionLocal()
+            try:
+                barrier.wait()
+                results.append(_get_daily_stats(session, child_id, 2025, 6))
+            finally:
+                session.close()
+
+        event.listen(engine, "before_cursor_execute", slow_rollup_read)
+        try:
+            threads = [threading.Thread(target=request) for _ in range(n)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            event.remove(engine, "before_cursor_execute", slow_rollup_read)
+        assert len(queries) == 1
+        assert len(results) == n
+        assert all(r is results[0] for r in results)
+
+    def test_async_callers_share_with_threads(self):
+        flight = SingleFlight()
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def compute():
+            calls.append("thread")
+            started.set()
+            release.wait(5)
+            return 42
+
+        leader = threading.Thread(target=lambda: flight.do("k", compute))
+        leader.start()
+        started.wait(5)
+
+        async def async_compute():
+            calls.append("async")
+            return 0
+
+        async def main():
+            waiting = asyncio.gather(*(flight.do_async("k", async_compute) for _ in range(5)))
+            await asyncio.sleep(0.05)
+            release.set()
+            return await waiting
+
+        assert asyncio.run(main()) == [42] * 5
+        leader.join()
+        assert calls == ["thread"]
+        assert flight.stats() == {"in_flight": 0, "leaders": 1, "followers": 5}
+
+    def test_errors_are_shared_and_not_remembered(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError("boom")
+
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                flight.do("k", fail)
+        assert flight.do("k", lambda: 1) == 1
+
+    def test_cancelled_leader_hands_over_to_a_follower(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def compute():
+            calls.append(len(calls))
+            await asyncio.sleep(0.05)
+            return len(calls)
+
+        async def main():
+            leader = asyncio.create_task(flight.do_async("k", compute))
+            await asyncio.sleep(0.01)
+            followers = [asyncio.create_task(flight.do_async("k", compute)) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await asyncio.gather(*followers)
+
+        # One follower recomputes and the others share its result
+        assert asyncio.run(main()) == [2] * 3
+        assert calls == [0, 1]
+        assert flight.stats()["in_flight"] == 0
+
+    def test_cancelled_follower_leaves_the_call_running(self):
+        flight = SingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return 7
+
+        async def main():
+            leader = asyncio.create_task(flight.do_async("k", compute))
+            await asyncio.sleep(0.01)
+            follower = asyncio.create_task(flight.do_async("k", compute))
+            other = asyncio.create_task(flight.do_async("k", compute))
+            await asyncio.sleep(0.01)
+            follower.cancel()
+            return await asyncio.gather(leader, other)
+
+        assert asyncio.run(main()) == [7, 7]
@@ -0,0 +1,53 @@
+from sqlalchemy import event
+
+from app.auth import create_access_token
+from app.models import ChildProgress, User
+from app.tests.conftest import engine
+from app.view_cache import view_cache
+
+
+def _count_statements(fn):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        result = fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return result, len(statements)
+
+
+class TestViewCache:
+    def test_repeat_views_come_from_memory_until_an_answer(self, client, db, sample_words, parent_headers):
+        parent = db.query(User).filter(User.username == "testparent").one()
+        child = User(username="viewcache_a", hashed_password="x", role="child", parent_id=parent.id)
+        db.add(child)
+        db.flush()
+        db.add(ChildProgress(child_id=child.id))
+        db.commit()
+        child_id = child.id
+        headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'viewcache_a'})}"}
+        stats_url = f"/api/parent/children/{child_id}/stats?year=2025&month=1"
+
+        first = client.get("/api/learning/menu-status", headers=headers).json()
+        client.get(stats_url, headers=parent_headers)
+        again, statements = _count_statements(
+            lambda: client.get("/api/learning/menu-status", headers=headers).json()
+        )
+        assert again == first
+        assert statements == 0
+        _, statements = _count_statements(lambda: client.get(stats_url, headers=parent_headers))
+        assert statements == 1  # the parent/child ownership check
+
+        client.post("/api/learning/answer", headers=headers, json={
+            "word_id": sample_words[0].id, "answer": "apple", "session_type": "review",
+        })
+        after = client.get("/api/learning/menu-status", headers=headers).json()
+        assert after["review_all"] == first["review_all"] + 1
+
+        stats = view_cache.stats()
+        assert stats["stale"] == 1
+        assert 0 < stats["hit_rate"] < 1
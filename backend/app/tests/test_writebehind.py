@@ -0,0 +1,112 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app import writebehind
+from app.auth import create_access_token
+from app.models import ChildProgress, LearningRecord, User, WordMastery
+from app.tests.conftest import TestSessionLocal
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    # Long interval: only a read barrier, max_records or stop() flushes
+    buf = writebehind.WriteBehindBuffer(TestSessionLocal, interval_ms=60_000, max_records=5)
+    monkeypatch.setattr(writebehind, "buffer", buf)
+    yield buf
+    buf.stop()
+
+
+def _child(db, username):
+    child = User(username=username, hashed_password="x", role="child")
+    db.add(child)
+    db.flush()
+    db.add(ChildProgress(child_id=child.id))
+    db.commit()
+    return child.id, {"Authorization": f"Bearer {create_access_token(data={'sub': username})}"}
+
+
+def _record(child_id, word):
+    return LearningRecord(
+        child_id=child_id, word_id=word.id, is_correct=True, session_type="review",
+        answered_at=datetime.now(timezone.utc),
+    )
+
+
+def _count(db, child_id):
+    db.expire_all()
+    return db.query(LearningRecord).filter(LearningRecord.child_id == child_id).count()
+
+
+def _answer(client, headers, word, answer=None):
+    res = client.post("/api/learning/answer", headers=headers, json={
+        "word_id": word.id, "answer": answer or word.english, "session_type": "review",
+    })
+    assert res.status_code == 200
+    return res.json()
+
+
+class TestWriteBehind:
+    def test_graded_now_stored_before_reads(self, client, db, sample_words, buffer):
+        child_id, headers = _child(db, "wb_a")
+        apple = sample_words[0]
+        assert _answer(client, headers, apple)["is_correct"] is True
+        assert _answer(client, headers, apple, answer="x")["is_correct"] is False
+        assert _count(db, child_id) == 0
+
+        res = client.get("/api/learning/menu-status", headers=headers)
+        assert res.json()["review_all"] == 1
+        assert _count(db, child_id) == 2
+        mastery = db.query(WordMastery).filter(WordMastery.child_id == child_id).one()
+        assert (mastery.attempts, mastery.correct) == (2, 1)
+        assert buffer.stats()["flushes"] == 1
+
+    def test_flushes_when_full_and_on_stop(self, client, db, sample_words, buffer):
+        child_id, headers = _child(db, "wb_b")
+        for word in sample_words[:5]:
+            _answer(client, headers, word)
+        buffer.sync()
+        assert _count(db, child_id) == 5
+
+        _answer(client, headers, sample_words[0])
+        buffer.stop()
+        assert _count(db, child_id) == 6
+        assert buffer.stats() == {"pending": 0, "flushes": 2, "records": 6, "failures": 0, "dropped": 0}
+
+    def test_keyed_answers_are_written_through(self, client, db, sample_words, buffer):
+        child_id, headers = _child(db, "wb_c")
+        res = client.post("/api/learning/answer", headers=headers, json={
+            "word_id": sample_words[0].id, "answer": "apple", "session_type": "today",
+            "idempotency_key": "wb-1",
+        })
+        assert res.status_code == 200
+        assert _count(db, child_id) == 1
+        assert buffer.stats()["records"] == 0
+
+    def test_failing_record_does_not_block_the_rest(self, client, db, sample_words, buffer):
+        child_id, headers = _child(db, "wb_d")
+        _answer(client, headers, sample_words[0])
+        # A child removed while its answer was buffered: the batch hits the FK
+        buffer.add([_record(child_id + 1000, sample_words[0])])
+        _answer(client, headers, sample_words[1])
+        buffer.sync()
+        assert _count(db, child_id) == 2
+        stats = buffer.stats()
+        assert (stats["records"], stats["dropped"], stats["pending"]) == (2, 1, 0)
+        assert buffer.dead_letter[0]["child_id"] == child_id + 1000
+
+    def test_retries_are_capped(self, db, sample_words):
+        def broken():
+            raise OSError("disk unavailable")
+
+        buf = writebehind.WriteBehindBuffer(broken, interval_ms=1, max_retries=3)
+        buf.add([_record(1, sample_words[0])])
+        buf.sync()
+        buf.stop()
+        # Three tries of the batch, then one of the record on its own
+        assert buf.stats() == {"pending": 0, "flushes": 1, "records": 0, "failures": 3, "dropped": 1}
+
+    def test_refuses_several_workers(self, buffer):
+        writebehind.check_workers(1)
+        with pytest.raises(RuntimeError):
+            writebehind.check_workers(2)
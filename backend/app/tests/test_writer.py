@@ -0,0 +1,124 @@
+import threading
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, apply_sqlite_pragmas, sqlite_pragmas
+from app.models import LearningRecord, User, Word
+from app.writer import WriteQueue, create_writer_engine
+
+
+class TestWriteQueue:
+    def _setup(self, tmp_path):
+        url = f"sqlite:///{tmp_path / 'writer.db'}"
+        pragmas = sqlite_pragmas("performance", overrides={})
+        writer_engine = create_writer_engine(url, pragmas)
+        Base.metadata.create_all(bind=writer_engine)
+        read_engine = create_engine(url, connect_args={"check_same_thread": False})
+        apply_sqlite_pragmas(read_engine, {**pragmas, "query_only": "ON"})
+        writer = WriteQueue(
+            sessionmaker(bind=writer_engine, autoflush=False, expire_on_commit=False),
+            max_batch=32,
+        )
+        ReadSession = sessionmaker(bind=read_engine)
+        return writer, ReadSession
+
+    def test_concurrent_answers(self, tmp_path):
+        writer, ReadSession = self._setup(tmp_path)
+
+        def seed(s):
+            s.add(Word(english="apple", japanese="りんご", english_katakana="アップル", section=1))
+            children = [User(username=f"w{i}", hashed_password="x", role="child") for i in range(16)]
+            s.add_all(children)
+            s.flush()
+            return [c.id for c in children]
+
+        child_ids = writer.submit(seed)
+        errors = []
+        reads = []
+
+        def answer(child_id):
+            try:
+                for i in range(25):
+                    writer.submit(lambda s: s.add(LearningRecord(
+                        child_id=child_id, word_id=1, is_correct=i % 2 == 0,
+                        used_hint=False, session_type="today",
+                        answered_at=datetime.now(timezone.utc),
+                    )))
+                    if i % 5 == 0:
+                        db = ReadSession()
+                        reads.append(db.query(func.count(LearningRecord.id)).scalar())
+                        db.close()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=answer, args=(cid,)) for cid in child_ids]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        writer.stop()
+
+        assert errors == []
+        db = ReadSession()
+        assert db.query(func.count(LearningRecord.id)).scalar() == 16 * 25
+        db.close()
+        assert writer.jobs == 16 * 25 + 1
+        # Jobs queued behind a running batch share its commit
+        assert writer.commits < writer.jobs
+        assert len(reads) == 16 * 5
+
+    def test_failed_job_does_not_affect_batch(self, tmp_path):
+        writer, ReadSession = self._setup(tmp_path)
+        writer.submit(lambda s: s.add(User(username="dup", hashed_password="x", role="child")))
+
+        with pytest.raises(IntegrityError):
+            writer.submit(
+                lambda s: s.add(User(username="dup", hashed_password="x", role="child")) or s.flush()
+            )
+        writer.submit(lambda s: s.add(User(username="ok", hashed_password="x", role="child")))
+        writer.stop()
+
+        db = ReadSession()
+        assert {u.username for u in db.query(User).all()} == {"dup", "ok"}
+        db.close()
+
+
+class TestEndpointsUseWriter:
+    def test_parent_and_auth_writes_go_through_the_writer(self, client, parent_headers, monkeypatch):
+        from app import writer as writer_module
+        from app.tests.conftest import engine
+
+        queue = WriteQueue(sessionmaker(bind=engine, autoflush=False, expire_on_commit=False))
+        monkeypatch.setattr(writer_module, "writer", queue)
+        try:
+            res = client.post("/api/auth/register", json={
+                "email": "via_writer@test.com", "username": "via_writer", "password": "pass123",
+            })
+            assert res.status_code == 200
+            res = client.post("/api/parent/children", headers=parent_headers, json={
+                "username": "writer_child", "password": "pass1",
+            })
+            assert res.status_code == 201
+            child_id = res.json()["id"]
+            res = client.post("/api/parent/children/bulk", headers=parent_headers, json={
+                "children": [{"username": "writer_bulk", "password": "pass2"}],
+            })
+            assert res.json()[0]["id"] is not None
+            res = client.put(f"/api/parent/children/{child_id}/password", headers=parent_headers, json={
+                "password": "newpass",
+            })
+            assert res.status_code == 200
+            res = client.post("/api/auth/login", json={"username": "writer_child", "password": "newpass"})
+            assert res.status_code == 200
+            res = client.delete(f"/api/parent/children/{child_id}", headers=parent_headers)
+            assert res.status_code == 200
+            names = {c["username"] for c in client.get("/api/parent/children", headers=parent_headers).json()}
+            assert "writer_child" not in names
+            assert "writer_bulk" in names
+        finally:
+            queue.stop()
+        assert queue.jobs == 5
@@ -0,0 +1,76 @@
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.cache import CoherentCache, LRUCache, versions
+from app.config import VIEW_CACHE_SIZE, VIEW_CACHE_TTL_SECONDS
+from app.singleflight import SingleFlight
+
+T = TypeVar("T")
+
+# (child_id, view, params) -> computed result for the child and parent
+# screens. Entries are valid while the child's version stamp is unchanged;
+# app.derived marks the children whose records (or progress) a transaction
+# touched, and the stamps are bumped once it commits. The TTL bounds how
+# long time-windowed views ("this week", "today") can lag the clock.
+view_cache = CoherentCache(LRUCache(VIEW_CACHE_SIZE, ttl=VIEW_CACHE_TTL_SECONDS), versions)
+# Misses for the same key computed at the same time share one computation
+flights = SingleFlight()
+
+_MISSING = object()
+
+
+def _scope(child_id: int) -> str:
+    return f"child:{child_id}"
+
+
+def cached(child_id: int, view: str, params: Hashable, compute: Callable[[], T]) -> T:
+    key = (child_id, view, params)
+    value = view_cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+    stamp = view_cache.stamp(_scope(child_id))
+
+    def load():
+        value = compute()
+        view_cache.set(key, value, scope=_scope(child_id), stamp=stamp)
+        return value
+
+    # The stamp is part of the flight key: a request that starts after an
+    # answer was committed never shares a computation begun before it
+    return flights.do((key, stamp), load)
+
+
+async def cached_async(
+    child_id: int, view: str, params: Hashable, compute: Callable[[], Awaitable[T]]
+) -> T:
+    """cached() for coroutines; shares entries and flights with it."""
+    key = (child_id, view, params)
+    value = view_cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+    stamp = view_cache.stamp(_scope(child_id))
+
+    async def load():
+        value = await compute()
+        view_cache.set(key, value, scope=_scope(child_id), stamp=stamp)
+        return value
+
+    return await flights.do_async((key, stamp), load)
+
+
+def invalidate(child_id: int) -> None:
+    """Drop the child's cached views in every worker. Call after commit."""
+    view_cache.invalidate(_scope(child_id))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    for child_id in session.info.pop("changed_children", ()):
+        invalidate(child_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session: Session) -> None:
+    session.info.pop("changed_children", None)
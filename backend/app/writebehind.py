@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import derived
+from app.config import SHARD_DIR, WRITE_BEHIND, WRITE_BEHIND_MAX_RECORDS, WRITE_BEHIND_MS, WRITE_QUEUE
+from app.database import SessionLocal
+from app.models import LearningRecord, jst_day
+
+logger = logging.getLogger(__name__)
+
+_table = LearningRecord.__table__
+_COLUMNS = ("child_id", "word_id", "outcome", "answered_at", "session_type", "local_day")
+# Stay well inside SQLite's limit on bound parameters per statement
+_ROWS_PER_INSERT = 500
+
+
+class WriteBehindBuffer:
+    """Holds graded answers in memory and stores them in batches.
+
+    One background thread inserts everything queued every interval_ms, or
+    as soon as max_records are waiting: multi-row INSERTs plus the
+    derived-table updates, in a single transaction, in the order the
+    records were queued. At most that much is lost if the process dies;
+    stop() stores whatever is left. sync(child_id) waits until the
+    child's queued records are committed, so reads see their own answers.
+
+    A batch that fails is retried up to max_retries times (at once on an
+    IntegrityError, which will not go away), then stored one record at a
+    time. Records that still fail are logged and kept in dead_letter
+    instead of blocking every later answer.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        interval_ms: int = 50,
+        max_records: int = 500,
+        sync_timeout: float = 5.0,
+        max_retries: int = 3,
+    ):
+        self._session_factory = session_factory
+        self.interval = interval_ms / 1000
+        self.max_records = max_records
+        self.sync_timeout = sync_timeout
+        self.max_retries = max_retries
+        self._cond = threading.Condition()
+        self._pending: list[LearningRecord] = []
+        self._queued = 0  # records ever queued
+        self._flushed = 0  # of those, committed
+        self._last_by_child: dict[int, int] = {}
+        self._urgent = False
+        self._stopping = False
+        self._thread: threading.Thread | None = None
+        self._attempts = 0  # failed tries of the batch at the head of the queue
+        self.dead_letter: deque[dict] = deque(maxlen=1000)
+        self.flushes = 0
+        self.records = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        """Store everything queued, then stop the thread."""
+        with self._cond:
+            thread = self._thread
+            if thread is None:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+        thread.join()
+        with self._cond:
+            self._thread = None
+
+    def add(self, records: list[LearningRecord]) -> None:
+        self.start()
+        with self._cond:
+            for record in records:
+                # Core inserts skip the mapper's before_insert hook
+                record.local_day = jst_day(record.answered_at)
+                self._pending.append(record)
+                self._queued += 1
+                self._last_by_child[record.child_id] = self._queued
+            if len(self._pending) >= self.max_records:
+                self._cond.notify_all()
+
+    def has_pending(self, child_id: int) -> bool:
+        with self._cond:
+            return self._last_by_child.get(child_id, 0) > self._flushed
+
+    def sync(self, child_id: int | None = None) -> None:
+        """Wait until the records queued so far (for child_id, or all) are committed."""
+        with self._cond:
+            target = self._queued if child_id is None else self._last_by_child.get(child_id, 0)
+            if target <= self._flushed:
+                return
+            self._urgent = True
+            self._cond.notify_all()
+            if not self._cond.wait_for(lambda: self._flushed >= target, timeout=self.sync_timeout):
+                logger.warning("write-behind: gave up waiting for child %s after %.1fs", child_id, self.sync_timeout)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._stopping)
+                deadline = time.monotonic() + self.interval
+                self._cond.wait_for(
+                    lambda: self._urgent or self._stopping or len(self._pending) >= self.max_records,
+                    timeout=max(0.0, deadline - time.monotonic()),
+                )
+                batch, self._pending = self._pending, []
+                end = self._queued
+                self._urgent = False
+                stopping = self._stopping
+            if batch:
+                try:
+                    self._write(batch)
+                    stored = len(batch)
+                except Exception as e:
+                    logger.exception("write-behind flush of %d records failed", len(batch))
+                    with self._cond:
+                        self.failures += 1
+                        self._attempts += 1
+                        retry = not (
+                            stopping
+                            or isinstance(e, IntegrityError)
+                            or self._attempts >= self.max_retries
+                        )
+                        if retry:
+                            # Keep them first in line and retry on the next tick
+                            self._pending[:0] = batch
+                    if retry:
+                        time.sleep(self.interval)
+                        continue
+                    stored = self._write_each(batch)
+                with self._cond:
+                    self._attempts = 0
+                    self._flushed = end
+                    self._last_by_child = {
+                        c: seq for c, seq in self._last_by_child.items() if seq > end
+                    }
+                    self.flushes += 1
+                    self.records += stored
+                    self._cond.notify_all()
+            with self._cond:
+                if self._stopping and not self._pending:
+                    return
+
+    def _write(self, batch: list[LearningRecord]) -> None:
+        db = self._session_factory()
+        try:
+            rows = [{name: getattr(r, name) for name in _COLUMNS} for r in batch]
+            for i in range(0, len(rows), _ROWS_PER_INSERT):
+                db.execute(insert(_table).values(rows[i:i + _ROWS_PER_INSERT]))
+            derived.records_added(db, batch)
+            db.commit()
+        finally:
+            db.close()
+
+    def _write_each(self, batch: list[LearningRecord]) -> int:
+        """Store records one by one, dead-lettering those that still fail."""
+        stored = 0
+        for record in batch:
+            try:
+                self._write([record])
+                stored += 1
+            except Exception:
+                row = {name: getattr(record, name) for name in _COLUMNS}
+                logger.exception("write-behind: dropped record %s", row)
+                with self._cond:
+                    self.dead_letter.append(row)
+                    self.dropped += 1
+        return stored
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "flushes": self.flushes,
+                "records": self.records,
+                "failures": self.failures,
+                "dropped": self.dropped,
+            }
+
+
+buffer: WriteBehindBuffer | None = None
+if WRITE_BEHIND:
+    if WRITE_QUEUE or SHARD_DIR:
+        raise RuntimeError("WRITE_BEHIND cannot be combined with WRITE_QUEUE or SHARD_DIR")
+    buffer = WriteBehindBuffer(SessionLocal, WRITE_BEHIND_MS, WRITE_BEHIND_MAX_RECORDS)
+
+
+def check_workers(workers: int) -> None:
+    """The buffer and its read barrier live in one process: a read served by
+    another worker would not see the buffered answers."""
+    if buffer is not None and workers > 1:
+        raise RuntimeError("WRITE_BEHIND requires a single worker (WEB_CONCURRENCY=1)")
+
+
+def sync(child_id: int) -> None:
+    """Read barrier: make the child's buffered answers visible (no-op when disabled)."""
+    if buffer is not None:
+        buffer.sync(child_id)
+
+
+async def sync_async(child_id: int) -> None:
+    """sync() for async routes: any wait happens on a worker thread, not the event loop."""
+    if buffer is not None and buffer.has_pending(child_id):
+        await asyncio.to_thread(buffer.sync, child_id)
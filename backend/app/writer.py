@@ -0,0 +1,156 @@
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, TypeVar
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.config import DATABASE_URL, WRITE_QUEUE, WRITE_QUEUE_MAX_BATCH
+from app.database import apply_sqlite_pragmas, sqlite_pragmas
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_STOP = object()
+
+
+def create_writer_engine(url: str, pragmas: dict) -> Engine:
+    """Engine for the single writer: explicit BEGIN IMMEDIATE so SAVEPOINTs work on pysqlite."""
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    apply_sqlite_pragmas(engine, pragmas)
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def _disable_pysqlite_begin(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine, "begin")
+        def _begin_immediate(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+    return engine
+
+
+class WriteQueue:
+    """Runs write units of work in order on one thread and one connection.
+
+    Jobs queued while a batch is running are committed together (group
+    commit). Each job runs in its own SAVEPOINT, so a failing job only
+    rolls back itself.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], max_batch: int = 64):
+        self._session_factory = session_factory
+        self.max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.jobs = 0
+        self.commits = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        """Finish everything already queued, then stop the thread."""
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, fn: Callable[[Session], T]) -> T:
+        """Run fn(session) on the writer and wait until it is committed."""
+        self.start()
+        future: Future = Future()
+        self._queue.put((fn, future))
+        return future.result()
+
+    def _run(self) -> None:
+        session = self._session_factory()
+        try:
+            while True:
+                job = self._queue.get()
+                if job is _STOP:
+                    return
+                batch = [job]
+                stop = False
+                while len(batch) < self.max_batch:
+                    try:
+                        job = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is _STOP:
+                        stop = True
+                        break
+                    batch.append(job)
+                self._run_batch(session, batch)
+                if stop:
+                    return
+        finally:
+            session.close()
+
+    def _run_batch(self, session: Session, batch: list) -> None:
+        done = []
+        for fn, future in batch:
+            try:
+                # The SAVEPOINT's flush on exit can fail too (e.g. a unique key)
+                with session.begin_nested():
+                    result = fn(session)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            done.append((future, result))
+        try:
+            session.commit()
+        except Exception as e:
+            logger.exception("group commit failed")
+            session.rollback()
+            for future, _ in done:
+                future.set_exception(e)
+            return
+        self.jobs += len(batch)
+        self.commits += 1
+        for future, result in done:
+            future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "jobs": self.jobs,
+            "commits": self.commits,
+        }
+
+
+writer: WriteQueue | None = None
+if WRITE_QUEUE:
+    writer = WriteQueue(
+        sessionmaker(
+            bind=create_writer_engine(DATABASE_URL, sqlite_pragmas()),
+            autoflush=False,
+            expire_on_commit=False,
+        ),
+        max_batch=WRITE_QUEUE_MAX_BATCH,
+    )
+
+
+def run_write(db: Session, fn: Callable[[Session], T]) -> T:
+    """Apply fn's writes and commit, through the writer thread when enabled.
+
+    fn must do all of its writes on the session it is given. With the
+    writer enabled the request session's transaction is ended afterwards
+    so that later reads see the committed rows.
+    """
+    if writer is None:
+        result = fn(db)
+        db.commit()
+        return result
+    result = writer.submit(fn)
+    db.rollback()
+    return result
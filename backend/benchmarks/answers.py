@@ -0,0 +1,103 @@
+"""解答保存のスループット計測 (SQLite PRAGMA プロファイル比較)
+
+使い方:
+  python -m benchmarks.answers [スレッド数] [1スレッドあたりの解答数]
+
+submit_answer と同じ処理 (カタログでの単語取得 + LearningRecord の追加 + commit) を
+複数スレッドから一時ファイルの DB に対して実行し、プロファイルごとの answers/sec を表示する。
+write-behind は commit の代わりにバッファへ積み、最後の書き出し完了までを計測に含める。
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import completion, mastery, rollups  # noqa: F401 - keep derived tables current
+from app.catalog import catalog
+from app.database import Base, apply_sqlite_pragmas, sqlite_pragmas
+from app.models import LearningRecord, User, Word
+from app.writebehind import WriteBehindBuffer
+
+
+def setup(SessionLocal, children: int):
+    db = SessionLocal()
+    words = [
+        Word(english=f"word{i}", japanese=f"単語{i}", english_katakana="ワード", section=1)
+        for i in range(50)
+    ]
+    users = [
+        User(username=f"bench{i}", hashed_password="x", role="child")
+        for i in range(children)
+    ]
+    db.add_all(words + users)
+    db.commit()
+    ids = [w.id for w in words], [u.id for u in users]
+    db.close()
+    return ids
+
+
+def run(profile: str, threads: int, answers: int, write_behind: bool = False) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(
+            f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            connect_args={"check_same_thread": False},
+        )
+        apply_sqlite_pragmas(engine, sqlite_pragmas(profile, overrides={}))
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        word_ids, child_ids = setup(SessionLocal, threads)
+        catalog.invalidate()
+        buffer = WriteBehindBuffer(SessionLocal) if write_behind else None
+
+        def worker(child_id: int):
+            db = SessionLocal()
+            try:
+                for i in range(answers):
+                    word = catalog.get(db).get(db, word_ids[i % len(word_ids)])
+                    record = LearningRecord(
+                        child_id=child_id,
+                        word_id=word.id,
+                        is_correct=i % 3 != 0,
+                        used_hint=False,
+                        answered_at=datetime.now(timezone.utc),
+                        session_type="today",
+                    )
+                    if buffer is not None:
+                        buffer.add([record])
+                        db.rollback()
+                    else:
+                        db.add(record)
+                        db.commit()
+            finally:
+                db.close()
+
+        workers = [threading.Thread(target=worker, args=(cid,)) for cid in child_ids]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        if buffer is not None:
+            buffer.stop()
+        elapsed = time.perf_counter() - start
+        engine.dispose()
+    return threads * answers / elapsed
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    answers = int(sys.argv[2]) if len(sys.argv) > 2 else 250
+    print(f"threads={threads} answers/thread={answers}")
+    for profile in ("default", "performance"):
+        print(f"{profile:>12}: {run(profile, threads, answers):8.1f} answers/sec")
+    print(f"{'write-behind':>12}: {run('performance', threads, answers, write_behind=True):8.1f} answers/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""同期 / 非同期エンドポイントのレイテンシ比較 (p50 / p99)
+
+使い方:
+  python -m benchmarks.async_latency [同時リクエスト数] [ラウンド数]
+
+一時ファイルの DB に対して、同期版 (SessionLocal + スレッドプール) と
+非同期版 (sqlite+aiosqlite + run_sync) の menu-status / answer を
+同時に大量に呼び出し、リクエストごとのレイテンシの p50 / p99 を表示する。
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api import async_routes, learning
+from app.auth import create_access_token, principal_cache
+from app.database import Base, apply_sqlite_pragmas, get_async_db, get_db, get_read_db, sqlite_pragmas
+from app.models import ChildProgress, User, Word
+
+
+def setup(SessionLocal, children: int) -> list[str]:
+    db = SessionLocal()
+    db.add_all(
+        Word(english=f"word{i}", japanese=f"単語{i}", english_katakana="ワード", section=1)
+        for i in range(50)
+    )
+    users = [User(username=f"bench{i}", hashed_password="x", role="child") for i in range(children)]
+    db.add_all(users)
+    db.flush()
+    db.add_all(ChildProgress(child_id=u.id) for u in users)
+    db.commit()
+    tokens = [create_access_token(data={"sub": u.username}) for u in users]
+    db.close()
+    return tokens
+
+
+def sync_app(SessionLocal) -> FastAPI:
+    def override():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(learning.router)
+    app.dependency_overrides[get_db] = override
+    app.dependency_overrides[get_read_db] = override
+    return app
+
+
+def async_app(AsyncSessionLocal) -> FastAPI:
+    async def override():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(async_routes.router)
+    app.dependency_overrides[get_async_db] = override
+    return app
+
+
+async def measure(app: FastAPI, tokens: list[str], concurrency: int, rounds: int) -> list[float]:
+    latencies = []
+
+    async def one(client, i):
+        headers = {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+        start = time.perf_counter()
+        if i % 2:
+            resp = await client.get("/api/learning/menu-status", headers=headers)
+        else:
+            resp = await client.post(
+                "/api/learning/answer",
+                json={"word_id": 1 + i % 50, "answer": "word", "session_type": "today"},
+                headers=headers,
+            )
+        resp.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for r in range(rounds):
+            await asyncio.gather(*(one(client, r * concurrency + i) for i in range(concurrency)))
+    return latencies
+
+
+def report(label: str, latencies: list[float]) -> None:
+    q = statistics.quantiles(latencies, n=100)
+    print(
+        f"{label:>6}: n={len(latencies)} "
+        f"p50={q[49] * 1000:7.1f}ms p99={q[98] * 1000:7.1f}ms"
+    )
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print(f"concurrency={concurrency} rounds={rounds}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        # Sync handlers must not wait on pool checkout while holding a
+        # threadpool slot; aiosqlite opens a connection per session anyway
+        engine = create_engine(
+            f"sqlite:///{path}",
+            connect_args={"check_same_thread": False},
+            pool_size=concurrency,
+        )
+        apply_sqlite_pragmas(engine, sqlite_pragmas())
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        tokens = setup(SessionLocal, 20)
+
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        apply_sqlite_pragmas(async_engine.sync_engine, sqlite_pragmas())
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+        principal_cache.clear()
+        report("sync", asyncio.run(measure(sync_app(SessionLocal), tokens, concurrency, rounds)))
+        principal_cache.clear()
+        report("async", asyncio.run(measure(async_app(AsyncSessionLocal), tokens, concurrency, rounds)))
+
+        asyncio.run(async_engine.dispose())
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
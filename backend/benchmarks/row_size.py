@@ -0,0 +1,91 @@
+"""learning_records の 1 行あたりのバイト数 (圧縮エンコーディング前後の比較)
+
+使い方:
+  python -m benchmarks.row_size [行数]
+
+旧スキーマ (文字列の session_type, 真偽値 2 列, DateTime) の一時ファイル DB に
+ランダムな解答を入れ、マイグレーション 2 まで (旧エンコーディング) と
+最新まで (圧縮エンコーディング) のそれぞれで VACUUM 後の
+テーブル本体・インデックスのサイズを 1 行あたりのバイト数で表示する。
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+import app.models  # noqa: F401
+from app.migrations import migrate
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE learning_records (id INTEGER NOT NULL, child_id INTEGER NOT NULL,"
+    " word_id INTEGER NOT NULL, is_correct BOOLEAN NOT NULL, used_hint BOOLEAN,"
+    " answered_at DATETIME, session_type VARCHAR NOT NULL, PRIMARY KEY (id))",
+    "CREATE INDEX ix_learning_records_id ON learning_records (id)",
+    "CREATE INDEX ix_learning_records_child_id ON learning_records (child_id)",
+]
+
+
+def fill(path: str, rows: int) -> None:
+    conn = sqlite3.connect(path)
+    for statement in LEGACY_SCHEMA:
+        conn.execute(statement)
+    start = datetime(2024, 1, 1)
+    rng = random.Random(0)
+    conn.executemany(
+        "INSERT INTO learning_records"
+        " (child_id, word_id, is_correct, used_hint, answered_at, session_type)"
+        " VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (
+                rng.randint(1, 200),
+                rng.randint(1, 2000),
+                rng.random() < 0.8,
+                rng.random() < 0.2,
+                (start + timedelta(seconds=rng.randint(0, 365 * 86400), microseconds=rng.randint(0, 999999)))
+                .strftime("%Y-%m-%d %H:%M:%S.%f"),
+                rng.choice(("today", "review", "weak")),
+            )
+            for _ in range(rows)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def measure(path: str, rows: int) -> tuple[float, float]:
+    conn = sqlite3.connect(path)
+    conn.execute("VACUUM")
+    sizes = conn.execute(
+        "SELECT s.name = 'learning_records', sum(s.pgsize) FROM dbstat s"
+        " JOIN sqlite_schema m ON m.name = s.name"
+        " WHERE m.tbl_name = 'learning_records' GROUP BY 1"
+    ).fetchall()
+    conn.close()
+    by_kind = dict(sizes)
+    return by_kind.get(1, 0) / rows, by_kind.get(0, 0) / rows
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "rows.db")
+        fill(path, rows)
+        engine = create_engine(f"sqlite:///{path}")
+        print(f"rows={rows}")
+        for label, target in (("legacy", 2), ("compact", None)):
+            migrate(engine, target)
+            engine.dispose()
+            table, indexes = measure(path, rows)
+            print(
+                f"{label:>8}: table {table:6.1f} B/row, indexes {indexes:6.1f} B/row,"
+                f" total {table + indexes:6.1f} B/row"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""復習・苦手クイズの出題サンプリングの計測
+
+使い方:
+  python -m benchmarks.sampling [学習済み単語数] [繰り返し回数]
+
+一時ファイルの DB に学習済み単語の多い子どもを作り、
+旧方式 (全 ID を IN 句に渡して ORDER BY random() LIMIT 10) と
+新方式 (リザーバ / 重み付きサンプリング + 単語カタログ) の 1 回あたりの時間を表示する。
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, func, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.api.learning import _get_learned_word_ids, _get_weak_word_ids, _learned_word_query, _weak_word_query
+from app.catalog import WordCatalog
+from app.database import Base, apply_sqlite_pragmas, sqlite_pragmas
+from app.models import LearningRecord, User, Word
+from app.sampling import reservoir_sample, weighted_sample
+
+QUIZ_SIZE = 10
+
+
+def setup(SessionLocal, learned: int) -> int:
+    db = SessionLocal()
+    db.add_all(
+        Word(english=f"word{i}", japanese=f"単語{i}", english_katakana="ワード", section=i // 20 + 1)
+        for i in range(learned * 2)
+    )
+    child = User(username="bench", hashed_password="x", role="child")
+    db.add(child)
+    db.commit()
+    rng = random.Random(0)
+    start = datetime.now(timezone.utc) - timedelta(days=90)
+    rows = []
+    for word_id in range(1, learned + 1):
+        for _ in range(3):
+            answered_at = start + timedelta(minutes=rng.randint(0, 90 * 24 * 60))
+            rows.append({
+                "child_id": child.id,
+                "word_id": word_id,
+                "outcome": 1 if rng.random() < 0.7 else 0,
+                "answered_at": answered_at,
+                "session_type": "review",
+                "local_day": answered_at.date(),
+            })
+    db.execute(insert(LearningRecord), rows)
+    db.commit()
+    child_id = child.id
+    db.close()
+    return child_id
+
+
+def old_review(db, child_id):
+    ids = _get_learned_word_ids(db, child_id)
+    return db.query(Word).filter(Word.id.in_(ids)).order_by(func.random()).limit(QUIZ_SIZE).all()
+
+
+def new_review(db, child_id, catalog):
+    rows = _learned_word_query(db, child_id).yield_per(1000)
+    return catalog.get(db).get_many(db, reservoir_sample((r[0] for r in rows), QUIZ_SIZE))
+
+
+def old_weak(db, child_id):
+    ids = _get_weak_word_ids(db, child_id)
+    return db.query(Word).filter(Word.id.in_(ids)).order_by(func.random()).limit(QUIZ_SIZE).all()
+
+
+def new_weak(db, child_id, catalog):
+    rows = _weak_word_query(db, child_id).all()
+    ids = weighted_sample([r.word_id for r in rows], [r.error_rate for r in rows], QUIZ_SIZE)
+    return catalog.get(db).get_many(db, ids)
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        assert len(fn()) == QUIZ_SIZE
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    learned = int(sys.argv[1]) if len(sys.argv) > 1 else 12000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        apply_sqlite_pragmas(engine, sqlite_pragmas())
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        child_id = setup(SessionLocal, learned)
+        catalog = WordCatalog()
+        db = SessionLocal()
+        catalog.get(db)
+        print(f"learned words={learned} quiz size={QUIZ_SIZE}")
+        print(f"review old: {timed(lambda: old_review(db, child_id), repeat):7.2f} ms")
+        print(f"review new: {timed(lambda: new_review(db, child_id, catalog), repeat):7.2f} ms")
+        print(f"  weak old: {timed(lambda: old_weak(db, child_id), repeat):7.2f} ms")
+        print(f"  weak new: {timed(lambda: new_weak(db, child_id, catalog), repeat):7.2f} ms")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""gunicorn 設定 (複数ワーカー構成)
+
+  gunicorn -c gunicorn.conf.py app.main:app
+
+ワーカー数は WEB_CONCURRENCY で指定する。複数ワーカーで動かす場合は
+CACHE_URL=redis://... が必要 (キャッシュの無効化を全ワーカーに行き渡らせるため)。
+未設定 (memory://) のままでは起動しない。
+WRITE_BEHIND=1 は解答をプロセス内に溜めるため、ワーカー1つでのみ起動できる。
+"""
+
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+
+
+def on_starting(server):
+    from app import cache, writebehind
+
+    cache.check_workers(server.cfg.workers)
+    writebehind.check_workers(server.cfg.workers)
+    # Create the schema once in the master before any worker is forked
+    from app.database import engine, init_db
+
+    init_db()
+    # Workers must not inherit the master's SQLite connections
+    engine.dispose()
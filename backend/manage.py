@@ -12,12 +12,34 @@
 
   # 現在の状態を確認
   python manage.py status kazuki
+
+  # 各セクションの回答済み状態を学習履歴から作り直す (全員 / 指定した子)
+  python manage.py rebuild-completion
+  python manage.py rebuild-completion kazuki
+
+  # 単語ごとの学習集計 (word_mastery) を学習履歴と照合 / 作り直す
+  python manage.py verify-mastery
+  python manage.py rebuild-mastery
+  python manage.py rebuild-mastery kazuki
+
+  # 日別の学習集計 (daily_rollups) を学習履歴から作り直す (全員 / 指定した子)
+  python manage.py rebuild-stats
+  python manage.py rebuild-stats kazuki
+
+  # 今日の単語 (全員分) をいま作成する。--force で実行済みでも再実行
+  python manage.py daily-plans
+  python manage.py daily-plans --force
+
+  # スキーマのマイグレーションを適用 (番号を指定するとそこまで)
+  python manage.py migrate
+  python manage.py migrate 1
 """
 
 import sys
 from datetime import timedelta
 
-from app.database import SessionLocal
+from app import completion, mastery, rollups  # noqa: F401 - keep derived tables current
+from app.database import SessionLocal, engine
 from app.models import ChildProgress, LearningRecord, User
 
 
@@ -94,7 +116,95 @@ def shift_date(db, username, days):
     print(f" 学習レコード {len(records)}件の日付も更新しました")
 
 
+def run_migrations(target=None):
+    import app.models  # noqa: F401
+    from app.migrations import MIGRATIONS, applied_versions, migrate
+
+    applied = migrate(engine, target)
+    for m in applied:
+        print(f"適用しました: {m.version:04d} {m.name}")
+    if not applied:
+        print("適用するマイグレーションはありません")
+    done = applied_versions(engine)
+    print(f"現在のバージョン: {max(done, default=0)} (全{len(MIGRATIONS)}件)")
+
+
+def rebuild_completion(db, username=None):
+    child_ids = [get_child(db, username).id] if username else None
+    rows = completion.rebuild(db, child_ids)
+    db.commit()
+    print(f"セクションの回答済み状態を再計算しました ({rows}件)")
+
+
+def rebuild_mastery(db, username=None):
+    child_ids = [get_child(db, username).id] if username else None
+    rows = mastery.rebuild(db, child_ids)
+    db.commit()
+    print(f"単語ごとの学習集計を再計算しました ({rows}件)")
+
+
+def rebuild_stats(db, username=None):
+    child_ids = [get_child(db, username).id] if username else None
+    rows = rollups.rebuild(db, child_ids)
+    db.commit()
+    print(f"日別の学習集計を再計算しました ({rows}件)")
+
+
+def verify_mastery(db):
+    mismatched = mastery.verify(db)
+    for child_id, word_id in mismatched[:20]:
+        print(f" 不一致: child_id={child_id} word_id={word_id}")
+    if mismatched:
+        print(f"学習集計が学習履歴と{len(mismatched)}件一致しません。rebuild-mastery で作り直してください")
+        sys.exit(1)
+    print("学習集計は学習履歴と一致しています")
+
+
+def daily_plans(force=False):
+    from app.plans import run_daily_plans
+
+    stats = run_daily_plans(force=force)
+    if stats is None:
+        print("本日分は既に実行済み (または実行中) です。再実行は --force")
+        return
+    print(
+        f"{stats['day']}: 子ども{stats['children']}人中{stats['planned']}人の単語を作成"
+        f" ({stats['chunks']}チャンク, {stats['seconds']}秒)"
+    )
+
+
 def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == "daily-plans":
+        daily_plans(force="--force" in sys.argv[2:])
+        return
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        run_migrations(int(sys.argv[2]) if len(sys.argv) > 2 else None)
+        return
+    if len(sys.argv) >= 2 and sys.argv[1] == "rebuild-completion":
+        db = SessionLocal()
+        try:
+            rebuild_completion(db, sys.argv[2] if len(sys.argv) > 2 else None)
+        finally:
+            db.close()
+        return
+    if len(sys.argv) >= 2 and sys.argv[1] == "rebuild-stats":
+        db = SessionLocal()
+        try:
+            rebuild_stats(db, sys.argv[2] if len(sys.argv) > 2 else None)
+        finally:
+            db.close()
+        return
+    if len(sys.argv) >= 2 and sys.argv[1] in ("rebuild-mastery", "verify-mastery"):
+        db = SessionLocal()
+        try:
+            if sys.argv[1] == "verify-mastery":
+                verify_mastery(db)
+            else:
+                rebuild_mastery(db, sys.argv[2] if len(sys.argv) > 2 else None)
+        finally:
+            db.close()
+        return
+
     if len(sys.argv) < 3:
         print(__doc__)
         sys.exit(1)
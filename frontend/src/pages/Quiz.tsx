@@ -3,6 +3,10 @@ import { useNavigate, useSearchParams } from 'react-router-dom';
 import api from '../api/client';
 import { QuizWord, AnswerResult } from '../types';
 
+function quizSessionHeaders(session: string | null): Record<string, string> {
+  return session ? { 'X-Quiz-Session': session } : {};
+}
+
 export default function Quiz() {
   const [searchParams] = useSearchParams();
   const mode = searchParams.get('mode') || 'today';
@@ -22,6 +26,8 @@ export default function Quiz() {
   const timerRef = useRef<ReturnType<typeof setInterval> | null>(null);
   const inputRef = useRef<HTMLInputElement>(null);
   const finishBtnRef = useRef<HTMLButtonElement>(null);
+  // 出題時に発行されるクイズセッション。解答と一緒に送り返す
+  const quizSessionRef = useRef<string | null>(null);
   const currentRef = useRef(current);
   const usedHintRef = useRef(usedHint);
   currentRef.current = current;
@@ -51,7 +57,7 @@ export default function Quiz() {
           answer: '',
           session_type: mode,
           used_hint: usedHintRef.current,
-        }).then((res) => {
+        }, { headers: quizSessionHeaders(quizSessionRef.current) }).then((res) => {
           const data: AnswerResult = res.data;
           setResult(data);
           setScore((s) => ({ ...s, incorrect: s.incorrect + 1 }));
@@ -78,6 +84,7 @@ export default function Quiz() {
     else if (mode === 'review') url = `/api/learning/review?period=${period}`;
     else if (mode === 'weak') url = `/api/learning/weak?period=${period}`;
     api.get(url).then((res) => {
+      quizSessionRef.current = res.headers['x-quiz-session'] ?? null;
       setWords(res.data);
       setLoading(false);
     });
@@ -108,7 +115,7 @@ export default function Quiz() {
         answer: answer.trim(),
         session_type: mode,
         used_hint: usedHint,
-      });
+      }, { headers: quizSessionHeaders(quizSessionRef.current) });
       const data: AnswerResult = res.data;
       setResult(data);
       if (data.is_correct && !usedHint) {